@@ -1,8 +1,4 @@
 import streamlit as st
-import time
-import pandas as pd
-import numpy as np
-import plotly.graph_objects as go
 import sys
 import os
 import datetime
@@ -10,11 +6,12 @@ import datetime
 # Path Setup
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from simulation.ev_signal_generator import EVSignalGenerator
-from inference.soc_predictor import SOCPredictor
-from inference.soh_predictor import SOHPredictor
-from utils.dvdq_features import load_dvdq_features
-from safety.health_rules import check_safety
+from simulation.live_simulation import LiveSimulation
+from simulation.replay import ReplaySource
+from utils.dvdq_features import load_chemistry_features
+from utils.instrumentation import metrics, start_http_server
+from utils.telemetry_store import TelemetryStore
+from safety.rule_engine import SEVERITY_CRITICAL
 
 st.set_page_config(page_title="Elektra BMS Pro", page_icon="⚡", layout="wide")
 
@@ -57,34 +54,39 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 NOMINAL_CAPACITY = 100.0
+TELEMETRY_PACK = "car"
+UI_FPS = 5             # chart refresh rate, independent of the simulation rate
+CHART_POINTS = 1500    # points per trace after server-side decimation
 
-# --- STATE ---
-if 'car' not in st.session_state:
-    st.session_state.car = EVSignalGenerator()
-    st.session_state.soc_ai = SOCPredictor()
-    st.session_state.soh_ai = SOHPredictor()
-    st.session_state.history = pd.DataFrame(columns=["time", "voltage", "current", "soc", "temperature", "voltage_std", "capacity_ratio"])
-    st.session_state.cycle_count = 10.0
-    st.session_state.simulation_running = False
-    st.session_state.sim_clock = 0.0 # Track simulated seconds
-    st.session_state.smoothed_soc = 50.0  # Smoothed SOC
-    st.session_state.smoothed_soh = 100.0  # Smoothed SOH
-    st.session_state.soc_alpha = 0.15  # EMA smoothing factor for SOC
-    st.session_state.soh_alpha = 0.1   # EMA smoothing factor for SOH
-    st.session_state.soh_buffer = []  # Buffer for SOH predictions to stabilize
-    st.session_state.soh_buffer_size = 20  # Number of predictions to collect before smoothing
-    st.session_state.last_cycle_count = 10.0  # Track cycle changes
-    st.session_state.current_capacity_ah = 100.0  # Current capacity that degrades
-    st.session_state.capacity_history = [100.0]  # Track capacity over time
-    st.session_state.last_cycle_count = 10.0  # Track cycle changes
+@st.cache_resource
+def get_telemetry_store():
+    # One store per server process: every session appends to and reads from the same files
+    return TelemetryStore()
+
+@st.cache_resource
+def get_metrics_server():
+    # Prometheus scrape endpoint (http://127.0.0.1:<port>/metrics) when ELEKTRA_METRICS_PORT is set
+    port = os.environ.get("ELEKTRA_METRICS_PORT")
+    return start_http_server(int(port)) if port else None
+
+get_metrics_server()
 
 @st.cache_resource
 def get_chemistry_features():
-    anode = load_dvdq_features("data/dv_dq_anode.csv", "anode")
-    cathode = load_dvdq_features("data/dv_dq_cathode.csv", "cathode")
-    return {**anode, **cathode}
+    return load_chemistry_features()
+
+# --- STATE ---
+if 'sim' not in st.session_state:
+    # Car, estimators, safety rules and a 1M-sample history, advanced on a background thread;
+    # the history is refilled from the telemetry store so a page reload keeps its charts
+    st.session_state.sim = LiveSimulation(
+        static_features=get_chemistry_features(), store=get_telemetry_store(),
+        pack_id=TELEMETRY_PACK, nominal_capacity=NOMINAL_CAPACITY,
+    )
+    st.session_state.cycle_count = 10.0
+    st.session_state.simulation_running = False
 
-static_features = get_chemistry_features()
+sim = st.session_state.sim
 
 # --- UI ---
 st.title("⚡ Elektra: Digital Twin")
@@ -101,17 +103,17 @@ mode_col1, mode_col2, mode_col3 = st.sidebar.columns(3)
 with mode_col1:
     if st.sidebar.button("🔌 CHARGE", use_container_width=True):
         st.session_state.operation_mode = "CHARGE"
-        st.session_state.car.set_mode("CHARGE")
+        sim.set_mode("CHARGE")
 
 with mode_col2:
     if st.sidebar.button("🚗 DRIVE", use_container_width=True):
         st.session_state.operation_mode = "DISCHARGE"
-        st.session_state.car.set_mode("DISCHARGE")
+        sim.set_mode("DISCHARGE")
 
 with mode_col3:
     if st.sidebar.button("⏸️ IDLE", use_container_width=True):
         st.session_state.operation_mode = "STANDBY"
-        st.session_state.car.set_mode("STANDBY")
+        sim.set_mode("STANDBY")
 
 st.sidebar.divider()
 
@@ -138,149 +140,148 @@ cycle_input = st.sidebar.slider(
 )
 st.session_state.cycle_count = cycle_input
 
+# Recorded telemetry instead of the simulated car, replayed at Speed x its recorded rate
+replay_path = st.sidebar.text_input("📼 Replay recording (.csv / .parquet / .npz)", value="").strip()
+if replay_path != st.session_state.get("replay_path", ""):
+    if replay_path and not os.path.exists(replay_path):
+        st.sidebar.error(f"File not found: {replay_path}")
+    else:
+        sim.stop()
+        st.session_state.replay_path = replay_path
+        st.session_state.pop("figures", None)
+        # Replays are not persisted: the recording itself is the history
+        st.session_state.sim = sim = LiveSimulation(
+            static_features=get_chemistry_features(),
+            store=None if replay_path else get_telemetry_store(),
+            pack_id=TELEMETRY_PACK, nominal_capacity=NOMINAL_CAPACITY,
+            source=ReplaySource(replay_path) if replay_path else None,
+        )
+
+# Stage timers (process-wide; near-free while off)
+if st.sidebar.toggle("📊 Instrumentation", value=metrics.enabled):
+    metrics.enable()
+else:
+    metrics.disable()
+
 # Display current mode
 mode_color = {"CHARGE": "🟢", "DISCHARGE": "🔴", "STANDBY": "⚪"}
 st.sidebar.info(f"{mode_color.get(st.session_state.operation_mode, '⚪')} Mode: **{st.session_state.operation_mode}**")
 
-m1, m2, m3, m4 = st.columns(4)
-c1, c2 = st.columns(2)
-clock_ph = st.empty()
+# Settings reach the worker on its next tick. The LSTM estimator stays off the dashboard
+# until a training scaler ships with the model (see inference/lstm_soc_predictor.py)
+sim.configure(speed_factor=speed_factor, cycle=cycle_input, estimator="coulomb")
 
-# --- RUN LOOP ---
-if st.session_state.simulation_running:
-    
-    # 1. PHYSICS STEP
-    real_dt = 0.1 # We update screen every 0.1s
-    
-    # Pass 'real_dt' and 'speed_factor' to physics
-    data = st.session_state.car.step(real_dt, speed_factor)
-    
-    # Update Simulated Clock
-    st.session_state.sim_clock += (real_dt * speed_factor)
-    sim_time_str = str(datetime.timedelta(seconds=int(st.session_state.sim_clock)))
-
-    # 3. CALCULATE REALISTIC CAPACITY DEGRADATION
-    # Capacity degrades with: cycles + temperature + current stress
-    cycle_degradation = cycle_input * 0.00015  # 0.015% per cycle
-    temp_stress = max(0, (data['temperature'] - 25) * 0.0001)  # Higher temp = more degradation
-    current_stress = abs(data['current']) * 0.00000005  # High current = more stress
-    
-    # Total degradation rate
-    total_degradation = cycle_degradation + temp_stress + current_stress
-    st.session_state.current_capacity_ah = NOMINAL_CAPACITY * (1.0 - total_degradation)
-    st.session_state.current_capacity_ah = np.clip(st.session_state.current_capacity_ah, NOMINAL_CAPACITY * 0.5, NOMINAL_CAPACITY)
-    
-    # Track capacity history
-    st.session_state.capacity_history.append(st.session_state.current_capacity_ah)
-    if len(st.session_state.capacity_history) > 100:
-        st.session_state.capacity_history.pop(0)
-    
-    # Calculate capacity_ratio (current capacity / nominal)
-    capacity_ratio = st.session_state.current_capacity_ah / NOMINAL_CAPACITY
-    
-    # Calculate delta_capacity (rate of change)
-    if len(st.session_state.capacity_history) > 1:
-        delta_cap = (st.session_state.capacity_history[-1] - st.session_state.capacity_history[-2]) / st.session_state.capacity_history[-1]
-    else:
-        delta_cap = 0.0
-    
-    # 4. HISTORY WITH REALISTIC VALUES
-    new_row = pd.DataFrame([{
-        "time": pd.to_datetime(data['time'], unit='s'),
-        "voltage": data['voltage'],
-        "current": data['current'],
-        "soc": 0,  # Will be updated after prediction
-        "temperature": data['temperature'],
-        "voltage_std": 0, 
-        "capacity_ratio": capacity_ratio,
-        "power": data.get('power', 0)
-    }])
-    st.session_state.history = pd.concat([st.session_state.history, new_row]).tail(100)
-    
-    # 5. FEATURES
-    hist = st.session_state.history
-    current_std = hist['voltage'].rolling(5).std().fillna(0).iloc[-1]
-    roll_std = hist['voltage'].rolling(10).std().mean()
-    if pd.isna(roll_std): roll_std = 0.0
-    if pd.isna(delta_cap): delta_cap = 0.0
-
-    # 6. PREDICT (AI MODELS ONLY)
-    # SOC Prediction from AI model
-    pred_soc_raw = st.session_state.soc_ai.predict(data['voltage'], data['current'], data['temperature'], data['time'])
-    
-    # Smooth SOC using exponential moving average
-    st.session_state.smoothed_soc = (st.session_state.soc_alpha * pred_soc_raw) + ((1 - st.session_state.soc_alpha) * st.session_state.smoothed_soc)
-    pred_soc = st.session_state.smoothed_soc
-    
-    # SOH Prediction from AI model with REALISTIC degraded values
-    pred_soh_raw = st.session_state.soh_ai.predict(
-        dynamic_features={
-            "cycle": int(cycle_input),
-            "mean_voltage": hist['voltage'].mean(),
-            "voltage_std": current_std,
-            "min_voltage": hist['voltage'].min(),
-            "max_voltage": hist['voltage'].max(),
-            "capacity_ah": st.session_state.current_capacity_ah,  # Use degraded capacity
-            "capacity_ratio": capacity_ratio,  # Use realistic ratio
-            "delta_capacity": delta_cap,  # Use real degradation rate
-            "rolling_voltage_std": roll_std
-        },
-        static_features=static_features
-    )
-    
-    # Buffer SOH predictions for smoother initialization
-    st.session_state.soh_buffer.append(pred_soh_raw)
-    
-    # Once buffer is full, use it for smoothing
-    if len(st.session_state.soh_buffer) > st.session_state.soh_buffer_size:
-        st.session_state.soh_buffer.pop(0)  # Remove oldest
-        buffer_mean = np.mean(st.session_state.soh_buffer)
-        st.session_state.smoothed_soh = (st.session_state.soh_alpha * buffer_mean) + ((1 - st.session_state.soh_alpha) * st.session_state.smoothed_soh)
-    else:
-        # During buffer filling phase, use simple average
-        if len(st.session_state.soh_buffer) >= 5:
-            buffer_mean = np.mean(st.session_state.soh_buffer)
-            st.session_state.smoothed_soh = (st.session_state.soh_alpha * buffer_mean) + ((1 - st.session_state.soh_alpha) * st.session_state.smoothed_soh)
-    
-    pred_soh = np.clip(st.session_state.smoothed_soh, 0, 100)
-    
-    # Update history with predicted SOC
-    st.session_state.history.iloc[-1, st.session_state.history.columns.get_loc('soc')] = pred_soc
-
-    # 5. RENDER
-    # Show SIMULATED TIME and MODE
-    clock_ph.markdown(f"<div class='clock-box'>⏱️ Simulated: {sim_time_str} | 🔋 Mode: {st.session_state.operation_mode}</div>", unsafe_allow_html=True)
-
-    m1.metric("⚡ SOC", f"{pred_soc:.1f}%")
-    m2.metric("❤️ SOH", f"{pred_soh:.1f}%")
-    m3.metric("🔄 Cycles", f"{int(cycle_input)}")
-    m4.metric("🌡️ Temp", f"{data['temperature']:.1f}°C")
-    
+CHART_LAYOUT = dict(height=350, margin=dict(t=30,b=10,l=10,r=10), template="plotly_dark", uirevision='const', xaxis=dict(showticklabels=False), yaxis=dict(showgrid=True, gridcolor='#333'), paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)')
+
+def build_figures():
+    """Chart figures are built once per session; every frame only swaps their trace data"""
+    import plotly.graph_objects as go
+
+    fig_v = go.Figure()
+    fig_v.add_trace(go.Scatter(mode='lines', line=dict(color='#00CCFF', width=2)))
+    fig_v.update_layout(title="<b>Voltage</b>", **CHART_LAYOUT)
+
+    fig_i = go.Figure()
+    fig_i.add_trace(go.Scatter(fill='tozeroy', line=dict(color='#FF5500')))
+    fig_i.add_trace(go.Scatter(name='Temp', yaxis='y2', line=dict(color='yellow', dash='dot')))
+    fig_i.update_layout(title="<b>Current / Temp</b>", yaxis2=dict(overlaying='y', side='right', showgrid=False), **CHART_LAYOUT)
+    return fig_v, fig_i
+
+def as_datetime(t):
+    return (t * 1000).astype('datetime64[ms]')
+
+@st.fragment(run_every=1.0 / UI_FPS)
+def live_view():
+    """Redrawn at UI_FPS on its own; the rest of the page only reruns when a control changes"""
+    with metrics.timer("ui.snapshot"):
+        snap = sim.snapshot()
+    if snap["error"] is not None:
+        st.error(f"Simulation stopped: {snap['error']!r}")
+        return
+    if "time" not in snap:
+        st.info("⏳ Starting simulation...")
+        return
+
+    # Decimated server-side: ~CHART_POINTS per trace however long the history is
+    series = sim.series(["voltage", "current", "temperature"], n_out=CHART_POINTS)
+    if "figures" not in st.session_state:
+        st.session_state.figures = build_figures()
+    fig_v, fig_i = st.session_state.figures
+    with metrics.timer("ui.figures"):
+        fig_v.data[0].update(x=as_datetime(series["voltage"][0]), y=series["voltage"][1])
+        fig_i.data[0].update(x=as_datetime(series["current"][0]), y=series["current"][1])
+        fig_i.data[1].update(x=as_datetime(series["temperature"][0]), y=series["temperature"][1])
+
+    # Show SIMULATED TIME, MODE and how fast the worker actually runs
+    stats = snap["stats"]
+    sim_time_str = str(datetime.timedelta(seconds=int(snap["sim_clock"])))
+    st.markdown(f"<div class='clock-box'>⏱️ Simulated: {sim_time_str} | 🔋 Mode: {snap['mode']} | "
+                f"⚙️ {stats['achieved_speed']:,.0f}x, {stats['samples']:,} samples</div>", unsafe_allow_html=True)
+
+    if sim.source is not None and sim.source.exhausted:
+        st.caption("📼 End of recording")
+
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("⚡ SOC", f"{snap['soc']:.1f}%")
+    m2.metric("❤️ SOH", f"{snap['soh']:.1f}%")
+    m3.metric("🔄 Cycles", f"{int(snap['cycle'])}")
+    m4.metric("🌡️ Temp", f"{snap['temperature']:.1f}°C")
+
+    c1, c2 = st.columns(2)
     with c1:
-        st.markdown(f"<div class='live-val-box val-v'>{data['voltage']:.2f} V</div>", unsafe_allow_html=True)
-        fig_v = go.Figure()
-        fig_v.add_trace(go.Scatter(x=hist['time'], y=hist['voltage'], mode='lines', line=dict(color='#00CCFF', width=2)))
-        fig_v.update_layout(title="<b>Voltage</b>", height=350, margin=dict(t=30,b=10,l=10,r=10), template="plotly_dark", uirevision='const', xaxis=dict(showticklabels=False), yaxis=dict(showgrid=True, gridcolor='#333'), paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)')
-        st.plotly_chart(fig_v, use_container_width=True)
+        st.markdown(f"<div class='live-val-box val-v'>{snap['voltage']:.2f} V</div>", unsafe_allow_html=True)
+        with metrics.timer("ui.chart"):
+            st.plotly_chart(fig_v, use_container_width=True)
 
     with c2:
-        power = data['voltage'] * abs(data['current']) / 1000.0
-        st.markdown(f"<div class='live-val-box val-i'>{data['current']:.2f} A | {power:.1f} kW</div>", unsafe_allow_html=True)
-        fig_i = go.Figure()
-        fig_i.add_trace(go.Scatter(x=hist['time'], y=hist['current'], fill='tozeroy', line=dict(color='#FF5500')))
-        fig_i.add_trace(go.Scatter(x=hist['time'], y=hist['temperature'], name='Temp', yaxis='y2', line=dict(color='yellow', dash='dot')))
-        fig_i.update_layout(title="<b>Current / Temp</b>", height=350, margin=dict(t=30,b=10,l=10,r=10), template="plotly_dark", uirevision='const', xaxis=dict(showticklabels=False), yaxis=dict(showgrid=True, gridcolor='#333'), yaxis2=dict(overlaying='y', side='right', showgrid=False), paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)')
-        st.plotly_chart(fig_i, use_container_width=True)
+        power = snap['voltage'] * abs(snap['current']) / 1000.0
+        st.markdown(f"<div class='live-val-box val-i'>{snap['current']:.2f} A | {power:.1f} kW</div>", unsafe_allow_html=True)
+        with metrics.timer("ui.chart"):
+            st.plotly_chart(fig_i, use_container_width=True)
 
     # Alerts
-    alerts = check_safety(pred_soc, pred_soh, data['temperature'])
-    if alerts:
-        st.error(f"⚠️ {alerts[0]}")
-    else:
+    alerts = snap["alerts"]
+    if not alerts:
         st.success("✅ System Nominal")
+    elif snap["severity"] == SEVERITY_CRITICAL:
+        st.error("⚠️ " + " | ".join(alerts))
+    else:
+        st.warning("⚠️ " + " | ".join(alerts))
 
-    time.sleep(0.05)
-    st.rerun()
+    if metrics.enabled:
+        performance_panel(stats)
+
+def performance_panel(stats):
+    """Per-stage latency table, worker load and an on-demand sampling profile of the worker"""
+    with st.expander("📊 Performance", expanded=True):
+        soh = stats["soh"]
+        st.caption(f"Worker: {stats['load']:.0%} of one core, {stats['ticks']:,} ticks | "
+                   "sim.physics / sim.features / sim.soc are per tick (summed over sub-steps) | "
+                   f"SoH model ran on {soh['model_rows']:,} of {soh['rows']:,} ticks "
+                   f"({soh['skip_rate']:.0%} unchanged, {soh['hit_rate']:.0%} of the rest cached)")
+        st.dataframe([
+            {"stage": row["stage"], "calls": row["calls"], "mean ms": round(row["mean_ms"], 3),
+             "p50 ms": round(row["p50_ms"], 3), "p99 ms": round(row["p99_ms"], 3), "share": f"{row['share']:.0%}"}
+            for row in metrics.stage_summary()
+        ], hide_index=True, use_container_width=True)
+
+        if st.button("🔬 Profile worker (3 s)"):
+            st.session_state.worker_profile = sim.profile(3.0)
+        profiler = st.session_state.get("worker_profile")
+        if profiler is not None and profiler.samples:
+            st.dataframe([
+                {"function": function, "self %": round(100 * own / profiler.samples, 1),
+                 "total %": round(100 * total / profiler.samples, 1)}
+                for function, own, total in profiler.top(15)
+            ], hide_index=True, use_container_width=True)
+            st.download_button("⬇️ Folded stacks (flamegraph)", profiler.collapsed(), file_name="worker.folded")
+
+# --- RUN LOOP (background thread) ---
+if st.session_state.simulation_running:
+    # Also restarts a worker that stopped itself after the tab went idle
+    sim.start()
+    live_view()
 
 else:
-    st.info(f"🛑 Stopped | Mode: **{st.session_state.operation_mode}** | Press ▶️ to start simulation")
\ No newline at end of file
+    sim.stop()
+    st.info(f"🛑 Stopped | Mode: **{st.session_state.operation_mode}** | Press ▶️ to start simulation")
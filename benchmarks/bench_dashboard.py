@@ -0,0 +1,81 @@
+"""
+Dashboard data path: decimation of 1M-point series, and the background simulation at
+5000x while a UI thread polls it at a fixed frame rate over a full 1M-sample history.
+Run from the repo root: python benchmarks/bench_dashboard.py
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from simulation.live_simulation import HISTORY_COLUMNS, LiveSimulation
+from utils.decimation import METHODS, decimate
+
+CHART_COLUMNS = ["voltage", "current", "temperature"]
+
+
+def bench_decimation(n=1_000_000, n_out=2000, repeat=10):
+    rng = np.random.default_rng(0)
+    x = np.arange(n) * 5.0
+    y = np.cumsum(rng.normal(size=n))
+    print(f"decimating {n:,} points to {n_out:,}")
+    print(f"{'method':<12} | {'ms':>7} | {'points':>6} | {'keeps min/max':>13}")
+    for method in METHODS:
+        decimate(x, y, n_out, method)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            xd, yd = decimate(x, y, n_out, method)
+        took = (time.perf_counter() - start) / repeat
+        keeps = yd.min() == y.min() and yd.max() == y.max()
+        print(f"{method:<12} | {took * 1e3:>7.2f} | {len(xd):>6,} | {str(keeps):>13}")
+
+
+def bench_live(seconds, fps, speed, history):
+    sim = LiveSimulation(history_size=history)
+    # Start with a full history so every frame decimates `history` samples per signal
+    rng = np.random.default_rng(0)
+    t0 = sim.car.sim_time - history * 5.0
+    sim.history.extend({name: rng.normal(size=history) for name in HISTORY_COLUMNS} | {"time": t0 + np.arange(history) * 5.0})
+    sim.set_mode("DISCHARGE")
+    sim.configure(speed_factor=speed, cycle=500)
+
+    sim.start()
+    frames = []
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        start = time.perf_counter()
+        snapshot = sim.snapshot()
+        series = sim.series(CHART_COLUMNS)
+        took = time.perf_counter() - start
+        frames.append(took)
+        time.sleep(max(1.0 / fps - took, 0.0))
+    sim.stop()
+
+    stats = snapshot["stats"]
+    frames = np.array(frames) * 1e3
+    shipped = sum(len(t) for t, _ in series.values())
+    print(f"\nlive simulation at {speed:,}x for {seconds:.0f} s, UI polling at {fps} fps over {history:,} samples/signal")
+    print(f"  achieved speed   {stats['achieved_speed']:,.0f}x ({stats['samples']:,} samples, {stats['ticks']} ticks)")
+    print(f"  worker load      {stats['load'] * 100:.1f}% of one core")
+    print(f"  frame data       median {np.median(frames):.1f} ms, p99 {np.percentile(frames, 99):.1f} ms, "
+          f"{shipped:,} points shipped per frame (vs {history * len(CHART_COLUMNS):,} undecimated)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--fps", type=int, default=10)
+    parser.add_argument("--speed", type=int, default=5000)
+    parser.add_argument("--history", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    bench_decimation()
+    bench_live(args.seconds, args.fps, args.speed, args.history)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Synthetic dV/dQ generation: the original one-curve-at-a-time profile vs broadcast batches,
+and a sharded dataset written to disk with a process pool.
+Run from the repo root: python benchmarks/bench_dvdq_simulator.py --curves 100000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from simulation.dvdq_simulator import ANODE_PEAKS, ELECTRODES, generate_curves, generate_dataset, generate_synthetic_profile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--curves", type=int, default=100_000, help="curves per electrode for the dataset runs")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    # 1. One curve per call (the original script's generator)
+    n = 200
+    start = time.perf_counter()
+    for _ in range(n):
+        generate_synthetic_profile(ELECTRODES["anode"]["voltage_range"], ANODE_PEAKS)
+    per_curve = n / (time.perf_counter() - start)
+    print(f"{'one curve per call':<34} | {per_curve:>12,.0f} curves/s")
+
+    # 2. One broadcast batch
+    steps = np.random.default_rng(0).integers(0, 101, 4096)
+    generate_curves("anode", steps)
+    start = time.perf_counter()
+    for _ in range(5):
+        generate_curves("anode", steps)
+    batched = 5 * len(steps) / (time.perf_counter() - start)
+    print(f"{'batch of 4096':<34} | {batched:>12,.0f} curves/s ({batched / per_curve:,.0f}x)")
+
+    # 3. Sharded datasets (anode + cathode per curve), in memory and on disk
+    for label, kwargs in [("in memory, 1 process", {"n_workers": 1}),
+                          (f"npz float32, {args.workers} processes", {"n_workers": args.workers, "dtype": np.float32}),
+                          (f"npz float16, {args.workers} processes", {"n_workers": args.workers, "dtype": np.float16})]:
+        out = None if "memory" in label else tempfile.mkdtemp(prefix="elektra-dvdq-")
+        try:
+            start = time.perf_counter()
+            generate_dataset(args.curves, path=out, variation=0.05, **kwargs)
+            took = time.perf_counter() - start
+            size = "" if out is None else f", {sum(os.path.getsize(os.path.join(out, f)) for f in os.listdir(out)) / 1e6:,.0f} MB"
+            print(f"{label:<34} | {args.curves / took:>12,.0f} curve pairs/s ({took:.1f} s{size}; "
+                  f"1M pairs in ~{1e6 / args.curves * took / 60:.1f} min)")
+        finally:
+            if out is not None:
+                shutil.rmtree(out, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
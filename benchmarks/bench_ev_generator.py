@@ -0,0 +1,103 @@
+"""
+Single-pack simulator throughput (simulation.ev_signal_generator): the previous per-step
+implementation (scalar np.random.normal / np.clip calls on the global RNG), the current
+step(), and step_block() over long offline runs, per operation mode. Also checks that
+step_block() reproduces the same seeded trajectory as repeated step() calls.
+Run from the repo root: python benchmarks/bench_ev_generator.py --steps 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from simulation.ev_signal_generator import DRIVE_CYCLE, EVSignalGenerator, pack_ocv
+
+KEYS = ("time", "voltage", "current", "temperature", "soc")
+
+
+def legacy_step(car, real_dt, speed_factor):
+    """EVSignalGenerator.step as it was: one NumPy call per noise draw and per clip"""
+    sim_dt = real_dt * speed_factor
+    car.sim_time += sim_dt
+    car.phase_timer += sim_dt
+    if car.operation_mode == "STANDBY":
+        target_i = np.random.normal(-0.5, 0.2)
+    elif car.operation_mode == "DISCHARGE":
+        mean, std, duration, following = DRIVE_CYCLE[car.phase]
+        target_i = mean + (np.random.normal(0, std) if std else 0.0)
+        if car.phase_timer > duration:
+            car.phase, car.phase_timer = following, 0
+    elif car.soc < 80.0:
+        target_i = 80.0 + np.random.normal(0, 5)
+        if car.phase_timer > 120:
+            car.phase, car.phase_timer = "CV", 0
+    else:
+        target_i = 0.0 if car.soc >= 98.0 else 20.0 + np.random.normal(0, 2)
+
+    if speed_factor > 10:
+        car.current = target_i + np.random.normal(0, 5.0)
+    else:
+        car.current = (0.9 * car.current) + (0.1 * target_i) + np.random.normal(0, 2.0)
+    car.soc = np.clip(car.soc + (car.current * (sim_dt / 3600.0) / car.capacity_ah) * 100.0, 0.0, 100.0)
+    target_temp = 25.0 + abs(car.current) / 200.0 * (35.0 if car.operation_mode == "CHARGE" else 40.0)
+    car.temp = target_temp if speed_factor > 50 else (0.99 * car.temp) + (0.01 * target_temp)
+    car.temp = np.clip(car.temp + np.random.normal(0, 0.1), -10, 70)
+    car.voltage = np.clip(pack_ocv(car.soc) + car.current * car.resistance + np.random.normal(0, 0.2), 280, 410)
+    return {"time": car.sim_time, "voltage": car.voltage, "current": car.current, "temperature": car.temp,
+            "soc": car.soc, "power": car.voltage * car.current / 1000.0}
+
+
+def rate(run, n):
+    start = time.perf_counter()
+    run()
+    return n / (time.perf_counter() - start)
+
+
+def max_difference(mode, n, real_dt, speed_factor, block=1000, seed=0):
+    """Largest |step_block - step| over n seeded steps (blocks of `block` steps)"""
+    stepped, blocked = EVSignalGenerator(start_time=0.0, seed=seed), EVSignalGenerator(start_time=0.0, seed=seed)
+    for car in (stepped, blocked):
+        car.set_mode(mode)
+    rows = [stepped.step(real_dt, speed_factor) for _ in range(n)]
+    blocks = [blocked.step_block(min(block, n - i), real_dt, speed_factor) for i in range(0, n, block)]
+    return max(float(np.abs(np.array([row[key] for row in rows])
+                            - np.concatenate([b[key] for b in blocks])).max()) for key in KEYS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--steps", type=int, default=1_000_000, help="steps per step_block() run")
+    parser.add_argument("--block", type=int, default=100_000, help="steps per step_block() call")
+    parser.add_argument("--speed", type=float, default=100.0)
+    args = parser.parse_args()
+    n_loop = min(args.steps, 20_000)
+
+    print(f"{'mode':<10} | {'legacy steps/s':>14} | {'step() steps/s':>14} | {'step_block steps/s':>18} | "
+          f"{'speedup':>7} | {'max |diff|':>10}")
+    for mode in ("STANDBY", "DISCHARGE", "CHARGE"):
+        np.random.seed(0)
+        legacy = EVSignalGenerator(start_time=0.0)
+        legacy.set_mode(mode)
+        legacy_rate = rate(lambda: [legacy_step(legacy, 0.1, args.speed) for _ in range(n_loop)], n_loop)
+
+        car = EVSignalGenerator(start_time=0.0, seed=0)
+        car.set_mode(mode)
+        step_rate = rate(lambda: [car.step(0.1, args.speed) for _ in range(n_loop)], n_loop)
+
+        car = EVSignalGenerator(start_time=0.0, seed=0)
+        car.set_mode(mode)
+        blocks = [args.block] * (args.steps // args.block) + ([args.steps % args.block] if args.steps % args.block else [])
+        block_rate = rate(lambda: [car.step_block(n, 0.1, args.speed) for n in blocks], args.steps)
+
+        # Same seed, same trajectory: a slow (current and temperature lag) and a fast setting
+        diff = max(max_difference(mode, 5000, 0.1, speed) for speed in (1.0, args.speed))
+        print(f"{mode:<10} | {legacy_rate:>14,.0f} | {step_rate:>14,.0f} | {block_rate:>18,.0f} | "
+              f"{block_rate / legacy_rate:>6.0f}x | {diff:>10.1e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Sustained binary telemetry ingestion (inference/ingest.py) on one machine.
+Load-generator processes built on FleetSignalGenerator stream frames of their own
+packs over TCP, a Unix socket or UDP as fast as the server takes them (stream
+connections are paced by the server's backpressure, UDP is not), and the server, in
+its own process, parses them into batches, either discarding them ("parse") or
+scoring them with TelemetryScorer ("score": SoC, SoH, safety for every sample).
+Rates are samples that reached the consumer per wall second, and per second of
+server CPU.
+Run from the repo root: python benchmarks/bench_ingest.py --transports tcp,unix,udp --duration 5
+"""
+import argparse
+import asyncio
+import multiprocessing as mp
+import os
+import socket
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from inference.ingest import (FRAME_HEADER, MAGIC, MAX_DATAGRAM_SAMPLES, SAMPLE_DTYPE, VERSION, IngestServer,
+                              TelemetryScorer, encode_frames)
+from simulation.fleet_signal_generator import FleetSignalGenerator
+
+
+def _generate(transport, address, lo, hi, duration, samples_per_frame, results):
+    """Streams simulated samples of packs lo .. hi-1 (one sample per pack per simulated second)"""
+    car = FleetSignalGenerator(hi - lo, seed=lo, start_time=0.0)
+    car.set_mode("DISCHARGE")
+    samples = np.empty(hi - lo, dtype=SAMPLE_DTYPE)
+    samples["pack_id"] = np.arange(lo, hi)
+
+    if transport == "udp":
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        samples_per_frame = min(samples_per_frame, MAX_DATAGRAM_SAMPLES)
+    elif transport == "unix":
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(address)
+    else:
+        sock = socket.create_connection(address)
+
+    sent = 0
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        data = car.step(1.0, 1.0)
+        samples["timestamp"] = data["time"]
+        samples["voltage"] = data["voltage"]
+        samples["current"] = data["current"]
+        samples["temperature"] = data["temperature"]
+        if transport == "udp":
+            for start in range(0, len(samples), samples_per_frame):
+                chunk = samples[start:start + samples_per_frame]
+                sock.sendto(FRAME_HEADER.pack(MAGIC, VERSION, len(chunk)) + chunk.tobytes(), address)
+        else:
+            sock.sendall(encode_frames(samples, samples_per_frame))
+        sent += len(samples)
+    sock.close()
+    results.put(sent)
+
+
+def _serve(transport, n_packs, score, batch_size, address_queue, stop, results):
+    async def run():
+        scorer = TelemetryScorer(n_packs) if score else None
+        first = []
+
+        def sink(batch):
+            if not first:
+                first.append(time.perf_counter())
+            if scorer is not None:
+                scorer.score(batch)
+
+        server = IngestServer(sink, batch_size=batch_size)
+        if transport == "unix":
+            path = os.path.join(tempfile.mkdtemp(), "ingest.sock")
+            await server.start(unix_path=path)
+            address_queue.put(path)
+        else:
+            addresses = await server.start(port=0 if transport == "tcp" else None,
+                                           udp_port=0 if transport == "udp" else None)
+            address_queue.put(addresses[0][1])
+
+        cpu = time.process_time()
+        while not stop.is_set():
+            await asyncio.sleep(0.05)
+        await server.close(timeout=30.0)
+        wall = time.perf_counter() - first[0] if first else float("nan")
+        results.put({**server.stats, "wall_s": wall, "cpu_s": time.process_time() - cpu})
+
+    asyncio.run(run())
+
+
+def run(transport, score, n_packs, generators, duration, samples_per_frame, batch_size):
+    address_queue, results, stop = mp.Queue(), mp.Queue(), mp.Event()
+    server = mp.Process(target=_serve, args=(transport, n_packs, score, batch_size, address_queue, stop, results))
+    server.start()
+    address = address_queue.get(timeout=120)
+
+    bounds = np.linspace(0, n_packs, generators + 1).astype(int)
+    sent_queue = mp.Queue()
+    clients = [mp.Process(target=_generate, args=(transport, address, bounds[i], bounds[i + 1], duration,
+                                                  samples_per_frame, sent_queue))
+               for i in range(generators)]
+    for client in clients:
+        client.start()
+    sent = sum(sent_queue.get() for _ in clients)
+    for client in clients:
+        client.join()
+    # UDP datagrams may still be in flight
+    time.sleep(0.2 if transport == "udp" else 0.0)
+    stop.set()
+    stats = results.get()
+    server.join()
+    return sent, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transports", default="tcp,unix,udp")
+    parser.add_argument("--packs", type=int, default=10_000)
+    parser.add_argument("--generators", type=int, default=2, help="load-generator processes")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds of sending per run")
+    parser.add_argument("--samples-per-frame", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=8192)
+    args = parser.parse_args()
+
+    print(f"{args.packs:,} packs, {args.generators} generator process(es), {os.cpu_count()} CPU(s)")
+    print(f"{'transport':<9} | {'consumer':<8} | {'sent':>11} | {'received':>11} | {'samples/s':>11} | "
+          f"{'per CPU s':>11} | {'pauses':>6} | {'dropped':>7}")
+    for transport in args.transports.split(","):
+        for score in (False, True):
+            sent, stats = run(transport, score, args.packs, args.generators, args.duration,
+                              args.samples_per_frame, args.batch_size)
+            print(f"{transport:<9} | {'score' if score else 'parse':<8} | {sent:>11,} | {stats['samples']:>11,} | "
+                  f"{stats['samples'] / stats['wall_s']:>11,.0f} | {stats['samples'] / stats['cpu_s']:>11,.0f} | "
+                  f"{stats['pauses']:>6,} | {stats['dropped_datagrams']:>7,}")
+
+
+if __name__ == "__main__":
+    main()
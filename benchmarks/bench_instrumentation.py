@@ -0,0 +1,85 @@
+"""
+Cost of the instrumentation layer: per call site while disabled / enabled, and on the
+dashboard's simulation tick (LiveSimulation) with metrics off vs on.
+Run from the repo root: python benchmarks/bench_instrumentation.py
+"""
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from simulation.live_simulation import LiveSimulation
+from utils.instrumentation import Metrics, SamplingProfiler, metrics
+
+
+def per_call(fn, n=200_000):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1e9
+
+
+def timer_call(registry):
+    with registry.timer("stage"):
+        pass
+
+
+def tick_rate(enabled, ticks=200, speed=5000.0):
+    """Sub-steps per second through LiveSimulation._advance (one 0.1 s tick at `speed`)"""
+    metrics.enable() if enabled else metrics.disable()
+    sim = LiveSimulation(history_size=100_000, seed=0)
+    sim.set_mode("DISCHARGE")
+    sim.configure(speed_factor=speed)
+    sim.soh_ai.model  # load outside the timing
+    for _ in range(5):
+        sim._advance(0.1 * speed)
+    start = time.perf_counter()
+    for _ in range(ticks):
+        sim._advance(0.1 * speed)
+    took = time.perf_counter() - start
+    return sim.stats["samples"] / took, took / ticks * 1e3, sim
+
+
+def main():
+    empty = per_call(lambda: None)
+    off, on = Metrics(enabled=False), Metrics(enabled=True)
+    print(f"per call site (ns, minus the {empty:.0f} ns of calling an empty lambda):")
+    print(f"  timer()   disabled {per_call(lambda: timer_call(off)) - empty:>7.0f} | enabled {per_call(lambda: timer_call(on)) - empty:>7.0f}")
+    print(f"  observe() disabled {per_call(lambda: off.observe('x', 3.0)) - empty:>7.0f} | enabled {per_call(lambda: on.observe('x', 3.0)) - empty:>7.0f}")
+    print(f"  inc()     disabled {per_call(lambda: off.inc('x')) - empty:>7.0f} | enabled {per_call(lambda: on.inc('x')) - empty:>7.0f}")
+
+    print("\nLiveSimulation tick at 5000x (500 sub-steps per tick):")
+    rates = {}
+    for enabled in (False, True, False, True):
+        rate, ms, sim = tick_rate(enabled)
+        rates.setdefault(enabled, []).append(rate)
+    for enabled, values in rates.items():
+        print(f"  metrics {'on ' if enabled else 'off'}  {max(values):>10,.0f} sub-steps/s")
+    print(f"  overhead when on: {(1 - max(rates[True]) / max(rates[False])) * 100:.1f}%")
+
+    print("\nstages recorded (metrics on):")
+    for row in metrics.stage_summary():
+        print(f"  {row['stage']:<14} {row['calls']:>6} calls  mean {row['mean_ms']:>7.3f} ms  "
+              f"p99 {row['p99_ms']:>7.3f} ms  {row['share']:>5.0%}")
+
+    # Sampling profiler on a thread running the same loop
+    import threading
+    metrics.disable()
+    done = threading.Event()
+
+    def loop():
+        while not done.is_set():
+            sim._advance(500.0)
+    worker = threading.Thread(target=loop)
+    worker.start()
+    profiler = SamplingProfiler(worker, interval=0.002).run_for(2.0)
+    done.set()
+    worker.join()
+    print(f"\nsampling profiler: {profiler.samples} samples; hottest functions (self %):")
+    for function, own, total in profiler.top(6):
+        print(f"  {function:<40} {100 * own / profiler.samples:>5.1f}%  (total {100 * total / profiler.samples:.0f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+OCV <-> SoC tables (utils/ocv_tables.py) in the SoC corrector.
+  accuracy     SoC read back from the resting voltage: the old linear inverse
+               ((V / 96 - 3.2) * 100) against the table, per chemistry, at 25 °C and at
+               temperatures between the table's grid rows
+  convergence  SOCPredictor from its 90 % initial guess on a resting pack at 10 °C:
+               simulated hours until the estimate stays within 1 point of the truth
+  cost         inverting OCV for a batch of packs: the table against per-pack root
+               finding (np.roots) and vectorized Newton iterations on the cubic
+Run from the repo root: python benchmarks/bench_ocv_tables.py
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from inference.soc_predictor import SOCPredictor
+from simulation.ev_signal_generator import EVSignalGenerator, pack_ocv
+from utils.ocv_tables import CHEMISTRIES, get_ocv_table
+
+
+class LinearInverse:
+    """The corrector's previous voltage -> SoC formula"""
+    def soc(self, voltage, temperature=None):
+        return (np.asarray(voltage) / 96.0 - 3.2) * 100
+
+
+def accuracy():
+    soc = np.linspace(0.0, 100.0, 2001)
+    print(f"{'chemistry':<9} | {'linear max |dSoC|':>17} | {'table max |dSoC|':>16} | {'off-grid temperatures':>21}")
+    for chemistry in CHEMISTRIES:
+        table = get_ocv_table(chemistry)
+        ocv = table.ocv(soc, 25.0)
+        off_grid = max(np.abs(table.soc(table.ocv(soc, t), t) - soc).max() for t in (-17.5, 12.5, 57.5))
+        print(f"{chemistry:<9} | {np.abs(LinearInverse().soc(ocv) - soc).max():>17.2f} | "
+              f"{np.abs(table.soc(ocv, 25.0) - soc).max():>16.4f} | {off_grid:>21.4f}")
+
+
+def convergence(hours=24.0):
+    print(f"{'chemistry':<9} | {'true SoC':>8} | {'linear: h to 1 pt':>17} | {'final err':>9} | "
+          f"{'table: h to 1 pt':>16} | {'final err':>9}")
+    for chemistry in CHEMISTRIES:
+        for true_soc in (30.0, 50.0, 70.0):
+            car = EVSignalGenerator(start_time=0.0, seed=0, chemistry=chemistry)
+            car.soc = true_soc
+            car.temp = 10.0
+            car.set_mode("STANDBY")
+            data = car.step_block(int(hours * 60), 60.0, 1.0)  # one sample a minute
+            line = f"{chemistry:<9} | {true_soc:>8.0f}"
+            for inverse in (LinearInverse(), get_ocv_table(chemistry)):
+                predictor = SOCPredictor(chemistry=chemistry)
+                predictor.ocv_table = inverse
+                error = np.abs(predictor.predict_series(data["voltage"], data["current"], data["temperature"],
+                                                        data["time"]) - data["soc"])
+                outside = np.flatnonzero(error > 1.0)
+                settle = "never" if len(outside) and outside[-1] == len(error) - 1 else \
+                    f"{(outside[-1] + 1 if len(outside) else 0) / 60:.1f}"
+                line += f" | {settle:>17} | {error[-1]:>9.2f}"
+            print(line)
+
+
+def _newton(voltage, iterations=8):
+    """SoC of pack_ocv(soc) = voltage by Newton's method on the cubic, vectorized"""
+    s = np.full_like(voltage, 0.5)
+    for _ in range(iterations):
+        s -= (288 + 70 * s + 45 * s**3 - voltage) / (70 + 135 * s**2)
+    return np.clip(s, 0.0, 1.0) * 100
+
+
+def _roots(voltage):
+    """SoC by np.roots per pack"""
+    out = np.empty(len(voltage))
+    for i, v in enumerate(voltage):
+        roots = np.roots([45.0, 0.0, 70.0, 288.0 - v])
+        out[i] = 100 * roots[np.abs(roots.imag) < 1e-9].real.max()
+    return out
+
+
+def cost():
+    table = get_ocv_table("nmc")
+    rng = np.random.default_rng(0)
+    print(f"{'packs':>9} | {'table ns/pack':>13} | {'Newton ns/pack':>14} | {'np.roots ns/pack':>16} | "
+          f"{'max |table - Newton|':>20}")
+    for n in (1, 100, 10_000, 1_000_000):
+        soc = rng.uniform(0.0, 100.0, n)
+        voltage = pack_ocv(soc)
+        temperature = rng.uniform(-10.0, 45.0, n)
+        timings = {}
+        repeat = max(5, min(1000, 100_000 // n))
+        for name, fn in (("table", lambda: table.soc(voltage, temperature)), ("newton", lambda: _newton(voltage)),
+                         ("roots", lambda: _roots(voltage[:1000]))):
+            fn()
+            start = time.perf_counter()
+            for _ in range(repeat):
+                fn()
+            timings[name] = (time.perf_counter() - start) / repeat / min(n, 1000 if name == "roots" else n) * 1e9
+        difference = np.abs(table.soc(voltage, temperature) - _newton(voltage)).max()
+        print(f"{n:>9,} | {timings['table']:>13,.0f} | {timings['newton']:>14,.0f} | {timings['roots']:>16,.0f} | "
+              f"{difference:>20.6f}")
+
+    # One sample as Python floats (SOCPredictor.predict)
+    repeat = 20_000
+    start = time.perf_counter()
+    for _ in range(repeat):
+        table.soc(350.0, 12.5)
+    print(f"single float sample: table {(time.perf_counter() - start) / repeat * 1e9:,.0f} ns")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=float, default=24.0, help="resting time simulated per convergence case")
+    args = parser.parse_args()
+
+    accuracy()
+    convergence(args.hours)
+    cost()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Scaling of the sharded fleet pipeline (simulation/fleet_pipeline.py) with the shard count.
+Each shard runs a simulate and a score process; speedup is relative to one shard.
+Run from the repo root: python benchmarks/bench_pipeline.py --packs 20000 --steps 1800
+"""
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from simulation.fleet_pipeline import format_stats, run_pipeline
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--packs", type=int, default=20_000)
+    parser.add_argument("--steps", type=int, default=1800)
+    parser.add_argument("--block-steps", type=int, default=60)
+    parser.add_argument("--max-shards", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--verbose", action="store_true", help="print the per-stage table of every run")
+    args = parser.parse_args()
+
+    shard_counts = sorted({1, args.max_shards} | {2 ** k for k in range(args.max_shards.bit_length()) if 2 ** k <= args.max_shards})
+    print(f"{args.packs:,} packs x {args.steps:,} steps, {os.cpu_count()} CPUs")
+    print(f"{'shards':>6} | {'wall s':>8} | {'pack-steps/s':>14} | {'speedup':>8}")
+
+    base = None
+    for n_shards in shard_counts:
+        result = run_pipeline(args.packs, args.steps, n_shards=n_shards, block_steps=args.block_steps)
+        stats = result["stats"]
+        base = base or stats["pack_steps_per_s"]
+        print(f"{n_shards:>6} | {stats['wall_s']:>8.2f} | {stats['pack_steps_per_s']:>14,.0f} | "
+              f"{stats['pack_steps_per_s'] / base:>7.2f}x")
+        if args.verbose:
+            print(format_stats(stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Backtesting a recorded month of 10 Hz single-pack telemetry through simulation.replay.
+A synthetic recording (drive / park / charge days) is written as NPZ and CSV, then each
+is replayed in a fresh process, which reports its wall time and peak memory.
+Also compares the vectorized SoC filter with the per-sample SOCPredictor loop.
+Run from the repo root: python benchmarks/bench_replay.py --days 30
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from simulation.ev_signal_generator import pack_ocv
+
+RATE_HZ = 10
+
+
+def synthetic_recording(days, seed=0):
+    """Columns of a `days`-long 10 Hz recording: two drives, parking and a night charge per day"""
+    rng = np.random.default_rng(seed)
+    n = int(days * 86400 * RATE_HZ)
+    t = 1.7e9 + np.arange(n) / RATE_HZ
+
+    # 1. Current from a daily schedule (seconds of day -> amps), plus noise
+    day_s = (np.arange(n) / RATE_HZ) % 86400
+    current = np.full(n, -0.5, dtype=np.float32)
+    for lo, hi in ((7 * 3600, 8 * 3600), (17 * 3600, 18 * 3600)):
+        drive = (day_s >= lo) & (day_s < hi)
+        current[drive] = -60.0 + 40.0 * np.sin(day_s[drive] / 30.0)
+    current[(day_s >= 22 * 3600) & (day_s < 24 * 3600)] = 30.0
+    current += rng.normal(0, 2.0, n).astype(np.float32)
+
+    # 2. Pack response
+    soc = np.clip(60.0 + np.cumsum(current / RATE_HZ / 3600.0), 0.0, 100.0)
+    voltage = pack_ocv(soc) + 0.05 * current + rng.normal(0, 0.2, n)
+    temperature = 25.0 + np.abs(current) / 200.0 * 40.0 + rng.normal(0, 0.1, n)
+    return {"time": t, "voltage": voltage.astype(np.float32), "current": current,
+            "temperature": temperature.astype(np.float32), "soc": soc.astype(np.float32)}
+
+
+def peak_rss_mb():
+    """High-water RSS of this process image (ru_maxrss would include the parent's, as it survives exec)"""
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def child(path):
+    from simulation.replay import backtest
+
+    summary = backtest(path)
+    summary["max_rss_mb"] = peak_rss_mb()
+    print(json.dumps({key: value for key, value in summary.items() if key not in ("soh", "soh_time")}))
+
+
+def run_child(path):
+    out = subprocess.run([sys.executable, __file__, "--child", path], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def soc_loop_vs_series(n=200_000):
+    from inference.soc_predictor import SOCPredictor
+
+    data = synthetic_recording(n / RATE_HZ / 86400)
+    args = [data[name].astype(np.float64) for name in ("voltage", "current", "temperature", "time")]
+    model = SOCPredictor()
+    start = time.perf_counter()
+    loop = np.array([model.predict(v, i, temp, t) for v, i, temp, t in zip(*(a.tolist() for a in args))])
+    loop_rate = n / (time.perf_counter() - start)
+    model = SOCPredictor()
+    start = time.perf_counter()
+    series = model.predict_series(*args)
+    series_rate = n / (time.perf_counter() - start)
+    return loop_rate, series_rate, float(np.abs(loop - series).max())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=float, default=30.0, help="length of the NPZ recording")
+    parser.add_argument("--csv-days", type=float, default=3.0, help="length of the CSV recording")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child)
+        return
+
+    loop_rate, series_rate, diff = soc_loop_vs_series()
+    print(f"SoC filter: per-sample loop {loop_rate:,.0f} samples/s | predict_series {series_rate:,.0f} samples/s "
+          f"({series_rate / loop_rate:,.0f}x, max |diff| {diff:.1e})")
+
+    out = tempfile.mkdtemp(prefix="elektra-replay-")
+    try:
+        import pandas as pd
+
+        data = synthetic_recording(args.days)
+        np.savez(os.path.join(out, "month.npz"), **data)
+        n_csv = int(args.csv_days * 86400 * RATE_HZ)
+        pd.DataFrame({name: values[:n_csv] for name, values in data.items()}).to_csv(
+            os.path.join(out, "days.csv"), index=False)
+        del data
+
+        print(f"\n{'recording':<22} | {'samples':>12} | {'wall s':>7} | {'samples/s':>12} | {'x real time':>11} | {'peak RSS':>9}")
+        summaries = {}
+        for label, name in ((f"{args.days:g} days NPZ", "month.npz"), (f"{args.csv_days:g} days CSV", "days.csv")):
+            path = os.path.join(out, name)
+            s = summaries[name] = run_child(path)
+            print(f"{label:<22} | {s['samples']:>12,} | {s['wall_s']:>7.2f} | {s['samples_per_s']:>12,.0f} | "
+                  f"{s['speedup']:>11,.0f} | {s['max_rss_mb']:>6.0f} MB  (file {os.path.getsize(path) / 1e6:,.0f} MB)")
+        print("alerts over the NPZ recording: "
+              + ", ".join(f"{code} x{a['raised']}" for code, a in summaries["month.npz"]["alerts"].items()))
+    finally:
+        shutil.rmtree(out, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
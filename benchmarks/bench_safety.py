@@ -0,0 +1,56 @@
+"""
+SafetyEngine throughput on 1M pack-samples in different block shapes, vs check_safety per sample.
+Run from the repo root: python benchmarks/bench_safety.py
+"""
+import numpy as np
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from safety.health_rules import check_safety
+from safety.rule_engine import SafetyEngine
+
+# (steps, packs) blocks of one million pack-samples each
+SHAPES = [(1, 1_000_000), (100, 10_000), (1000, 1000)]
+
+
+def random_walks(steps, n_packs, seed=0):
+    """SoC / temperature random walks that cross the alert thresholds regularly"""
+    rng = np.random.default_rng(seed)
+    soc = np.clip(20 + np.cumsum(rng.normal(0, 1.0, (steps, n_packs)), axis=0), 0, 100)
+    temp = 45 + np.cumsum(rng.normal(0, 0.5, (steps, n_packs)), axis=0)
+    soh = rng.uniform(60, 100, n_packs)
+    return soc, soh, temp
+
+
+def main():
+    print(f"{'steps x packs':>15} | {'seconds':>8} | {'samples/s':>12} | {'raised':>8} | {'active samples':>14}")
+    for steps, n_packs in SHAPES:
+        soc, soh, temp = random_walks(steps, n_packs)
+        engine = SafetyEngine(n_packs)
+        t = np.arange(steps, dtype=np.float64)
+
+        start = time.perf_counter()
+        if steps == 1:
+            flags = engine.evaluate(0.0, soc=soc[0], soh=soh, temperature=temp[0])
+        else:
+            flags = engine.evaluate(t, soc=soc, soh=soh, temperature=temp)
+        took = time.perf_counter() - start
+
+        print(f"{f'{steps} x {n_packs}':>15} | {took:>8.3f} | {steps * n_packs / took:>12,.0f} | "
+              f"{np.count_nonzero(flags['raised']):>8,} | {np.count_nonzero(flags['active']):>14,}")
+
+    # The stateless per-sample function, for reference
+    soc, soh, temp = random_walks(100, 1000)
+    start = time.perf_counter()
+    for k in range(100):
+        for p in range(1000):
+            check_safety(soc[k, p], soh[p], temp[k, p])
+    took = time.perf_counter() - start
+    print(f"check_safety per sample: {100_000 / took:,.0f} samples/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Local load generator for inference/service.py (fully offline).
+Starts the service in a subprocess, drives it with closed-loop keep-alive clients
+spread over several processes, and prints client-side throughput/latency plus the
+server's own /metrics.
+Run from the repo root: python benchmarks/bench_service.py --clients 4 --connections 64
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+
+from simulation.fleet_signal_generator import FleetSignalGenerator
+
+
+async def _request(reader, writer, method, path, payload=None):
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    length = 0
+    for line in head.decode("latin-1").split("\r\n")[1:]:
+        if line.lower().startswith("content-length:"):
+            length = int(line.split(":", 1)[1])
+    return json.loads(await reader.readexactly(length))
+
+
+async def _connection(host, port, packs, duration, samples_per_request, latencies, seed):
+    reader, writer = await asyncio.open_connection(host, port)
+    car = FleetSignalGenerator(len(packs), seed=seed, start_time=0.0)
+    car.set_mode("DISCHARGE")
+
+    end = time.perf_counter() + duration
+    cursor = 0
+    data = car.step(0.1, 1)
+    while time.perf_counter() < end:
+        samples = []
+        for _ in range(samples_per_request):
+            if cursor == len(packs):
+                data = car.step(0.1, 1)
+                cursor = 0
+            samples.append({
+                "pack_id": packs[cursor],
+                "voltage": float(data["voltage"][cursor]),
+                "current": float(data["current"][cursor]),
+                "temperature": float(data["temperature"][cursor]),
+                "timestamp": float(data["time"]),
+            })
+            cursor += 1
+
+        payload = samples[0] if samples_per_request == 1 else {"samples": samples}
+        start = time.perf_counter()
+        await _request(reader, writer, "POST", "/soc", payload)
+        latencies.append(time.perf_counter() - start)
+    writer.close()
+
+
+def _client_process(host, port, client_id, connections, packs_per_connection, duration, samples_per_request, queue):
+    latencies = []
+
+    async def run():
+        tasks = []
+        for c in range(connections):
+            first = (client_id * connections + c) * packs_per_connection
+            packs = [f"pack-{first + k}" for k in range(packs_per_connection)]
+            tasks.append(_connection(host, port, packs, duration, samples_per_request, latencies, seed=first))
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    queue.put(latencies)
+
+
+async def _fetch(host, port, path):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        return await _request(reader, writer, "GET", path)
+    finally:
+        writer.close()
+
+
+def _wait_until_up(host, port, timeout=60.0):
+    end = time.time() + timeout
+    while time.time() < end:
+        try:
+            return asyncio.run(_fetch(host, port, "/health"))
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("service did not come up")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--clients", type=int, default=4, help="client processes")
+    parser.add_argument("--connections", type=int, default=64, help="connections per client process")
+    parser.add_argument("--packs", type=int, default=10, help="packs per connection")
+    parser.add_argument("--samples-per-request", type=int, default=1)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--max-batch", type=int, default=512)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    args = parser.parse_args()
+    host = "127.0.0.1"
+
+    server = subprocess.Popen(
+        [sys.executable, "-m", "inference.service", "--port", str(args.port),
+         "--max-batch", str(args.max_batch), "--max-wait-ms", str(args.max_wait_ms)],
+        cwd=ROOT,
+    )
+    try:
+        _wait_until_up(host, args.port)
+
+        queue = mp.Queue()
+        procs = [
+            mp.Process(target=_client_process, args=(host, args.port, i, args.connections, args.packs,
+                                                     args.duration, args.samples_per_request, queue))
+            for i in range(args.clients)
+        ]
+        for p in procs:
+            p.start()
+        latencies = []
+        for _ in procs:
+            latencies.extend(queue.get())
+        for p in procs:
+            p.join()
+
+        lat_ms = np.array(latencies) * 1e3
+        n_samples = len(lat_ms) * args.samples_per_request
+        print(f"requests: {len(lat_ms):,}  samples: {n_samples:,}")
+        print(f"throughput: {len(lat_ms) / args.duration:,.0f} req/s, {n_samples / args.duration:,.0f} samples/s")
+        print("client latency ms: " + ", ".join(
+            f"p{q}={np.percentile(lat_ms, q):.2f}" for q in (50, 90, 99)) + f", max={lat_ms.max():.2f}")
+
+        metrics = asyncio.run(_fetch(host, args.port, "/metrics"))
+        print("server metrics:")
+        print(json.dumps(metrics["endpoints"], indent=2))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+SoC latency/throughput: Coulomb counting vs the LSTM (NumPy runtime, window and stateful).
+Each call scores one new sample for every pack in the fleet.
+Run from the repo root: python benchmarks/bench_soc_lstm.py
+"""
+import numpy as np
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from inference.lstm_soc_predictor import LSTMSOCPredictor
+from inference.soc_predictor import BatchSOCPredictor, SOCPredictor
+from simulation.fleet_signal_generator import FleetSignalGenerator
+
+FLEET_SIZES = [1, 100, 10_000]
+# Placeholder scaler (the simulator's operating envelope): these runs time the runtime,
+# the SoC values themselves are meaningless without the training scaler
+TIMING_SCALER = {"input_min": (270.0, -200.0, 0.0), "input_max": (410.0, 100.0, 60.0), "output_scale": 100.0}
+
+
+def fleet_ticks(n_packs, n_ticks, seed=0):
+    """Pre-generated (voltage, current, temperature, time) per tick so generation isn't timed"""
+    car = FleetSignalGenerator(n_packs, seed=seed, start_time=0.0)
+    car.set_mode("DISCHARGE")
+    ticks = []
+    for _ in range(n_ticks):
+        d = car.step(1.0, 1)
+        ticks.append((d["voltage"], d["current"], d["temperature"], d["time"]))
+    return ticks
+
+
+def time_ticks(predict, ticks, warmup=20):
+    """Seconds per tick (median over the timed ticks, after a warm-up that fills the windows)"""
+    for tick in ticks[:warmup]:
+        predict(*tick)
+    took = []
+    for tick in ticks[warmup:]:
+        start = time.perf_counter()
+        predict(*tick)
+        took.append(time.perf_counter() - start)
+    return float(np.median(took))
+
+
+def main():
+    print(f"{'packs':>7} | {'estimator':<22} | {'ms / tick':>10} | {'samples/s':>12}")
+    for n_packs in FLEET_SIZES:
+        n_ticks = 20 + (200 if n_packs <= 100 else 20)
+        ticks = fleet_ticks(n_packs, n_ticks)
+        ids = [f"pack-{i}" for i in range(n_packs)]
+
+        rows = []
+        if n_packs <= 100:
+            scalar = [SOCPredictor() for _ in ids]
+            rows.append(("Coulomb (per pack)", lambda v, i, t, ts: [
+                p.predict(v[k], i[k], t[k], ts) for k, p in enumerate(scalar)]))
+
+        batch = BatchSOCPredictor()
+        rows.append(("Coulomb (batched)", lambda v, i, t, ts: batch.predict(ids, v, i, t, ts)))
+        for mode in ("window", "stateful"):
+            lstm = LSTMSOCPredictor(mode=mode, **TIMING_SCALER)
+            rows.append((f"LSTM {mode}", lambda v, i, t, ts, lstm=lstm: lstm.predict(ids, v, i, t, ts)))
+
+        for name, predict in rows:
+            per_tick = time_ticks(predict, ticks)
+            print(f"{n_packs:>7} | {name:<22} | {per_tick * 1e3:>10.3f} | {n_packs / per_tick:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
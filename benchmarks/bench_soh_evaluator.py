@@ -0,0 +1,139 @@
+"""
+SoH model rows saved by inference.soh_evaluator, against scoring every pack on every tick
+with SOHPredictor:
+  dashboard  one LiveSimulation per mode and speed; the gated SoH goes through the
+             dashboard's smoothing and is compared with the ungated smoothed SoH
+  fleet      FleetSignalGenerator packs with random modes (reshuffled every 4 hours),
+             scored once per 5-minute block, for two cache sizes
+Each case runs with the exact default tolerances, with LOOSE_TOLERANCES and with the fleet
+setting (FLEET_TOLERANCES + FLEET_MAX_STALENESS_S).
+Run from the repo root: python benchmarks/bench_soh_evaluator.py --packs 2000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from inference.soh_evaluator import FLEET_MAX_STALENESS_S, FLEET_TOLERANCES, LOOSE_TOLERANCES, SOHEvaluator
+from inference.soh_predictor import SOHPredictor
+from simulation.ev_signal_generator import degraded_capacity
+from simulation.fleet_signal_generator import FleetSignalGenerator
+from simulation.live_simulation import LiveSimulation
+from utils.dvdq_features import load_chemistry_features
+from utils.streaming_features import FleetFeatureWindow
+
+MODES = ("STANDBY", "DISCHARGE", "CHARGE")
+SETTINGS = {
+    "exact": {},
+    "loose": {"tolerances": LOOSE_TOLERANCES},
+    "fleet": {"tolerances": FLEET_TOLERANCES, "max_staleness_s": FLEET_MAX_STALENESS_S},
+}
+
+
+def smooth(raw, size=20, alpha=0.1):
+    """LiveSimulation's SoH smoothing: EMA of the mean of the last `size` raw values"""
+    buffer, smoothed, out = [], 100.0, np.empty(len(raw))
+    for i, value in enumerate(raw):
+        buffer = (buffer + [value])[-size:]
+        if len(buffer) >= 5:
+            smoothed = alpha * np.mean(buffer) + (1 - alpha) * smoothed
+        out[i] = smoothed
+    return out
+
+
+def dashboard(predictor, ticks, tick_s=0.05):
+    """(rows, model rows, worst smoothed |difference|) per setting over modes and speeds"""
+    totals = {name: [0, 0, 0.0] for name in SETTINGS}
+    print(f"{'speed':>6} | {'mode':<9} | " + " | ".join(f"{name + ' rows/model':>17} | {'max |dSoH|':>10}"
+                                                      for name in SETTINGS))
+    for speed in (1, 10, 100, 1000):
+        for mode in MODES:
+            sim = LiveSimulation(history_size=ticks, seed=1)
+            sim.set_mode(mode)
+            sim.configure(speed_factor=speed)
+            features, times = [], []
+            for _ in range(ticks):
+                sim._advance(tick_s * speed)
+                features.append({**sim.features.features(sim.cycle), **sim.static_features})
+                times.append(sim.car.sim_time)
+            reference = smooth([predictor.predict(f, {}) for f in features])
+
+            line = f"{speed:>6} | {mode:<9}"
+            for name, settings in SETTINGS.items():
+                evaluator = SOHEvaluator(predictor, capacity=1, **settings)
+                gated = smooth([evaluator.evaluate_one(f, {}, t) for f, t in zip(features, times)])
+                summary = evaluator.summary()
+                difference = float(np.abs(gated - reference).max())
+                totals[name][0] += summary["rows"]
+                totals[name][1] += summary["model_rows"]
+                totals[name][2] = max(totals[name][2], difference)
+                line += f" | {summary['reduction']:>16.1f}x | {difference:>10.3f}"
+            print(line)
+    for name, (rows, model_rows, difference) in totals.items():
+        print(f"dashboard {name:<6}: {rows / model_rows:.1f}x fewer model rows, "
+              f"smoothed SoH within {difference:.3f} points")
+
+
+def fleet(predictor, n_packs, blocks, block_steps=60, seed=0):
+    """Reduction, error against predict_many (p99 and worst) and time per block for each setting and cache size"""
+    rng = np.random.default_rng(seed)
+    car = FleetSignalGenerator(n_packs, seed=seed, start_time=0.0)
+    window = FleetFeatureWindow(n_packs, window=100)
+    static_features = load_chemistry_features()
+    cycle = rng.uniform(0, 2000, n_packs)
+    pack_ids = list(range(n_packs))
+    evaluators = {(name, size): SOHEvaluator(predictor, cache_size=size, capacity=n_packs, **settings)
+                  for name, settings in SETTINGS.items() for size in (1 << 12, 1 << 16)}
+    errors = {key: [] for key in evaluators}
+    busy = dict.fromkeys(evaluators, 0.0)
+    busy_plain = 0.0
+
+    for b in range(blocks):
+        if b % 48 == 0:
+            modes = rng.choice(MODES, n_packs, p=[0.7, 0.15, 0.15])
+            for mode in MODES:
+                car.set_mode(mode, np.flatnonzero(modes == mode))
+        voltage = np.empty((block_steps, n_packs))
+        for j in range(block_steps):
+            data = car.step(0.001, 5000)
+            voltage[j] = data["voltage"]
+        window.update(voltage, degraded_capacity(100.0, cycle, data["temperature"], data["current"]))
+        features = {**window.features(cycle), **static_features}
+
+        start = time.perf_counter()
+        exact = predictor.predict_many(features)
+        busy_plain += time.perf_counter() - start
+        for key, evaluator in evaluators.items():
+            start = time.perf_counter()
+            soh = evaluator.evaluate(pack_ids, features, data["time"])
+            busy[key] += time.perf_counter() - start
+            errors[key].append(np.abs(soh - exact))
+
+    print(f"fleet: {n_packs:,} packs x {blocks} blocks, predict_many {1e3 * busy_plain / blocks:.1f} ms/block")
+    for (name, size), evaluator in evaluators.items():
+        summary = evaluator.summary()
+        print(f"  {name:<6} cache {size:>6,}: {summary['reduction']:>5.1f}x fewer model rows "
+              f"(skip {summary['skip_rate']:.0%}, hit {summary['hit_rate']:.0%}), "
+              f"{1e3 * busy[(name, size)] / blocks:.1f} ms/block, |dSoH| p99 {np.percentile(errors[(name, size)], 99):.3f} "
+              f"max {np.max(errors[(name, size)]):.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ticks", type=int, default=1200, help="dashboard ticks per mode and speed")
+    parser.add_argument("--packs", type=int, default=2000)
+    parser.add_argument("--blocks", type=int, default=144, help="fleet blocks of 5 simulated minutes")
+    args = parser.parse_args()
+
+    predictor = SOHPredictor()
+    predictor.preload()
+    dashboard(predictor, args.ticks)
+    fleet(predictor, args.packs, args.blocks)
+
+
+if __name__ == "__main__":
+    main()
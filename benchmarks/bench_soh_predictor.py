@@ -0,0 +1,76 @@
+"""
+SOHPredictor throughput: per-row predict() vs batched predict_many().
+Run from the repo root: python benchmarks/bench_soh_predictor.py
+"""
+import numpy as np
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from inference.soh_predictor import SOHPredictor
+
+BATCH_SIZES = [1, 100, 100_000]
+
+
+def synthetic_features(n_rows, seed=0):
+    """Plausible feature rows (in feature_order) around a healthy 100 Ah pack"""
+    rng = np.random.default_rng(seed)
+    capacity = rng.uniform(70.0, 100.0, n_rows)
+    X = np.column_stack([
+        rng.uniform(0, 5000, n_rows),        # cycle
+        rng.normal(350.0, 15.0, n_rows),     # mean_voltage
+        rng.uniform(0.0, 2.0, n_rows),       # voltage_std
+        rng.normal(320.0, 10.0, n_rows),     # min_voltage
+        rng.normal(380.0, 10.0, n_rows),     # max_voltage
+        capacity,                            # capacity_ah
+        capacity / 100.0,                    # capacity_ratio
+        np.full(n_rows, 8.0),                # anode_dvdq_area
+        np.full(n_rows, 3.0),                # anode_dvdq_peak_count
+        np.full(n_rows, 5.0),                # anode_dvdq_mean
+        np.full(n_rows, 3.5),                # cathode_dvdq_area
+        np.full(n_rows, 3.0),                # cathode_dvdq_peak_count
+        np.full(n_rows, 2.7),                # cathode_dvdq_mean
+        rng.normal(0.0, 1e-4, n_rows),       # delta_capacity
+        rng.uniform(0.0, 2.0, n_rows),       # rolling_voltage_std
+    ])
+    return X.astype(np.float32)
+
+
+def time_call(fn, min_time=0.5):
+    """Best-of timing: repeats fn until min_time has elapsed, returns seconds per call"""
+    fn()  # warm-up
+    best = float("inf")
+    elapsed = 0.0
+    while elapsed < min_time:
+        start = time.perf_counter()
+        fn()
+        took = time.perf_counter() - start
+        best = min(best, took)
+        elapsed += took
+    return best
+
+
+def main():
+    predictor = SOHPredictor()
+    print(f"model: {type(predictor.model).__name__ if predictor.model is not None else 'fallback'}")
+    print(f"{'rows':>8} | {'predict() rows/s':>18} | {'predict_many() rows/s':>22}")
+
+    for n_rows in BATCH_SIZES:
+        X = synthetic_features(n_rows)
+
+        # The per-row path only makes sense for small batches
+        loop_rate = float("nan")
+        if n_rows <= 100:
+            rows = [dict(zip(predictor.feature_order, x)) for x in X.tolist()]
+            per_call = time_call(lambda: [predictor.predict(r, {}) for r in rows])
+            loop_rate = n_rows / per_call
+
+        per_call = time_call(lambda: predictor.predict_many(X))
+        batch_rate = n_rows / per_call
+        print(f"{n_rows:>8} | {loop_rate:>18,.0f} | {batch_rate:>22,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Cold-start benchmark: fresh interpreter -> first SoH prediction.
+Every run is a new process, so nothing is warm except the OS page cache.
+Run from the repo root: python benchmarks/bench_startup.py [--runs 5] [--json out.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Executed in the child; prints one JSON line of phase timings (seconds)
+CHILD = r"""
+import json, os, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, {root!r})
+os.chdir({cwd!r})   # deliberately not the repo root: model paths must not depend on cwd
+
+from inference.soh_predictor import SOHPredictor
+from utils.dvdq_features import load_dvdq_features
+from utils.paths import DATA_DIR
+t_import = time.perf_counter()
+
+predictor = SOHPredictor()
+t_init = time.perf_counter()
+
+static = {{**load_dvdq_features(os.path.join(DATA_DIR, "dv_dq_anode.csv"), "anode"),
+          **load_dvdq_features(os.path.join(DATA_DIR, "dv_dq_cathode.csv"), "cathode")}}
+t_features = time.perf_counter()
+
+predictor.predict({{"cycle": 100, "mean_voltage": 350.0, "capacity_ah": 95.0, "capacity_ratio": 0.95}}, static)
+t_predict = time.perf_counter()
+
+print(json.dumps({{
+    "import": t_import - t0,
+    "init": t_init - t_import,
+    "chemistry_features": t_features - t_init,
+    "first_predict": t_predict - t_features,
+    "total": t_predict - t0,
+}}))
+"""
+
+
+def run_once(cwd):
+    out = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", CHILD.format(root=ROOT, cwd=cwd)],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start to first SoH prediction")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", dest="json_path", default=None, help="write the median timings here")
+    args = parser.parse_args()
+
+    cwd = os.path.expanduser("~")
+    runs = [run_once(cwd) for _ in range(args.runs)]
+    median = {phase: statistics.median(r[phase] for r in runs) for phase in runs[0]}
+
+    print(f"median of {args.runs} cold starts (s):")
+    for phase, seconds in median.items():
+        print(f"  {phase:<20} {seconds:8.3f}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"runs": runs, "median": median}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+FleetStateStore (utils/state_store.py): footprint, checkpoint / restore time and exact resume.
+  scale   --packs simulated packs with the simulator, SoC filter, SoH evaluator and safety
+          engine on one store: bytes per pack (against per-pack SOCPredictor + SafetyEngine
+          objects), checkpoint time and size, restore time (copied, and lazily mapped)
+  resume  --resume-packs packs streamed through TelemetryScorer; the run is checkpointed
+          halfway and continued by freshly built components on the restored store, and
+          compared with the uninterrupted run and with a cold restart (empty scorer state)
+Run from the repo root: python benchmarks/bench_state_store.py --packs 1000000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from inference.ingest import SAMPLE_DTYPE, TelemetryScorer
+from inference.soc_predictor import BatchSOCPredictor, SOCPredictor
+from inference.soh_evaluator import SOHEvaluator
+from safety.rule_engine import SafetyEngine
+from simulation.fleet_signal_generator import FleetSignalGenerator
+from utils.state_store import FleetStateStore
+
+
+def per_pack_objects(n=10_000):
+    """Bytes per pack of the single-pack classes (one SOCPredictor + SafetyEngine(1) each)"""
+    tracemalloc.start()
+    packs = [(SOCPredictor(), SafetyEngine(1)) for _ in range(n)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del packs
+    return size / n
+
+
+def scale(n_packs, root, ticks=3):
+    store = FleetStateStore(n_packs)
+    car = FleetSignalGenerator(n_packs, seed=0, start_time=0.0, store=store)
+    car.set_mode("DISCHARGE")
+    soc = BatchSOCPredictor(store=store)
+    SOHEvaluator(store=store)
+    safety = SafetyEngine(n_packs, store=store)
+    ids = list(range(n_packs))
+    for _ in range(ticks):
+        data = car.step(1.0, 1.0)
+        estimate = soc.predict(ids, data["voltage"], data["current"], data["temperature"], data["time"])
+        safety.evaluate(data["time"], soc=estimate, soh=np.full(n_packs, 95.0), temperature=data["temperature"])
+
+    shared = sum(store[name][:n_packs].nbytes for name in store.fields if name.split(".")[0] in ("soc", "safety"))
+    print(f"scale: {n_packs:,} packs, {len(store.fields)} fields, {store.nbytes() / n_packs:.0f} B/pack "
+          f"({store.nbytes() / 2**20:,.0f} MiB)")
+    print(f"  SoC + safety state: {shared / n_packs:.0f} B/pack in the store, "
+          f"{per_pack_objects():,.0f} B/pack as per-pack objects")
+
+    path = os.path.join(root, "fleet.state")
+    start = time.perf_counter()
+    size = store.checkpoint(path)
+    took = time.perf_counter() - start
+    print(f"  checkpoint        {took * 1e3:>8.1f} ms  {size / 2**20:,.0f} MiB  ({size / 2**20 / took:,.0f} MiB/s)")
+
+    for copy in (True, False):
+        start = time.perf_counter()
+        restored = FleetStateStore.restore(path, copy=copy)
+        took = time.perf_counter() - start
+        same = all(np.array_equal(store[name][:n_packs], restored[name], equal_nan=store[name].dtype.kind == "f")
+                   for name in store.fields)
+        print(f"  restore {'copy' if copy else 'lazy':<9} {took * 1e3:>8.1f} ms  identical: {same}")
+        del restored
+
+
+def _feed(car, scorer, steps, dt):
+    """Streams `steps` fleet samples through the scorer; returns the per-step SoC, alert masks and SoH"""
+    samples = np.empty(car.n_packs, dtype=SAMPLE_DTYPE)
+    samples["pack_id"] = np.arange(car.n_packs)
+    soc, active, soh = [], [], []
+    for _ in range(steps):
+        data = car.step(1.0, dt)
+        samples["timestamp"] = data["time"]
+        samples["voltage"] = data["voltage"]
+        samples["current"] = data["current"]
+        samples["temperature"] = data["temperature"]
+        out = scorer.score(samples)
+        soc.append(out["soc"])
+        active.append(out["active"])
+        soh.append(scorer.soh.copy())
+    return np.array(soc), np.array(active), np.array(soh)
+
+
+def resume(n_packs, root, steps, dt=10.0):
+    def build(store=None):
+        rng = np.random.default_rng(1)
+        # Low charge and hot climates in the mix, so that alerts are raised and cleared
+        car = FleetSignalGenerator(n_packs, seed=1, soc=rng.uniform(10.0, 95.0, n_packs),
+                                   ambient=rng.uniform(15.0, 40.0, n_packs), start_time=0.0, store=store)
+        if store is None:
+            modes = rng.choice(["DISCHARGE", "CHARGE", "STANDBY"], n_packs)
+            for mode in ("DISCHARGE", "CHARGE", "STANDBY"):
+                car.set_mode(mode, np.flatnonzero(modes == mode))
+        return car, TelemetryScorer(n_packs, store=car.store)
+
+    # 1. Reference: one uninterrupted run
+    car, scorer = build()
+    _feed(car, scorer, steps, dt)
+    reference = _feed(car, scorer, steps, dt)
+
+    # 2. Same run, checkpointed halfway and resumed by new components on the restored store
+    car, scorer = build()
+    _feed(car, scorer, steps, dt)
+    path = os.path.join(root, "resume.state")
+    scorer.checkpoint(path)
+    del car, scorer
+    car, scorer = build(FleetStateStore.restore(path))
+    resumed = _feed(car, scorer, steps, dt)
+
+    # 3. Cold restart: the same telemetry, but the scorer's state starts empty
+    car = FleetSignalGenerator(n_packs, store=FleetStateStore.restore(path))
+    cold = _feed(car, TelemetryScorer(n_packs), steps, dt)
+
+    print(f"resume: {n_packs:,} packs, {steps} + {steps} steps of {dt:g} s, checkpoint halfway "
+          f"({np.count_nonzero(reference[1]):,} of {reference[1].size:,} samples with an active alert)")
+    for name, (soc, active, soh) in (("restored", resumed), ("cold start", cold)):
+        print(f"  {name:<10}: max |dSoC| {np.abs(soc - reference[0]).max():.4f}, "
+              f"alert masks differing {np.count_nonzero(active != reference[1]):,}, "
+              f"SoH differing {np.count_nonzero(~np.isclose(soh, reference[2], rtol=0, atol=0, equal_nan=True)):,} "
+              f"of {soh.size:,} pack-steps")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--packs", type=int, default=1_000_000)
+    parser.add_argument("--resume-packs", type=int, default=2000)
+    parser.add_argument("--steps", type=int, default=150, help="steps before and after the checkpoint")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="elektra-state-")
+    try:
+        scale(args.packs, root)
+        resume(args.resume_packs, root, args.steps)
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Aging what-if sweep throughput (simulation.sweep): scenario-steps per second for a few
+batch sizes in one process, then a grid of --scenarios scenarios on every core.
+The full 10k-scenario x 7-day sweep takes a few minutes on a multi-core machine;
+--days sets how much of it to run here.
+Run from the repo root: python benchmarks/bench_sweep.py --scenarios 10000 --days 1
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from simulation.sweep import SCHEDULES, run_sweep
+
+WEEK_STEPS = 7 * 86400 / 5.0
+
+
+def grid(n_scenarios):
+    """Cycle x ambient x schedule x capacity grid with about n_scenarios combinations"""
+    n_schedules, n_capacity = len(SCHEDULES), 4
+    side = max(1, int(round(np.sqrt(n_scenarios / (n_schedules * n_capacity)))))
+    return dict(cycles=np.linspace(0, 3000, side), ambient_c=np.linspace(-20, 45, side),
+                schedules=sorted(SCHEDULES), capacity_ah=np.linspace(60, 120, n_capacity))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", type=int, default=10_000)
+    parser.add_argument("--days", type=float, default=1.0, help="simulated days for the full-grid run")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    # 1. Batch size (vector width) in one process, 6 simulated hours
+    print(f"{'batch size':>10} | {'scenario-steps/s':>17}")
+    for batch_size in (256, 1024, 2048, 4096):
+        table = run_sweep(**grid(batch_size), duration_s=6 * 3600, n_workers=1, batch_size=batch_size)
+        print(f"{batch_size:>10} | {table.attrs['stats']['scenario_steps_per_s']:>17,.0f}")
+
+    # 2. The whole grid on every core
+    table = run_sweep(**grid(args.scenarios), duration_s=args.days * 86400, n_workers=args.workers)
+    stats = table.attrs["stats"]
+    week_s = stats["scenarios"] * WEEK_STEPS / stats["scenario_steps_per_s"]
+    print(f"\n{stats['scenarios']:,} scenarios x {args.days:g} days on {args.workers} worker(s): {stats['wall_s']:.1f} s "
+          f"({stats['scenario_steps_per_s']:,.0f} scenario-steps/s) -> a 7-day sweep in ~{week_s / 60:.1f} min")
+    print(table.groupby("schedule")[["final_soh", "hours_below_15_soc", "peak_temp_c", "alerts"]].mean().round(1))
+
+
+if __name__ == "__main__":
+    main()
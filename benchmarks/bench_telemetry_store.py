@@ -0,0 +1,93 @@
+"""
+TelemetryStore: ingest rate for long 10 Hz histories and range-query latency.
+Writes --days of synthetic 10 Hz telemetry for one pack into a temporary directory
+(about 46 MB per day), then times typical dashboard queries.
+Run from the repo root: python benchmarks/bench_telemetry_store.py --days 30
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.telemetry_store import TelemetryStore
+
+HZ = 10
+DAY = 86400.0
+
+
+def hour_of_telemetry(rng, t0):
+    n = int(3600 * HZ)
+    t = t0 + np.arange(n) / HZ
+    current = -60.0 + 40.0 * np.sin(t / 600.0) + rng.normal(0, 5, n)
+    return t, {
+        "voltage": 350.0 + 0.05 * current + rng.normal(0, 0.2, n),
+        "current": current,
+        "temperature": 30.0 + 5.0 * np.sin(t / 7200.0) + rng.normal(0, 0.1, n),
+        "soc": 50.0 + 40.0 * np.sin(t / 20000.0),
+        "soh": np.full(n, 95.0),
+        "capacity_ah": np.full(n, 98.0),
+    }
+
+
+def time_query(fn, repeat=20):
+    fn()  # warm-up (opens the chunk files)
+    took = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        took.append(time.perf_counter() - start)
+    return float(np.median(took)) * 1e3, len(result["time"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--keep", default=None, help="write into this directory and keep it")
+    args = parser.parse_args()
+
+    root = args.keep or tempfile.mkdtemp(prefix="elektra-telemetry-")
+    try:
+        store = TelemetryStore(root)
+        rng = np.random.default_rng(0)
+        t0 = 1_700_000_000.0
+
+        # 1. Ingest in one-hour blocks
+        start = time.perf_counter()
+        hours = args.days * 24
+        for h in range(hours):
+            t, values = hour_of_telemetry(rng, t0 + h * 3600.0)
+            store.append("pack-0", t, **values)
+        store.flush()
+        took = time.perf_counter() - start
+        n_rows = hours * 3600 * HZ
+        size = sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(root) for f in files)
+        print(f"ingest: {n_rows:,} rows in {took:.1f} s ({n_rows / took:,.0f} rows/s), {size / 1e6:,.0f} MB on disk")
+
+        # 2. Queries against a fresh store object (nothing cached in memory)
+        reader = TelemetryStore(root)
+        end = t0 + hours * 3600.0
+        queries = [
+            ("last 30 days @ 1 min", lambda: reader.query("pack-0", end - 30 * DAY, end, resolution=60)),
+            ("last 30 days @ 1 h", lambda: reader.query("pack-0", end - 30 * DAY, end, resolution=3600)),
+            ("last 7 days @ 5 min", lambda: reader.query("pack-0", end - 7 * DAY, end, resolution=300)),
+            ("last 1 h @ 1 s", lambda: reader.query("pack-0", end - 3600, end, resolution=1)),
+            ("last 10 min raw", lambda: reader.query("pack-0", end - 600, end)),
+            ("newest 100 samples", lambda: reader.last("pack-0", 100)),
+        ]
+        print(f"{'query':<22} | {'ms':>8} | {'rows':>8}")
+        for name, fn in queries:
+            ms, rows = time_query(fn)
+            print(f"{name:<22} | {ms:>8.2f} | {rows:>8,}")
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
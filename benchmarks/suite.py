@@ -0,0 +1,441 @@
+"""
+End-to-end benchmark suite: latency percentiles and throughput of every hot-path stage
+(simulator, SoC / SoH predictors, dV/dQ features, rolling features, safety), each for a
+single pack and for a fleet-sized batch.
+
+Everything runs offline on synthetic inputs with fixed seeds. Results can be saved as JSON
+and compared against a stored baseline; the exit code is 1 if any case regressed by more
+than its threshold (throughput drop or p99 latency increase).
+
+Run from the repo root:
+    python benchmarks/suite.py --update-baseline          # record benchmarks/baseline.json
+    python benchmarks/suite.py                            # compare against it
+    python benchmarks/suite.py --filter 'soh/*' --out soh.json --threshold 0.2
+    python benchmarks/suite.py --case-threshold 'dvdq/*=0.3' --quick
+"""
+import argparse
+import datetime
+import fnmatch
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.bench_soc_lstm import TIMING_SCALER
+from benchmarks.bench_soh_predictor import synthetic_features
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+FLEET = 10_000  # packs in the fleet-sized cases
+
+CASES = []
+
+
+def case(name, items=1):
+    """
+    Registers a benchmark. The decorated setup(seed) builds its inputs and returns the
+    zero-argument callable that is timed; `items` is the number of packs / rows / curves
+    one call processes (throughput is reported in items per second).
+    """
+    def register(setup):
+        CASES.append({"name": name, "items": items, "setup": setup})
+        return setup
+    return register
+
+
+# --- simulator ---
+
+@case("simulator/single")
+def _simulator_single(seed):
+    from simulation.ev_signal_generator import EVSignalGenerator
+
+    car = EVSignalGenerator(start_time=0.0, seed=seed)
+    car.set_mode("DISCHARGE")
+    return lambda: car.step(0.1, 100)
+
+
+@case("simulator/block", items=FLEET)
+def _simulator_block(seed):
+    from simulation.ev_signal_generator import EVSignalGenerator
+
+    car = EVSignalGenerator(start_time=0.0, seed=seed)
+    car.set_mode("DISCHARGE")
+    return lambda: car.step_block(FLEET, 0.1, 100)
+
+
+@case("simulator/fleet", items=FLEET)
+def _simulator_fleet(seed):
+    from simulation.fleet_signal_generator import FleetSignalGenerator
+
+    fleet = FleetSignalGenerator(FLEET, seed=seed, start_time=0.0)
+    fleet.set_mode("DISCHARGE")
+    return lambda: fleet.step(0.1, 100)
+
+
+# --- SoC ---
+
+def _telemetry(n, seed):
+    rng = np.random.default_rng(seed)
+    return rng.normal(350.0, 10.0, n), rng.normal(-60.0, 40.0, n), rng.normal(30.0, 3.0, n)
+
+
+@case("soc/single")
+def _soc_single(seed):
+    from inference.soc_predictor import SOCPredictor
+
+    predictor = SOCPredictor()
+    voltage, current, temperature = _telemetry(1, seed)
+    clock = [0.0]
+
+    def run():
+        clock[0] += 1.0
+        return predictor.predict(voltage[0], current[0], temperature[0], clock[0])
+    return run
+
+
+@case("soc/fleet", items=FLEET)
+def _soc_fleet(seed):
+    from inference.soc_predictor import BatchSOCPredictor
+
+    predictor = BatchSOCPredictor(capacity=FLEET)
+    ids = list(range(FLEET))
+    voltage, current, temperature = _telemetry(FLEET, seed)
+    clock = [0.0]
+
+    def run():
+        clock[0] += 1.0
+        return predictor.predict(ids, voltage, current, temperature, clock[0])
+    return run
+
+
+@case("soc/lstm_fleet", items=1000)
+def _soc_lstm_fleet(seed):
+    from inference.lstm_soc_predictor import LSTMSOCPredictor
+
+    predictor = LSTMSOCPredictor(capacity=1000, **TIMING_SCALER)
+    ids = list(range(1000))
+    voltage, current, temperature = _telemetry(1000, seed)
+    clock = [0.0]
+
+    def run():
+        clock[0] += 1.0
+        return predictor.predict(ids, voltage, current, temperature, clock[0])
+    for _ in range(predictor.window):
+        run()  # fill the windows so the LSTM (not the Coulomb fallback) is timed
+    return run
+
+
+# --- SoH ---
+
+def _static_features():
+    from utils.dvdq_features import load_dvdq_features
+    from utils.paths import DATA_DIR
+
+    anode = load_dvdq_features(os.path.join(DATA_DIR, "dv_dq_anode.csv"), "anode", cache=False)
+    cathode = load_dvdq_features(os.path.join(DATA_DIR, "dv_dq_cathode.csv"), "cathode", cache=False)
+    return {**anode, **cathode}
+
+
+@case("soh/single")
+def _soh_single(seed):
+    from inference.soh_predictor import SOHPredictor
+
+    predictor = SOHPredictor()
+    row = synthetic_features(1, seed)[0]
+    dynamic = dict(zip(predictor.feature_order, row.tolist()))
+    static = _static_features()
+    return lambda: predictor.predict(dynamic_features=dynamic, static_features=static)
+
+
+@case("soh/fleet", items=FLEET)
+def _soh_fleet(seed):
+    from inference.soh_predictor import SOHPredictor
+
+    predictor = SOHPredictor()
+    X = synthetic_features(FLEET, seed)
+    return lambda: predictor.predict_many(X)
+
+
+# --- dV/dQ features ---
+
+@case("dvdq/load_csv")
+def _dvdq_load_csv(seed):
+    from utils.dvdq_features import load_dvdq_features
+    from utils.paths import DATA_DIR
+
+    path = os.path.join(DATA_DIR, "dv_dq_anode.csv")
+    return lambda: load_dvdq_features(path, "anode", cache=False)
+
+
+@case("dvdq/load_cached")
+def _dvdq_load_cached(seed):
+    from utils.dvdq_features import DvdqCache, load_dvdq_features
+    from utils.paths import DATA_DIR
+
+    path = os.path.join(DATA_DIR, "dv_dq_anode.csv")
+    cache = DvdqCache(tempfile.mkdtemp(prefix="elektra-bench-dvdq-"))
+    load_dvdq_features(path, "anode", cache=cache)  # populate
+    return lambda: load_dvdq_features(path, "anode", cache=cache)
+
+
+@case("dvdq/extract_batch", items=1000)
+def _dvdq_extract_batch(seed):
+    from simulation.dvdq_simulator import generate_curves
+    from utils.dvdq_features import extract_dvdq_features_batch
+
+    steps = np.random.default_rng(seed).integers(0, 101, 1000)
+    curves = generate_curves("anode", steps, seed=seed)
+    return lambda: extract_dvdq_features_batch(curves["voltage"], curves["dvdq"])
+
+
+# --- rolling features ---
+
+@case("features/single")
+def _features_single(seed):
+    from utils.streaming_features import StreamingFeatureEngine
+
+    engine = StreamingFeatureEngine(window=100)
+    voltage = np.random.default_rng(seed).normal(350.0, 2.0, 4096).tolist()
+    for v in voltage[:100]:
+        engine.update(v, 99.0)
+    k = [0]
+
+    def run():
+        k[0] += 1
+        engine.update(voltage[k[0] % len(voltage)], 99.0)
+        return engine.features(500)
+    return run
+
+
+@case("features/fleet", items=FLEET)
+def _features_fleet(seed):
+    from utils.streaming_features import FleetFeatureWindow
+
+    window = FleetFeatureWindow(FLEET, window=100)
+    voltage = np.random.default_rng(seed).normal(350.0, 2.0, (100, FLEET))
+    window.update(voltage, 99.0)
+
+    def run():
+        window.update(voltage[:1], 99.0)
+        return window.features(500)
+    return run
+
+
+# --- safety ---
+
+@case("safety/single")
+def _safety_single(seed):
+    from safety.rule_engine import SafetyEngine
+
+    engine = SafetyEngine(1)
+    rng = np.random.default_rng(seed)
+    soc, temperature = rng.uniform(0, 100, 4096), rng.uniform(20, 60, 4096)
+    k = [0]
+
+    def run():
+        k[0] += 1
+        i = k[0] % len(soc)
+        return engine.evaluate(float(k[0]), soc=soc[i:i + 1], soh=[90.0], temperature=temperature[i:i + 1])
+    return run
+
+
+@case("safety/check_safety")
+def _safety_legacy(seed):
+    from safety.health_rules import check_safety
+
+    return lambda: check_safety(12.0, 69.0, 51.0)
+
+
+@case("safety/fleet", items=FLEET)
+def _safety_fleet(seed):
+    from safety.rule_engine import SafetyEngine
+
+    engine = SafetyEngine(FLEET)
+    rng = np.random.default_rng(seed)
+    soc, soh, temperature = rng.uniform(0, 100, FLEET), rng.uniform(60, 100, FLEET), rng.uniform(20, 60, FLEET)
+    clock = [0.0]
+
+    def run():
+        clock[0] += 1.0
+        return engine.evaluate(clock[0], soc=soc, soh=soh, temperature=temperature)
+    return run
+
+
+# --- runner ---
+
+def measure(fn, items, min_time, min_calls=5, max_calls=1_000_000):
+    """Times individual calls until min_time has elapsed; returns latency percentiles and throughput (items/s)"""
+    for _ in range(3):
+        fn()  # warm-up (lazy model loads, caches, allocations)
+    gc.collect()
+
+    latencies = []
+    deadline = time.perf_counter() + min_time
+    while len(latencies) < min_calls or (time.perf_counter() < deadline and len(latencies) < max_calls):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+
+    latencies = np.array(latencies)
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+    return {
+        "items": items,
+        "calls": len(latencies),
+        "mean_s": float(latencies.mean()),
+        "p50_s": float(p50),
+        "p90_s": float(p90),
+        "p99_s": float(p99),
+        # From the median call, so one preempted call does not move the comparison
+        "throughput": float(items / p50),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_suite(patterns=None, min_time=1.0, seed=0):
+    """Runs every registered case whose name matches one of the fnmatch patterns"""
+    results = {}
+    for spec in CASES:
+        if patterns and not any(fnmatch.fnmatch(spec["name"], p) for p in patterns):
+            continue
+        fn = spec["setup"](seed)
+        results[spec["name"]] = measure(fn, spec["items"], min_time)
+        print(format_row(spec["name"], results[spec["name"]]), flush=True)
+    return {
+        "meta": {
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "min_time": min_time,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold=0.10, p99_threshold=0.50, case_thresholds=None):
+    """
+    Per-case ratios against a baseline run. A case regresses when its throughput drops
+    by more than `threshold` (fraction) or its p99 latency grows by more than
+    `p99_threshold`; case_thresholds maps fnmatch patterns to a throughput threshold
+    that overrides the default for noisy cases.
+    Returns {name: {"throughput_ratio", "p99_ratio", "threshold", "regressed"}}.
+    """
+    report = {}
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        limit = threshold
+        for pattern, value in (case_thresholds or {}).items():
+            if fnmatch.fnmatch(name, pattern):
+                limit = value
+        throughput_ratio = result["throughput"] / base["throughput"]
+        p99_ratio = result["p99_s"] / base["p99_s"]
+        report[name] = {
+            "throughput_ratio": throughput_ratio,
+            "p99_ratio": p99_ratio,
+            "threshold": limit,
+            "regressed": throughput_ratio < 1.0 - limit or p99_ratio > 1.0 + p99_threshold,
+        }
+    return report
+
+
+def _fmt_time(seconds):
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f} us"
+    return f"{seconds * 1e3:.2f} ms"
+
+
+def format_row(name, result, delta=None):
+    row = (f"{name:<22} | {result['items']:>6,} | {result['calls']:>8,} | {_fmt_time(result['p50_s']):>10} | "
+           f"{_fmt_time(result['p99_s']):>10} | {result['throughput']:>14,.0f}")
+    if delta is not None:
+        flag = "REGRESSION" if delta["regressed"] else ""
+        row += f" | {delta['throughput_ratio']:>6.2f}x {delta['p99_ratio']:>6.2f}x {flag}"
+    return row
+
+
+def _parse_case_thresholds(values):
+    thresholds = {}
+    for value in values or []:
+        pattern, _, fraction = value.rpartition("=")
+        if not pattern:
+            raise SystemExit(f"--case-threshold expects PATTERN=FRACTION, got {value!r}")
+        thresholds[pattern] = float(fraction)
+    return thresholds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", action="append", help="fnmatch pattern of case names (repeatable)")
+    parser.add_argument("--list", action="store_true", help="list the cases and exit")
+    parser.add_argument("--min-time", type=float, default=1.0, help="seconds of timed calls per case")
+    parser.add_argument("--quick", action="store_true", help="shorthand for --min-time 0.2")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write this run's results to a JSON file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON to compare against")
+    parser.add_argument("--update-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed throughput drop (fraction)")
+    parser.add_argument("--p99-threshold", type=float, default=0.50, help="allowed p99 latency increase (fraction)")
+    parser.add_argument("--case-threshold", action="append", metavar="PATTERN=FRACTION",
+                        help="throughput threshold for matching cases (repeatable)")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for spec in CASES:
+            print(f"{spec['name']:<22} {spec['items']:>6,} items/call")
+        return 0
+
+    min_time = 0.2 if args.quick else args.min_time
+    print(f"{'case':<22} | {'items':>6} | {'calls':>8} | {'p50':>10} | {'p99':>10} | {'items/s':>14}")
+    current = run_suite(args.filter, min_time=min_time, seed=args.seed)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"\nresults written to {args.out}")
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nno baseline at {args.baseline} (record one with --update-baseline)")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    report = compare(current, baseline, args.threshold, args.p99_threshold, _parse_case_thresholds(args.case_threshold))
+    print(f"\nvs baseline {baseline['meta'].get('git_commit')} ({baseline['meta'].get('created')}): "
+          f"throughput ratio, p99 ratio (allowed: -{args.threshold:.0%} throughput, +{args.p99_threshold:.0%} p99)")
+    for name, delta in report.items():
+        print(format_row(name, current["results"][name], delta))
+    regressed = [name for name, delta in report.items() if delta["regressed"]]
+    if regressed:
+        print(f"\n{len(regressed)} regression(s): {', '.join(regressed)}")
+        return 1
+    print("\nno regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
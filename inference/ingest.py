@@ -0,0 +1,495 @@
+"""
+Binary telemetry ingestion front-end (asyncio) for many packs.
+
+Packs or gateways stream framed binary samples over TCP, a Unix socket or UDP:
+
+    frame    FRAME_HEADER + count samples
+    header   "<2sBxI": magic b"ET", version 1, pad byte, sample count (uint32)
+    sample   SAMPLE_DTYPE, 24 bytes little-endian, packed:
+             pack_id u4 | timestamp f8 (s) | voltage f4 (V) | current f4 (A) | temperature f4 (°C)
+
+Stream connections receive straight into a per-connection buffer
+(asyncio.BufferedProtocol); every complete frame is viewed in place with np.frombuffer
+and copied as one block into a preallocated structured batch array, so no Python
+object is created per sample. UDP datagrams carry exactly one frame each. Batches of
+batch_size samples (or whatever arrived within flush_ms) go through a queue to one
+consumer, by default TelemetryScorer: SoC, SoH and safety for every sample.
+
+Backpressure: once max_pending batches are waiting, every stream connection stops
+reading (pause_reading), so the socket buffers fill and TCP slows the senders down;
+reading resumes when the queue has drained to half. UDP cannot be paused: datagrams
+arriving while paused are dropped and counted.
+
+Run: python -m inference.ingest --port 9100 --packs 10000   (or --unix PATH, --udp PORT)
+Load generator: python benchmarks/bench_ingest.py
+"""
+import argparse
+import asyncio
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from inference.soc_predictor import BatchSOCPredictor
+from inference.soh_evaluator import FLEET_MAX_STALENESS_S, FLEET_TOLERANCES, SOHEvaluator
+from safety.rule_engine import SafetyEngine
+from utils.dvdq_features import load_chemistry_features
+from utils.instrumentation import metrics
+from utils.state_store import FleetStateStore, StoreField
+from utils.streaming_features import window_features
+
+MAGIC = b"ET"
+VERSION = 1
+FRAME_HEADER = struct.Struct("<2sBxI")
+SAMPLE_DTYPE = np.dtype([("pack_id", "<u4"), ("timestamp", "<f8"), ("voltage", "<f4"), ("current", "<f4"),
+                         ("temperature", "<f4")])
+MAX_FRAME_SAMPLES = 1 << 16
+# Largest frame that fits one UDP datagram
+MAX_DATAGRAM_SAMPLES = (65507 - FRAME_HEADER.size) // SAMPLE_DTYPE.itemsize
+
+
+def encode_frames(samples, samples_per_frame=1024):
+    """SAMPLE_DTYPE array -> bytes of consecutive frames of at most samples_per_frame samples"""
+    samples = np.ascontiguousarray(samples, dtype=SAMPLE_DTYPE)
+    parts = []
+    for lo in range(0, len(samples), samples_per_frame):
+        chunk = samples[lo:lo + samples_per_frame]
+        parts.append(FRAME_HEADER.pack(MAGIC, VERSION, len(chunk)))
+        parts.append(chunk.tobytes())
+    return b"".join(parts)
+
+
+class TelemetryScorer:
+    """
+    The dashboard's stages over ingested batches, for packs 0 .. n_packs-1 (samples of
+    other pack ids are rejected and counted). A pack's k-th sample in a batch belongs to
+    round k, and samples of one pack must arrive in time order.
+      SoC     BatchSOCPredictor, one call per round
+      SoH     per-pack rings of the last feature_window voltages -> window features ->
+              SOHEvaluator (fleet tolerances), for every pack with a full window, once per
+              soh_interval_s of telemetry time (capacity is taken as nominal: frames do not
+              carry it)
+      safety  SafetyEngine over the packs of the batch as one (rounds, packs) block; a pack
+              without a sample in a round repeats its previous one, which changes nothing
+    The latest values per pack are kept in soc, soh, alerts and last_time. Every stage
+    keeps its per-pack state in one FleetStateStore (pack p in slot p): checkpoint() it,
+    and a scorer built on FleetStateStore.restore() continues exactly where it stopped.
+    """
+    def __init__(self, n_packs, cycle=500, nominal_capacity=100.0, soh_interval_s=300.0, feature_window=100,
+                 std_window=5, rolling_window=10, static_features=None, store=None):
+        self.n_packs = int(n_packs)
+        self.cycle = np.broadcast_to(np.asarray(cycle, dtype=np.float64), (self.n_packs,))
+        self.nominal_capacity = nominal_capacity
+        self.soh_interval_s = soh_interval_s
+        self.window = feature_window
+        self.std_window = std_window
+        self.rolling_window = rolling_window
+        self.static_features = load_chemistry_features() if static_features is None else dict(static_features)
+
+        # 1. Shared state, pack p in slot p
+        self.store = FleetStateStore(self.n_packs) if store is None else store
+        if not np.array_equal(self.store.slots(range(self.n_packs)), np.arange(self.n_packs)):
+            raise ValueError("store must hold packs 0 .. n_packs-1 in slots 0 .. n_packs-1")
+        self.soc_model = BatchSOCPredictor(total_capacity_ah=nominal_capacity, store=self.store)
+        self.soh_model = SOHEvaluator(tolerances=FLEET_TOLERANCES, max_staleness_s=FLEET_MAX_STALENESS_S,
+                                      store=self.store)
+        self.soh_model.predictor.preload()
+        self.safety = SafetyEngine(self.n_packs, store=self.store)
+
+        # 2. Voltage ring per pack: row p, next write at column count[p] % window
+        self.store.add_field("ingest.voltage", shape=(feature_window,), default=0.0)
+        self.store.add_field("ingest.count", dtype=np.int64, default=0)
+        self.store.add_field("ingest.soc", default=np.nan)
+        self.store.add_field("ingest.soh", default=np.nan)
+        self.store.add_field("ingest.alerts", dtype=np.uint32, default=0)
+        self.store.add_field("ingest.last_time", default=np.nan)
+        self.store.meta.setdefault("ingest.next_soh", -np.inf)
+        self.stats = {"samples": 0, "rejected": 0, "batches": 0, "rounds": 0, "soh_evaluations": 0}
+
+    voltage = StoreField("ingest.voltage")
+    count = StoreField("ingest.count")
+    soc = StoreField("ingest.soc")
+    soh = StoreField("ingest.soh")
+    alerts = StoreField("ingest.alerts")
+    last_time = StoreField("ingest.last_time")
+
+    def checkpoint(self, path):
+        """Writes every stage's per-pack state to `path`; returns the file size in bytes"""
+        return self.store.checkpoint(path)
+
+    def score(self, batch):
+        """
+        batch: SAMPLE_DTYPE array in arrival order.
+        Returns per-sample arrays: pack_id, timestamp, soc, and the SafetyEngine
+        "active" / "raised" bitmasks after each sample.
+        """
+        pack = batch["pack_id"].astype(np.intp)
+        valid = pack < self.n_packs
+        if not valid.all():
+            self.stats["rejected"] += int(np.count_nonzero(~valid))
+            batch, pack = batch[valid], pack[valid]
+        n = len(batch)
+        if not n:
+            return {"pack_id": pack, "timestamp": np.empty(0), "soc": np.empty(0),
+                    "active": np.empty(0, dtype=np.uint32), "raised": np.empty(0, dtype=np.uint32)}
+        t = batch["timestamp"].astype(np.float64)
+        voltage = batch["voltage"].astype(np.float64)
+        current = batch["current"].astype(np.float64)
+        temperature = batch["temperature"].astype(np.float64)
+
+        # 1. Rounds: rank of every sample among its pack's samples, and the pack's column
+        order = np.argsort(pack, kind="stable")
+        sorted_pack = pack[order]
+        new_run = np.empty(n, dtype=bool)
+        new_run[0] = True
+        np.not_equal(sorted_pack[1:], sorted_pack[:-1], out=new_run[1:])
+        starts = np.flatnonzero(new_run)
+        packs = sorted_pack[starts]
+        per_pack = np.diff(np.append(starts, n))
+        rank = np.empty(n, dtype=np.intp)
+        rank[order] = np.arange(n) - np.repeat(starts, per_pack)
+        column = np.empty(n, dtype=np.intp)
+        column[order] = np.repeat(np.arange(len(packs)), per_pack)
+        rounds = int(per_pack.max())
+        by_round = np.argsort(rank, kind="stable")
+        bounds = np.searchsorted(rank[by_round], np.arange(rounds + 1))
+
+        # 2. SoC, one call per round (no pack twice in a call)
+        soc = np.empty(n)
+        with metrics.timer("ingest.soc"):
+            for r in range(rounds):
+                rows = by_round[bounds[r]:bounds[r + 1]]
+                soc[rows] = self.soc_model.predict(pack[rows].tolist(), voltage[rows], current[rows],
+                                                   temperature[rows], t[rows])
+
+        # 3. Voltage rings (only each pack's last `window` samples of the batch), then SoH
+        with metrics.timer("ingest.soh"):
+            recent = rank >= per_pack[column] - self.window
+            count = self.count
+            self.voltage[pack[recent], (count[pack[recent]] + rank[recent]) % self.window] = voltage[recent]
+            count[packs] += per_pack
+            now = float(t.max())
+            if now >= self.store.meta["ingest.next_soh"]:
+                self._score_soh(now)
+                self.store.meta["ingest.next_soh"] = float((np.floor(now / self.soh_interval_s) + 1)
+                                                           * self.soh_interval_s)
+
+        # 4. Safety over the batch's packs, each pack holding its latest sample between its rounds
+        with metrics.timer("ingest.safety"):
+            latest = np.full((rounds, len(packs)), -1, dtype=np.intp)
+            latest[rank, column] = np.arange(n)
+            np.maximum.accumulate(latest, axis=0, out=latest)
+            flags = self.safety.evaluate(t[latest], packs=packs, soc=soc[latest], soh=self.soh[packs],
+                                         temperature=temperature[latest])
+
+        last = order[starts + per_pack - 1]
+        self.soc[packs] = soc[last]
+        self.last_time[packs] = t[last]
+        self.alerts[packs] = flags["active"][-1]
+        self.stats["samples"] += n
+        self.stats["batches"] += 1
+        self.stats["rounds"] += rounds
+        return {"pack_id": pack, "timestamp": t, "soc": soc,
+                "active": flags["active"][rank, column], "raised": flags["raised"][rank, column]}
+
+    def _score_soh(self, now):
+        ready = np.flatnonzero(self.count >= self.window)
+        if not len(ready):
+            return
+        # Ring columns oldest -> newest: the next write position holds the oldest sample
+        columns = (self.count[ready][:, None] + np.arange(self.window)) % self.window
+        hist = self.voltage[ready[:, None], columns].T
+        features = {
+            "cycle": self.cycle[ready],
+            **window_features(hist, self.std_window, self.rolling_window),
+            "capacity_ah": self.nominal_capacity,
+            "capacity_ratio": 1.0,
+            "delta_capacity": 0.0,
+            **self.static_features,
+        }
+        self.soh[ready] = self.soh_model.evaluate(ready.tolist(), features, now)
+        self.stats["soh_evaluations"] += len(ready)
+
+
+class IngestServer:
+    """
+    Receives frames from any number of connections into preallocated batches and hands
+    them to sink(batch) from one consumer task. The batch is a view of a reused buffer:
+    sink must copy whatever it keeps past the call.
+
+        server = IngestServer(TelemetryScorer(10_000).score)
+        await server.start(port=9100, udp_port=9101)
+        ...
+        await server.close()   # scores what was received, then stops
+    """
+    def __init__(self, sink, batch_size=8192, max_pending=8, flush_ms=20.0, max_frame_samples=MAX_FRAME_SAMPLES):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.flush_s = flush_ms / 1000.0
+        self.max_frame_samples = max_frame_samples
+
+        # Batch buffers: one being filled, the rest free or queued (more are allocated
+        # only if frames already buffered overshoot max_pending after a pause)
+        self._free = [np.empty(batch_size, dtype=SAMPLE_DTYPE) for _ in range(max_pending + 2)]
+        self._current = self._free.pop()
+        self._fill = 0
+        self._first_arrival = 0.0
+
+        self.queue = None
+        self.paused = False
+        self.last_error = None
+        self._streams = set()
+        self._servers = []
+        self._datagram = None
+        self._tasks = []
+        self.stats = {"connections": 0, "frames": 0, "samples": 0, "bytes": 0, "batches": 0, "pauses": 0,
+                      "dropped_datagrams": 0, "frame_errors": 0, "sink_errors": 0, "sink_s": 0.0}
+
+    async def start(self, host="127.0.0.1", port=None, unix_path=None, udp_port=None):
+        """Listens on any of TCP port / Unix socket / UDP port; returns the bound addresses"""
+        loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        addresses = []
+        if port is not None:
+            server = await loop.create_server(lambda: _StreamProtocol(self), host, port, backlog=1024)
+            self._servers.append(server)
+            addresses.append(("tcp", server.sockets[0].getsockname()))
+        if unix_path:
+            server = await loop.create_unix_server(lambda: _StreamProtocol(self), unix_path)
+            self._servers.append(server)
+            addresses.append(("unix", unix_path))
+        if udp_port is not None:
+            self._datagram, _ = await loop.create_datagram_endpoint(lambda: _DatagramProtocol(self),
+                                                                    local_addr=(host, udp_port))
+            addresses.append(("udp", self._datagram.get_extra_info("sockname")))
+        self._tasks = [loop.create_task(self._consume()), loop.create_task(self._flush())]
+        return addresses
+
+    async def close(self, timeout=0.0):
+        """
+        Stops accepting connections, gives connected senders up to `timeout` seconds to
+        finish and disconnect, scores every sample received and stops the consumer.
+        """
+        for server in self._servers:
+            server.close()
+        end = time.monotonic() + timeout
+        while self._streams and time.monotonic() < end:
+            await asyncio.sleep(0.01)
+        for transport in list(self._streams):
+            transport.close()
+        if self._datagram is not None:
+            self._datagram.close()
+        if self._fill:
+            self._emit()
+        await self.queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    # --- receiving ---
+
+    def parse(self, buffer, end):
+        """Adds every complete frame of buffer[:end]; returns the length of the complete frames"""
+        pos = 0
+        header, itemsize = FRAME_HEADER.size, SAMPLE_DTYPE.itemsize
+        while end - pos >= header:
+            magic, version, count = FRAME_HEADER.unpack_from(buffer, pos)
+            if magic != MAGIC or version != VERSION or count > self.max_frame_samples:
+                raise ValueError(f"bad frame header (magic {magic!r}, version {version}, {count} samples)")
+            size = header + count * itemsize
+            if end - pos < size:
+                break
+            self.add(np.frombuffer(buffer, dtype=SAMPLE_DTYPE, count=count, offset=pos + header))
+            self.stats["frames"] += 1
+            self.stats["samples"] += count
+            pos += size
+        return pos
+
+    def add(self, samples):
+        """Copies a block of SAMPLE_DTYPE samples into the batch being filled"""
+        while len(samples):
+            if not self._fill:
+                self._first_arrival = time.monotonic()
+            k = min(len(samples), self.batch_size - self._fill)
+            self._current[self._fill:self._fill + k] = samples[:k]
+            self._fill += k
+            samples = samples[k:]
+            if self._fill == self.batch_size:
+                self._emit()
+
+    def _emit(self):
+        self.queue.put_nowait((self._current, self._fill))
+        self._current = self._free.pop() if self._free else np.empty(self.batch_size, dtype=SAMPLE_DTYPE)
+        self._fill = 0
+        if not self.paused and self.queue.qsize() >= self.max_pending:
+            self.paused = True
+            self.stats["pauses"] += 1
+            for transport in self._streams:
+                transport.pause_reading()
+
+    def _resume(self):
+        self.paused = False
+        for transport in self._streams:
+            transport.resume_reading()
+
+    def _connected(self, transport):
+        self._streams.add(transport)
+        self.stats["connections"] += 1
+        if self.paused:
+            transport.pause_reading()
+
+    def _disconnected(self, transport):
+        self._streams.discard(transport)
+
+    # --- consumer ---
+
+    async def _consume(self):
+        while True:
+            buffer, n = await self.queue.get()
+            metrics.observe("elektra_queue_depth", self.queue.qsize(), queue="ingest")
+            metrics.observe("elektra_batch_size", n, stage="ingest")
+            start = time.perf_counter()
+            try:
+                with metrics.timer("ingest.batch"):
+                    self.sink(buffer[:n])
+            except Exception as e:
+                # One bad batch must not stop ingestion
+                self.stats["sink_errors"] += 1
+                self.last_error = e
+            self.stats["sink_s"] += time.perf_counter() - start
+            self.stats["batches"] += 1
+            self._free.append(buffer)
+            self.queue.task_done()
+            if self.paused and self.queue.qsize() <= self.max_pending // 2:
+                self._resume()
+            # Let the transports read between batches
+            await asyncio.sleep(0)
+
+    async def _flush(self):
+        """Emits a partial batch once its first sample has waited flush_ms"""
+        while True:
+            await asyncio.sleep(self.flush_s)
+            if self._fill and time.monotonic() - self._first_arrival >= self.flush_s:
+                self._emit()
+
+
+class _StreamProtocol(asyncio.BufferedProtocol):
+    """TCP / Unix connection: the event loop reads straight into this connection's buffer"""
+    def __init__(self, server):
+        self.server = server
+        self.buffer = bytearray(FRAME_HEADER.size + server.max_frame_samples * SAMPLE_DTYPE.itemsize)
+        self.view = memoryview(self.buffer)
+        self.end = 0
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.server._connected(transport)
+
+    def connection_lost(self, exc):
+        self.server._disconnected(self.transport)
+
+    def get_buffer(self, sizehint):
+        return self.view[self.end:]
+
+    def buffer_updated(self, nbytes):
+        self.end += nbytes
+        self.server.stats["bytes"] += nbytes
+        try:
+            pos = self.server.parse(self.buffer, self.end)
+        except ValueError:
+            self.server.stats["frame_errors"] += 1
+            self.transport.close()
+            self.end = 0
+            return
+        # Move the incomplete frame (less than one frame) to the front
+        rest = self.end - pos
+        if rest and pos:
+            self.buffer[:rest] = self.view[pos:self.end].tobytes()
+        self.end = rest
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    """UDP: one whole frame per datagram"""
+    def __init__(self, server):
+        self.server = server
+
+    def datagram_received(self, data, addr):
+        server = self.server
+        server.stats["bytes"] += len(data)
+        if server.paused:
+            server.stats["dropped_datagrams"] += 1
+            return
+        try:
+            if server.parse(data, len(data)) != len(data):
+                raise ValueError("datagram is not one whole frame")
+        except ValueError:
+            server.stats["frame_errors"] += 1
+
+
+async def serve(n_packs, host="127.0.0.1", port=9100, unix_path=None, udp_port=None, batch_size=8192, max_pending=8,
+                flush_ms=20.0, report_s=5.0, instrument=False, state_path=None, checkpoint_s=60.0):
+    if instrument:
+        metrics.enable()
+    # Resume from the last checkpoint, if any (written every checkpoint_s and on exit)
+    store = None
+    if state_path and os.path.exists(state_path):
+        store = FleetStateStore.restore(state_path, capacity=n_packs)
+        print(f"restored {len(store):,} packs from {state_path}")
+    scorer = TelemetryScorer(n_packs, store=store)
+    server = IngestServer(scorer.score, batch_size=batch_size, max_pending=max_pending, flush_ms=flush_ms)
+    for kind, address in await server.start(host, port, unix_path, udp_port):
+        print(f"listening on {kind} {address}")
+    try:
+        samples, start = 0, time.perf_counter()
+        next_checkpoint = start + checkpoint_s
+        while True:
+            await asyncio.sleep(report_s)
+            now = time.perf_counter()
+            if state_path and now >= next_checkpoint:
+                scorer.checkpoint(state_path)
+                next_checkpoint = now + checkpoint_s
+            stats = server.stats
+            print(f"{(stats['samples'] - samples) / (now - start):>12,.0f} samples/s | "
+                  f"{stats['connections']:,} connections, {stats['pauses']:,} pauses, "
+                  f"{stats['dropped_datagrams']:,} dropped datagrams | "
+                  f"{int(np.count_nonzero(scorer.alerts)):,} packs with alerts")
+            samples, start = stats["samples"], now
+    finally:
+        await server.close()
+        if state_path:
+            scorer.checkpoint(state_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Binary telemetry ingestion into the SoC/SoH/safety stages")
+    parser.add_argument("--packs", type=int, default=10_000, help="pack ids 0 .. packs-1 are accepted")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--unix", dest="unix_path", default=None, help="also listen on a Unix socket")
+    parser.add_argument("--udp", dest="udp_port", type=int, default=None, help="also listen on a UDP port")
+    parser.add_argument("--batch-size", type=int, default=8192)
+    parser.add_argument("--max-pending", type=int, default=8, help="queued batches before reading pauses")
+    parser.add_argument("--flush-ms", type=float, default=20.0)
+    parser.add_argument("--report-s", type=float, default=5.0)
+    parser.add_argument("--instrument", action="store_true", help="enable utils.instrumentation stage timers")
+    parser.add_argument("--state", dest="state_path", default=None,
+                        help="per-pack state checkpoint: restored on start, rewritten periodically and on exit")
+    parser.add_argument("--checkpoint-s", type=float, default=60.0)
+    args = parser.parse_args(argv)
+
+    try:
+        asyncio.run(serve(args.packs, args.host, args.port, args.unix_path, args.udp_port, args.batch_size,
+                          args.max_pending, args.flush_ms, args.report_s, args.instrument, args.state_path,
+                          args.checkpoint_s))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""
+NumPy-only runtime for the stacked-LSTM Keras models shipped in models/.
+
+A Sequential model of LSTM layers (Dropout is a no-op at inference) followed by a
+Dense head is read straight from the .keras archive (config.json + model.weights.h5)
+and evaluated with plain matrix products, so serving does not import TensorFlow.
+
+Two ways to run it:
+  forward(X)          full windows, X is (batch, timesteps, features) -> (batch,)
+  step(x, state)      one timestep per sequence, carrying (h, c) of every layer over
+
+Export: python -m inference.lstm_runtime [models/elektra_soc_lstm.keras] [models/elektra_soc_lstm.weights.npz]
+"""
+import io
+import json
+import os
+import re
+import sys
+import zipfile
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from inference.tree_compiler import file_hash
+from utils.paths import resolve_path
+
+_SKIPPED_LAYERS = {"InputLayer", "Dropout"}
+
+
+def _snake_case(name):
+    """Keras' own class-name conversion: LSTM -> lstm, BatchNormalization -> batch_normalization"""
+    name = re.sub(r"(.)([A-Z][a-z]+)", r"\1_\2", name)
+    return re.sub(r"([a-z])([A-Z])", r"\1_\2", name).lower()
+
+
+class NumpyLSTM:
+    """
+    Stacked LSTM + Dense head.
+
+    Weights are kept in Keras layout (gates i, f, c, o along the last axis) for the
+    artifact; internally the columns are reordered to i, f, o, c so the three sigmoid
+    gates are one contiguous slice. The input projection of a whole window is one
+    matrix product per layer; only the recurrent product runs per timestep.
+    """
+    def __init__(self, layers, dense_kernel, dense_bias, timesteps=None, source_hash="", dtype=np.float32):
+        # layers: list of dicts with kernel (F, 4U), recurrent_kernel (U, 4U), bias (4U,), return_sequences
+        self.dtype = np.dtype(dtype)
+        self.timesteps = timesteps
+        self.source_hash = source_hash
+        self.layers = [dict(layer) for layer in layers]
+        self.dense_kernel = np.asarray(dense_kernel)
+        self.dense_bias = np.asarray(dense_bias)
+
+        self._kernels = []
+        for layer in self.layers:
+            units = layer["recurrent_kernel"].shape[0]
+            order = np.concatenate([np.arange(0, 2 * units), np.arange(3 * units, 4 * units),
+                                    np.arange(2 * units, 3 * units)])
+            # Halve the sigmoid gates' pre-activations (see _cell); exact in floating point
+            half = np.where(np.arange(4 * units) < 3 * units, 0.5, 1.0)
+            self._kernels.append((
+                units,
+                np.ascontiguousarray(layer["kernel"][:, order] * half, dtype=self.dtype),
+                np.ascontiguousarray(layer["recurrent_kernel"][:, order] * half, dtype=self.dtype),
+                np.ascontiguousarray(layer["bias"][order] * half, dtype=self.dtype),
+            ))
+        self._dense = (self.dense_kernel.astype(self.dtype), self.dense_bias.astype(self.dtype))
+
+    @property
+    def n_features(self):
+        return self.layers[0]["kernel"].shape[0]
+
+    @property
+    def units(self):
+        return [k[0] for k in self._kernels]
+
+    @staticmethod
+    def _cell(z, c, units, out=None):
+        """One LSTM update from pre-activations z (B, 4U); updates c (and z) in place, returns h"""
+        # The sigmoid columns were pre-scaled by 1/2: sigmoid(x) = 0.5 * tanh(x / 2) + 0.5,
+        # so one tanh call covers all four gates
+        act = np.tanh(z, out=z)
+        gates = act[:, :3 * units]
+        gates *= 0.5
+        gates += 0.5
+        g = act[:, 3 * units:]
+        g *= gates[:, :units]
+        c *= gates[:, units:2 * units]
+        c += g
+        h = np.tanh(c, out=out)
+        h *= gates[:, 2 * units:]
+        return h
+
+    def forward(self, X, chunk_rows=256):
+        """
+        X: (batch, timesteps, features) -> (batch,) outputs, every sequence starting from zero state.
+        Rows are processed chunk_rows at a time so the per-timestep activations stay in cache.
+        """
+        X = np.asarray(X, dtype=self.dtype)
+        out = np.empty(X.shape[0], dtype=self.dtype)
+        for start in range(0, X.shape[0], chunk_rows):
+            out[start:start + chunk_rows] = self._forward_chunk(X[start:start + chunk_rows])
+        return out
+
+    def _forward_chunk(self, X):
+        batch, timesteps, _ = X.shape
+        # Time-major internally so every per-timestep slice is contiguous
+        seq = np.ascontiguousarray(X.transpose(1, 0, 2))
+
+        for (units, kernel, recurrent, bias), layer in zip(self._kernels, self.layers):
+            # 1. Input projection for every timestep at once
+            xz = (seq.reshape(timesteps * batch, -1) @ kernel).reshape(timesteps, batch, 4 * units)
+            xz += bias
+
+            # 2. Recurrence
+            h = np.zeros((batch, units), dtype=self.dtype)
+            c = np.zeros((batch, units), dtype=self.dtype)
+            out = np.empty((timesteps, batch, units), dtype=self.dtype) if layer["return_sequences"] else None
+            for t in range(timesteps):
+                z = xz[t]
+                z += h @ recurrent
+                h = self._cell(z, c, units, out=None if out is None else out[t])
+            seq = out if out is not None else h
+
+        return (seq @ self._dense[0] + self._dense[1])[:, 0]
+
+    def zero_state(self, batch):
+        """[(h, c), ...] per layer, all zeros"""
+        return [(np.zeros((batch, u), dtype=self.dtype), np.zeros((batch, u), dtype=self.dtype))
+                for u in self.units]
+
+    def step(self, x, state):
+        """
+        Advances every sequence by one timestep.
+        x: (batch, features); state: [(h, c), ...] per layer (updated in place)
+        Returns (batch,) outputs.
+        """
+        inp = np.asarray(x, dtype=self.dtype)
+        for (units, kernel, recurrent, bias), (h, c) in zip(self._kernels, state):
+            z = inp @ kernel
+            z += bias
+            z += h @ recurrent
+            self._cell(z, c, units, out=h)
+            inp = h
+        return (inp @ self._dense[0] + self._dense[1])[:, 0]
+
+    def save(self, path):
+        """Uncompressed .npz holding the Keras-layout weights and a JSON description"""
+        arrays = {"dense_kernel": self.dense_kernel, "dense_bias": self.dense_bias}
+        for i, layer in enumerate(self.layers):
+            for name in ("kernel", "recurrent_kernel", "bias"):
+                arrays[f"lstm{i}_{name}"] = layer[name]
+        meta = {
+            "return_sequences": [bool(layer["return_sequences"]) for layer in self.layers],
+            "timesteps": self.timesteps, "source_hash": self.source_hash,
+        }
+        np.savez(path, **arrays, meta=np.array(json.dumps(meta)))
+
+    @classmethod
+    def load(cls, path, dtype=np.float32):
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            layers = [
+                {**{name: data[f"lstm{i}_{name}"] for name in ("kernel", "recurrent_kernel", "bias")},
+                 "return_sequences": rs}
+                for i, rs in enumerate(meta["return_sequences"])
+            ]
+            return cls(layers, data["dense_kernel"], data["dense_bias"], timesteps=meta["timesteps"],
+                       source_hash=meta["source_hash"], dtype=dtype)
+
+
+def load_keras_lstm(path, dtype=np.float32):
+    """Reads a Keras 3 .keras archive of [LSTM | Dropout]* + Dense into a NumpyLSTM (needs h5py)"""
+    import h5py  # deferred: only needed to read the original archive, not the .npz export
+
+    with zipfile.ZipFile(path) as archive:
+        config = json.loads(archive.read("config.json"))
+        weights = h5py.File(io.BytesIO(archive.read("model.weights.h5")), "r")
+
+    with weights:
+        layers, dense = [], None
+        timesteps = None
+        seen = {}
+        for layer in config["config"]["layers"]:
+            kind, cfg = layer["class_name"], layer["config"]
+            if kind == "InputLayer":
+                timesteps = cfg["batch_shape"][1]
+                continue
+            # Weight groups are named per class in model order (lstm, lstm_1, dense, ...),
+            # not after the layer names in config.json
+            key = _snake_case(kind)
+            group_name = key if not seen.get(key) else f"{key}_{seen[key]}"
+            seen[key] = seen.get(key, 0) + 1
+            if kind in _SKIPPED_LAYERS:
+                continue
+            if dense is not None:
+                raise ValueError(f"unsupported layer after the Dense head: {kind}")
+
+            if kind == "LSTM":
+                if (cfg["activation"], cfg["recurrent_activation"]) != ("tanh", "sigmoid") or not cfg["use_bias"] \
+                        or cfg.get("go_backwards"):
+                    raise ValueError(f"unsupported LSTM configuration in layer {cfg['name']}")
+                group = weights[f"layers/{group_name}/cell/vars"]
+                layers.append({
+                    "kernel": group["0"][()], "recurrent_kernel": group["1"][()], "bias": group["2"][()],
+                    "return_sequences": cfg["return_sequences"],
+                })
+            elif kind == "Dense":
+                if cfg["activation"] != "linear" or cfg["units"] != 1:
+                    raise ValueError("only a single linear Dense output is supported")
+                group = weights[f"layers/{group_name}/vars"]
+                dense = (group["0"][()], group["1"][()])
+            else:
+                raise ValueError(f"unsupported layer: {kind}")
+
+    if not layers or dense is None:
+        raise ValueError("expected at least one LSTM layer followed by a Dense output")
+    return NumpyLSTM(layers, *dense, timesteps=timesteps, source_hash=file_hash(path), dtype=dtype)
+
+
+def load_lstm_model(path, source_path=None):
+    """
+    Loads an exported .npz. If source_path is given, returns None when the export was
+    made from a different version of that .keras file (stale export).
+    """
+    model = NumpyLSTM.load(path)
+    if source_path is not None and os.path.exists(source_path) and model.source_hash != file_hash(source_path):
+        return None
+    return model
+
+
+def export(keras_path, out_path, n_check=256, seed=0):
+    """
+    Converts the .keras archive and saves it. If Keras is importable the NumPy forward
+    pass is checked against it on random windows; max_err is None otherwise.
+    """
+    model = load_keras_lstm(keras_path)
+    model.save(out_path)
+
+    try:
+        import keras
+    except ImportError:
+        return model, None
+
+    rng = np.random.default_rng(seed)
+    X = rng.uniform(-1.0, 2.0, size=(n_check, model.timesteps or 20, model.n_features)).astype(np.float32)
+    expected = np.asarray(keras.saving.load_model(keras_path, compile=False)(X))[:, 0]
+    return model, float(np.max(np.abs(model.forward(X) - expected)))
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    keras_path = resolve_path(argv[0] if argv else "models/elektra_soc_lstm.keras")
+    out_path = resolve_path(argv[1] if len(argv) > 1 else os.path.splitext(keras_path)[0] + ".weights.npz")
+
+    model, max_err = export(keras_path, out_path)
+    print(f"✅ LSTM {model.units} x {model.timesteps} steps, {model.n_features} inputs -> {out_path}")
+    if max_err is None:
+        print("   keras not installed; skipped the parity check")
+    else:
+        print(f"   max |numpy - keras| on random windows: {max_err:.3g}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import json
+import numpy as np
+import os
+import sys
+
+# Allow imports from parent
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from inference import model_registry
+from inference.lstm_runtime import load_keras_lstm, load_lstm_model
+from inference.soc_predictor import BatchSOCPredictor
+from utils.paths import resolve_path
+
+SOC_LSTM_PATH = "models/elektra_soc_lstm.keras"
+# NumPy export of the same weights (python -m inference.lstm_runtime); used when present and up to date
+SOC_LSTM_WEIGHTS_PATH = "models/elektra_soc_lstm.weights.npz"
+
+# The training scaler: {"input_min": [...], "input_max": [...], "output_scale": ...}.
+# None ships with the model, and guessed ranges give confidently wrong SoC, so the
+# predictor is only built with a scaler (from this file or passed explicitly).
+SOC_LSTM_SCALER_PATH = "models/elektra_soc_lstm.scaler.json"
+
+# Model inputs, in order; each is min-max scaled to [0, 1] with the training scaler's
+# ranges, and the network's output is multiplied by output_scale to give SoC in %
+INPUT_FEATURES = ("voltage", "current", "temperature")
+
+MODES = ("window", "stateful")
+
+
+def load_scaler(path=SOC_LSTM_SCALER_PATH):
+    """The scaler dict stored at path, or None if there is no such file"""
+    path = resolve_path(path)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+class LSTMSOCPredictor(BatchSOCPredictor):
+    """
+    SoC from the Keras LSTM, evaluated with the NumPy runtime for many packs at once.
+
+    Every pack keeps its last `window` scaled samples in an array-backed ring.
+    mode="window":   each call re-scores every pack's full window from zero state in one
+                     batched forward pass (exactly what the model was trained on).
+    mode="stateful": each pack carries the LSTM's (h, c) from call to call, so a new sample
+                     costs one timestep. The state then summarizes the whole stream rather
+                     than only the last window, so long streams drift from window mode.
+
+    Coulomb counting (the parent class) keeps running underneath: it is returned until a
+    pack has `window` samples, and for every pack if no LSTM weights can be loaded.
+
+    input_min / input_max / output_scale are the training scaler. Any not given are read
+    from scaler_path; ValueError if the scaler is still incomplete.
+    """
+    def __init__(self, model_path=SOC_LSTM_PATH, weights_path=SOC_LSTM_WEIGHTS_PATH, mode="window",
+                 input_min=None, input_max=None, output_scale=None, scaler_path=SOC_LSTM_SCALER_PATH,
+                 total_capacity_ah=100.0, initial_soc=90.0, capacity=1024, store=None, chemistry="nmc"):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}, got {mode!r}")
+        scaler = {"input_min": input_min, "input_max": input_max, "output_scale": output_scale}
+        if None in scaler.values():
+            stored = (load_scaler(scaler_path) if scaler_path else None) or {}
+            scaler = {k: stored.get(k) if v is None else v for k, v in scaler.items()}
+        missing = [k for k, v in scaler.items() if v is None]
+        if missing:
+            raise ValueError(f"no training scaler for the SoC LSTM (missing {', '.join(missing)}): "
+                             f"pass input_min / input_max / output_scale or provide {SOC_LSTM_SCALER_PATH}")
+        input_min = np.asarray(scaler["input_min"], dtype=np.float64)
+        input_max = np.asarray(scaler["input_max"], dtype=np.float64)
+        if input_min.shape != (len(INPUT_FEATURES),) or input_max.shape != input_min.shape:
+            raise ValueError(f"input_min and input_max need one value per input {INPUT_FEATURES}")
+        if not (input_max > input_min).all():
+            raise ValueError("input_max must be greater than input_min for every input")
+
+        self.mode = mode
+        self.model_path = resolve_path(model_path)
+        self.weights_path = resolve_path(weights_path) if weights_path else None
+        self.model = self._load_model()
+
+        self.input_min = input_min.astype(np.float32)
+        self.input_scale = (1.0 / (input_max - input_min)).astype(np.float32)
+        self.output_scale = float(scaler["output_scale"])
+        self.window = (self.model.timesteps or 20) if self.model is not None else 20
+
+        super().__init__(total_capacity_ah=total_capacity_ah, initial_soc=initial_soc, capacity=capacity, store=store,
+                         chemistry=chemistry)
+        # Per-pack LSTM state, in the same store as the Coulomb state
+        self.store.add_field("lstm.window", shape=(self.window, len(INPUT_FEATURES)), dtype=np.float32, default=0)
+        self.store.add_field("lstm.seen", dtype=np.int64, default=0)
+        self._state_fields = []
+        if self.model is not None and self.mode == "stateful":
+            for layer, units in enumerate(self.model.units):
+                self._state_fields.append((f"lstm.h{layer}", f"lstm.c{layer}"))
+                for name in self._state_fields[-1]:
+                    self.store.add_field(name, shape=(units,), dtype=self.model.dtype, default=0)
+
+    def _load_model(self):
+        model = None
+        if self.weights_path:
+            # Skipped (None) if missing or exported from a different .keras file
+            model = model_registry.get_model(
+                self.weights_path, loader=lambda path: load_lstm_model(path, self.model_path))
+        if model is None:
+            try:
+                model = model_registry.get_model(self.model_path, loader=load_keras_lstm)
+            except ImportError:
+                # Reading the .keras archive needs h5py; fall back to Coulomb counting
+                model = None
+        return model
+
+    @property
+    def windows(self):
+        return self.store["lstm.window"]
+
+    @property
+    def seen(self):
+        return self.store["lstm.seen"]
+
+    @property
+    def states(self):
+        """[(h, c), ...] per layer, one row per pack (stateful mode)"""
+        return [(self.store[h], self.store[c]) for h, c in self._state_fields]
+
+    def predict(self, pack_ids, voltage, current, temperature, timestamp, capacity_ah=None):
+        """
+        Same arguments as BatchSOCPredictor.predict (no duplicate pack ids within one call).
+        Returns SOC per pack in [0, 100] (the Coulomb estimate while a pack's window fills).
+        """
+        coulomb = super().predict(pack_ids, voltage, current, temperature, timestamp, capacity_ah)
+        if self.model is None:
+            return coulomb
+        slots = self._slots(pack_ids)  # resolved (and cached) by the parent call
+
+        # 1. Scale the new samples and push them into each pack's ring
+        x = np.empty((len(slots), len(INPUT_FEATURES)), dtype=np.float32)
+        x[:, 0] = voltage
+        x[:, 1] = current
+        x[:, 2] = temperature
+        x -= self.input_min
+        x *= self.input_scale
+        seen = self.seen[slots]
+        windows = self.windows
+        windows[slots, seen % self.window] = x
+        seen += 1
+        self.seen[slots] = seen
+        ready = seen >= self.window
+
+        # 2. Score
+        if self.mode == "stateful":
+            state = [(h[slots], c[slots]) for h, c in self.states]
+            out = self.model.step(x, state)
+            for (h, c), (h_new, c_new) in zip(self.states, state):
+                h[slots] = h_new
+                c[slots] = c_new
+        else:
+            out = np.zeros(len(slots), dtype=np.float32)
+            if ready.any():
+                ready_slots = slots[ready]
+                # Oldest sample first: the next write position is the oldest entry
+                order = (seen[ready, None] + np.arange(self.window)) % self.window
+                out[ready] = self.model.forward(windows[ready_slots[:, None], order])
+
+        lstm_soc = np.clip(out.astype(np.float64) * self.output_scale, 0, 100)
+        return np.where(ready, lstm_soc, coulomb)
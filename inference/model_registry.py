@@ -0,0 +1,79 @@
+"""
+Process-wide, thread-safe model registry.
+
+Models are loaded lazily on first use and shared by every predictor instance (and
+every Streamlit session) in the process. preload() starts the load on a background
+thread so it overlaps with other startup work.
+"""
+import os
+import sys
+import threading
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.paths import resolve_path
+
+_models = {}
+_locks = {}
+_preloads = {}
+_registry_lock = threading.Lock()
+
+
+def _joblib_load(path):
+    import joblib  # deferred: joblib (and the model's own library) are slow to import
+
+    return joblib.load(path)
+
+
+def _path_lock(path):
+    with _registry_lock:
+        lock = _locks.get(path)
+        if lock is None:
+            lock = _locks[path] = threading.Lock()
+        return lock
+
+
+def get_model(path, loader=None):
+    """
+    Returns the model stored at path, loading it once per process.
+    Returns None if the file does not exist.
+    """
+    path = resolve_path(path)
+    model = _models.get(path)
+    if model is not None:
+        return model
+
+    # One lock per path: concurrent callers wait for a single load, other models load in parallel
+    with _path_lock(path):
+        model = _models.get(path)
+        if model is None and os.path.exists(path):
+            model = (loader or _joblib_load)(path)
+            _models[path] = model
+        return model
+
+
+def preload(path, loader=None):
+    """
+    Starts loading a model in a daemon thread and returns the thread.
+    No-op (returns the existing thread or None) if it is already loaded or loading.
+    """
+    path = resolve_path(path)
+    with _registry_lock:
+        thread = _preloads.get(path)
+        if path in _models or (thread is not None and thread.is_alive()):
+            return thread
+        thread = threading.Thread(target=get_model, args=(path, loader),
+                                  name=f"preload:{os.path.basename(path)}", daemon=True)
+        _preloads[path] = thread
+        thread.start()
+    return thread
+
+
+def is_loaded(path):
+    return resolve_path(path) in _models
+
+
+def clear():
+    """Drops every cached model (e.g. after replacing model files)"""
+    with _registry_lock:
+        _models.clear()
@@ -0,0 +1,373 @@
+"""
+Headless SoC/SoH inference service with micro-batching.
+
+Concurrent requests are queued and scored together: a batch is closed when it
+reaches max_batch_size or when its oldest request has waited max_wait_ms.
+Per-pack SoC filter state lives server-side in a BatchSOCPredictor.
+
+Endpoints (HTTP/1.1, keep-alive, JSON bodies):
+  POST /soc      {"pack_id", "voltage", "current", "temperature", "timestamp"}
+                 or {"samples": [ ...same objects... ]}             -> {"soc": ...}
+  POST /soh      {"features": {...dynamic features...}}
+                 or {"samples": [ {...}, ... ]}                     -> {"soh": ...}
+  GET  /metrics  latency percentiles, batch-size histogram, counters
+  GET  /metrics/prometheus  per-stage latency, batch-size and queue-depth histograms
+                 (utils.instrumentation) in the Prometheus text format
+  GET  /health
+
+Run: python -m inference.service --port 8765   (or --unix /tmp/elektra.sock)
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from inference.soc_predictor import BatchSOCPredictor
+from inference.soh_predictor import SOHPredictor
+from utils.dvdq_features import load_chemistry_features
+from utils.instrumentation import metrics as instrumentation
+
+SOC_FIELDS = ("pack_id", "voltage", "current", "timestamp")
+SOC_NUMERIC_FIELDS = ("voltage", "current", "temperature", "timestamp")
+
+
+def _number(value, name):
+    """float(value), or ValueError naming the field (NaN and inf are rejected too)"""
+    if isinstance(value, bool):
+        raise ValueError(f"{name} must be a number, got {value!r}")
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a number, got {value!r}") from None
+    if not np.isfinite(number):
+        raise ValueError(f"{name} must be finite, got {value!r}")
+    return number
+
+
+def _soc_sample(item):
+    """Validated copy of one /soc sample: numeric fields as floats, a hashable pack_id"""
+    if not isinstance(item, dict):
+        raise ValueError(f"each sample must be a JSON object, got {type(item).__name__}")
+    missing = [k for k in SOC_FIELDS if k not in item]
+    if missing:
+        raise ValueError(f"missing fields: {', '.join(missing)}")
+    pack_id = item["pack_id"]
+    if not isinstance(pack_id, (str, int)) or isinstance(pack_id, bool):
+        raise ValueError(f"pack_id must be a string or an integer, got {pack_id!r}")
+    sample = {"pack_id": pack_id}
+    for name in SOC_NUMERIC_FIELDS:
+        if name in item:
+            sample[name] = _number(item[name], name)
+    return sample
+
+
+def _soh_features(item):
+    """Validated copy of one /soh feature object: every value as a float"""
+    if not isinstance(item, dict):
+        raise ValueError(f"features must be a JSON object, got {type(item).__name__}")
+    return {str(name): _number(value, name) for name, value in item.items()}
+
+
+class ServiceMetrics:
+    """Bounded latency reservoir + batch-size histogram per endpoint"""
+    def __init__(self, reservoir=65536):
+        self.reservoir = reservoir
+        self.started = time.time()
+        self._latency = {}
+        self._latency_count = {}
+        self._batch_sizes = {}
+        self.requests = {}
+        self.errors = 0
+
+    def record_latency(self, endpoint, seconds):
+        buf = self._latency.get(endpoint)
+        if buf is None:
+            buf = self._latency[endpoint] = np.zeros(self.reservoir)
+            self._latency_count[endpoint] = 0
+        n = self._latency_count[endpoint]
+        buf[n % self.reservoir] = seconds
+        self._latency_count[endpoint] = n + 1
+        self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+    def record_batch(self, endpoint, size):
+        stats = self._batch_sizes.setdefault(endpoint, {"batches": 0, "items": 0, "histogram": {}})
+        stats["batches"] += 1
+        stats["items"] += size
+        # Power-of-two buckets: "<=1", "<=2", "<=4", ...
+        bucket = 1 << max(size - 1, 0).bit_length()
+        stats["histogram"][bucket] = stats["histogram"].get(bucket, 0) + 1
+
+    def snapshot(self):
+        out = {"uptime_s": time.time() - self.started, "errors": self.errors, "endpoints": {}}
+        for endpoint, count in self.requests.items():
+            lat = self._latency[endpoint][:min(count, self.reservoir)] * 1e3
+            stats = self._batch_sizes.get(endpoint, {"batches": 0, "items": 0, "histogram": {}})
+            n_batches = stats["batches"]
+            out["endpoints"][endpoint] = {
+                "requests": count,
+                "latency_ms": {
+                    "p50": float(np.percentile(lat, 50)),
+                    "p90": float(np.percentile(lat, 90)),
+                    "p99": float(np.percentile(lat, 99)),
+                    "max": float(lat.max()),
+                },
+                "batches": n_batches,
+                "mean_batch_size": stats["items"] / n_batches if n_batches else 0.0,
+                "batch_size_histogram": {f"<={k}": v for k, v in sorted(stats["histogram"].items())},
+            }
+        return out
+
+
+class MicroBatcher:
+    """
+    Collects submitted items and calls score_fn(list_of_items) -> list_of_results once
+    per batch. A batch closes at max_batch_size items or max_wait_ms after its first item.
+    """
+    def __init__(self, name, score_fn, max_batch_size=512, max_wait_ms=2.0, metrics=None):
+        self.name = name
+        self.score_fn = score_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.metrics = metrics
+        self.queue = asyncio.Queue()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((item, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+
+            # Drain whatever is already queued, then wait (bounded) for stragglers
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            items = [item for item, _ in batch]
+            instrumentation.observe("elektra_batch_size", len(batch), stage=f"service.{self.name}")
+            instrumentation.observe("elektra_queue_depth", self.queue.qsize(), queue=self.name)
+            try:
+                with instrumentation.timer(f"service.{self.name}"):
+                    results = self.score_fn(items)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            if self.metrics is not None:
+                self.metrics.record_batch(self.name, len(batch))
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+
+class InferenceService:
+    """Owns the predictors and the per-pack SoC state; scoring functions for the batchers"""
+    def __init__(self, max_batch_size=512, max_wait_ms=2.0, total_capacity_ah=100.0):
+        self.metrics = ServiceMetrics()
+        self.soc = BatchSOCPredictor(total_capacity_ah=total_capacity_ah)
+        self.soh = SOHPredictor()
+        # Load the SoH model in the background while the rest of startup runs
+        self._preload = self.soh.preload()
+        self.static_features = load_chemistry_features()
+        self.soc_batcher = MicroBatcher("soc", self.score_soc, max_batch_size, max_wait_ms, self.metrics)
+        self.soh_batcher = MicroBatcher("soh", self.score_soh, max_batch_size, max_wait_ms, self.metrics)
+
+    def start(self):
+        self.soc_batcher.start()
+        self.soh_batcher.start()
+
+    async def stop(self):
+        await self.soc_batcher.stop()
+        await self.soh_batcher.stop()
+
+    def score_soc(self, samples):
+        """One BatchSOCPredictor call per round; a pack seen twice in a batch goes to the next round"""
+        results = [None] * len(samples)
+        rounds = []
+        seen = {}
+        for i, sample in enumerate(samples):
+            r = seen.get(sample["pack_id"], 0)
+            seen[sample["pack_id"]] = r + 1
+            if r == len(rounds):
+                rounds.append([])
+            rounds[r].append(i)
+
+        for members in rounds:
+            rows = [samples[i] for i in members]
+            soc = self.soc.predict(
+                [s["pack_id"] for s in rows],
+                np.fromiter((s["voltage"] for s in rows), np.float64, len(rows)),
+                np.fromiter((s["current"] for s in rows), np.float64, len(rows)),
+                np.fromiter((s.get("temperature", 25.0) for s in rows), np.float64, len(rows)),
+                np.fromiter((s["timestamp"] for s in rows), np.float64, len(rows)),
+            )
+            for i, value in zip(members, soc.tolist()):
+                results[i] = value
+        return results
+
+    def score_soh(self, feature_rows):
+        order = self.soh.feature_order
+        X = np.empty((len(feature_rows), len(order)), dtype=np.float32)
+        for i, row in enumerate(feature_rows):
+            merged = {**row, **self.static_features}
+            X[i] = [merged.get(name, 0) for name in order]
+        return self.soh.predict_many(X).tolist()
+
+    async def handle(self, method, path, body):
+        """Returns (status, payload)"""
+        if method == "GET" and path == "/health":
+            return 200, {"status": "ok"}
+        if method == "GET" and path == "/metrics":
+            return 200, self.metrics.snapshot()
+        if method == "GET" and path == "/metrics/prometheus":
+            return 200, instrumentation.render_prometheus()
+
+        if method == "POST" and path in ("/soc", "/soh"):
+            request = json.loads(body) if body else {}
+            if not isinstance(request, dict):
+                raise ValueError(f"request body must be a JSON object, got {type(request).__name__}")
+            if "samples" in request and not isinstance(request["samples"], list):
+                raise ValueError("samples must be a JSON array")
+            # Validate and coerce up front: one malformed sample must not fail a whole micro-batch
+            if path == "/soc":
+                batcher, key = self.soc_batcher, "soc"
+                items = [_soc_sample(item) for item in request.get("samples", [request])]
+            else:
+                batcher, key = self.soh_batcher, "soh"
+                items = [_soh_features(item) for item in request.get("samples", [request.get("features", {})])]
+
+            results = await asyncio.gather(*(batcher.submit(item) for item in items))
+            if "samples" in request:
+                return 200, {key: results}
+            return 200, {key: results[0]}
+
+        return 404, {"error": f"no route for {method} {path}"}
+
+
+async def _handle_connection(service, reader, writer):
+    """Minimal HTTP/1.1 with keep-alive (Content-Length bodies only)"""
+    try:
+        while True:
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+            start = time.perf_counter()
+
+            lines = head.decode("latin-1").split("\r\n")
+            headers = {}
+            for line in lines[1:]:
+                if ":" in line:
+                    k, v = line.split(":", 1)
+                    headers[k.strip().lower()] = v.strip()
+
+            path = body = None
+            try:
+                request_line = lines[0].split(" ", 2)
+                if len(request_line) != 3:
+                    raise ValueError(f"malformed request line {lines[0]!r}")
+                method, path, _ = request_line
+                length = int(headers.get("content-length", 0))
+                if length < 0:
+                    raise ValueError(f"invalid Content-Length {length}")
+                body = await reader.readexactly(length) if length else b""
+                status, payload = await service.handle(method, path, body)
+            except (ValueError, KeyError, TypeError) as e:
+                service.metrics.errors += 1
+                status, payload = 400, {"error": str(e)}
+
+            if isinstance(payload, str):
+                data, content_type = payload.encode(), "text/plain; version=0.0.4"
+            else:
+                data, content_type = json.dumps(payload).encode(), "application/json"
+            reason = {200: "OK", 400: "Bad Request", 404: "Not Found"}.get(status, "OK")
+            writer.write(
+                f"HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(data)}\r\n\r\n".encode() + data
+            )
+            await writer.drain()
+
+            if path in ("/soc", "/soh"):
+                service.metrics.record_latency(path[1:], time.perf_counter() - start)
+            # Without a body read the framing of the next request is unknown
+            if body is None or headers.get("connection", "").lower() == "close":
+                break
+    finally:
+        writer.close()
+
+
+async def serve(host="127.0.0.1", port=8765, unix_path=None, max_batch_size=512, max_wait_ms=2.0, ready=None,
+                instrument=True):
+    if instrument:
+        instrumentation.enable()
+    service = InferenceService(max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    service.start()
+
+    handler = lambda r, w: _handle_connection(service, r, w)
+    if unix_path:
+        server = await asyncio.start_unix_server(handler, path=unix_path)
+    else:
+        server = await asyncio.start_server(handler, host=host, port=port, backlog=1024)
+
+    if ready is not None:
+        ready.set()
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Elektra SoC/SoH inference service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", dest="unix_path", default=None, help="serve on a Unix socket instead of TCP")
+    parser.add_argument("--max-batch", type=int, default=512)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    parser.add_argument("--no-instrumentation", action="store_true", help="disable /metrics/prometheus stage timers")
+    args = parser.parse_args(argv)
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix_path, args.max_batch, args.max_wait_ms,
+                          instrument=not args.no_instrumentation))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,20 @@
+import os
+import sys
+
 import numpy as np
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.ocv_tables import get_ocv_table
+from utils.scan import linear_recurrence
+from utils.state_store import FleetStateStore
+
+
 class SOCPredictor:
-    def __init__(self, total_capacity_ah=100.0):
+    def __init__(self, total_capacity_ah=100.0, chemistry="nmc"):
         self.capacity_as = total_capacity_ah * 3600 # Amp-seconds
+        # OCV -> SoC table of the pack's chemistry (shared with the simulators)
+        self.ocv_table = get_ocv_table(chemistry)
         self.prev_time = None
         self.estimated_soc = 90.0 # Initial guess
         
@@ -23,13 +35,126 @@ class SOCPredictor:
         # If current is very low (Idle), voltage stabilizes to OCV.
         # We can use this to "reset" the SOC to the true value based on voltage.
         if abs(current) < 1.0: 
-            # Inverse of the OCV curve used in generator
-            # cell_v = 3.2 + (soc/100) -> soc = (cell_v - 3.2) * 100
-            cell_v = voltage / 96.0
-            voltage_soc = (cell_v - 3.2) * 100
+            # Inverse of the OCV curve (the same table the generator can use)
+            voltage_soc = self.ocv_table.soc(voltage, temperature)
             
             # Gradually pull estimate towards voltage-based SOC (Complementary Filter)
             # This prevents jumps but corrects drift
             self.estimated_soc = (0.98 * self.estimated_soc) + (0.02 * voltage_soc)
             
-        return np.clip(self.estimated_soc, 0, 100)
\ No newline at end of file
+        return np.clip(self.estimated_soc, 0, 100)
+
+    def predict_series(self, voltage, current, temperature, timestamp):
+        """
+        predict() for a block of consecutive samples of this pack in one vectorized pass.
+        Returns the SOC after every sample, equal to calling predict() once per sample
+        (state carries over between calls, so a long recording can be fed in chunks).
+        """
+        voltage = np.asarray(voltage, dtype=np.float64)
+        current = np.asarray(current, dtype=np.float64)
+        temperature = np.broadcast_to(np.asarray(temperature, dtype=np.float64), np.shape(timestamp))
+        timestamp = np.asarray(timestamp, dtype=np.float64)
+        n = len(timestamp)
+        if n == 0:
+            return np.empty(0)
+
+        first = self.prev_time is None
+        prev_time = np.concatenate([[timestamp[0] if first else self.prev_time], timestamp[:-1]])
+        dt = timestamp - prev_time
+
+        # soc[t] = a[t] * soc[t-1] + b[t]: Coulomb step, then the idle complementary filter
+        coulomb_change = (current * dt) / self.capacity_as * 100
+        idle = np.abs(current) < 1.0
+        if first:
+            idle[0] = False  # the first sample only initializes the clock
+        voltage_soc = np.zeros(n)
+        voltage_soc[idle] = self.ocv_table.soc(voltage[idle], temperature[idle])
+        a = np.where(idle, 0.98, 1.0)
+        b = a * coulomb_change + (1.0 - a) * voltage_soc
+        soc = linear_recurrence(a, b, self.estimated_soc)
+
+        self.estimated_soc = float(soc[-1])
+        self.prev_time = float(timestamp[-1])
+        out = np.clip(soc, 0, 100)
+        if first:
+            out[0] = soc[0]  # first call returns the initial guess unclipped, like predict()
+        return out
+
+
+class BatchSOCPredictor:
+    """
+    SOCPredictor for many packs at once: per-pack state lives in arrays of a
+    FleetStateStore (its own, or one shared with other components and checkpointed).
+    Packs are identified by arbitrary hashable ids; unknown ids join the batch on
+    first sight (and return the initial guess, like SOCPredictor's first call).
+    """
+    def __init__(self, total_capacity_ah=100.0, initial_soc=90.0, capacity=1024, store=None, chemistry="nmc"):
+        self.capacity_as = total_capacity_ah * 3600 # Amp-seconds
+        self.initial_soc = initial_soc
+        self.ocv_table = get_ocv_table(chemistry)
+        self.store = FleetStateStore(capacity) if store is None else store
+        self.store.add_field("soc.prev_time", default=np.nan)
+        self.store.add_field("soc.estimated", default=initial_soc)
+
+    def __len__(self):
+        return len(self.store)
+
+    @property
+    def index(self):
+        return self.store.index
+
+    @property
+    def pack_ids(self):
+        return self.store.pack_ids
+
+    @property
+    def prev_time(self):
+        return self.store["soc.prev_time"]
+
+    @property
+    def estimated_soc(self):
+        return self.store["soc.estimated"]
+
+    def _slots(self, pack_ids):
+        """Maps pack ids to array slots, adding packs that join the batch"""
+        return self.store.slots(pack_ids)
+
+    def remove(self, pack_ids):
+        """Drops packs that left the batch (from every component sharing the store)"""
+        self.store.remove(pack_ids)
+
+    def predict(self, pack_ids, voltage, current, temperature, timestamp, capacity_ah=None):
+        """
+        pack_ids: sequence of pack ids (no duplicates within one call)
+        voltage, current, temperature, timestamp: arrays aligned with pack_ids
+        (timestamp may also be a scalar shared by all packs)
+        capacity_ah: optional per-pack capacity overriding total_capacity_ah
+        Returns SOC per pack, matching SOCPredictor.predict for each pack.
+        """
+        slots = self._slots(pack_ids)
+        voltage = np.broadcast_to(np.asarray(voltage, dtype=np.float64), slots.shape)
+        current = np.asarray(current, dtype=np.float64)
+        temperature = np.broadcast_to(np.asarray(temperature, dtype=np.float64), slots.shape)
+        timestamp = np.broadcast_to(np.asarray(timestamp, dtype=np.float64), slots.shape)
+
+        prev_time, estimated_soc = self.prev_time, self.estimated_soc
+        previous = prev_time[slots]
+        soc = estimated_soc[slots]
+        first = np.isnan(previous)
+
+        dt = np.where(first, 0.0, timestamp - previous)
+        prev_time[slots] = timestamp
+
+        # --- STRATEGY 1: COULOMB COUNTING (The Integrator) ---
+        capacity_as = self.capacity_as if capacity_ah is None else np.asarray(capacity_ah, dtype=np.float64) * 3600
+        soc = soc + (current * dt) / capacity_as * 100
+
+        # --- STRATEGY 2: OCV RESET (The Corrector) ---
+        # Complementary filter towards the voltage-based SOC (OCV table inverse) while idle
+        idle = np.flatnonzero((np.abs(current) < 1.0) & ~first)
+        soc[idle] = (0.98 * soc[idle]) + (0.02 * self.ocv_table.soc(voltage[idle], temperature[idle]))
+
+        estimated_soc[slots] = soc
+
+        # First sighting returns the initial guess unclipped, like SOCPredictor
+        return np.where(first, soc, np.clip(soc, 0, 100))
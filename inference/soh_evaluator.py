@@ -0,0 +1,224 @@
+"""
+Change-triggered, memoizing SoH evaluation in front of SOHPredictor.
+
+SoH barely moves between ticks and most model inputs (cycle, the static dV/dQ
+features) are constant, so scoring every pack on every tick mostly recomputes the
+previous answer. SOHEvaluator re-scores a pack only when
+  - one of its features has moved more than its tolerance since it was last scored, or
+  - max_staleness_s (of the caller's clock, if set) has passed since then, or
+  - it is new;
+otherwise the pack keeps its last SoH ("skipped"). A pack that is due is looked up in a
+bounded LRU cache keyed on its quantized feature vector ("hit"), and only the misses go
+to the model, in one predict_many call ("scored").
+
+With a tree ensemble (FlatForest) the output can only change when a feature crosses one
+of the model's split thresholds, so each feature is quantized to the interval between
+thresholds it falls in. A feature that stays inside its interval never triggers a
+re-score, whatever its tolerance, and cache hits are exact: with the default (zero)
+tolerances the evaluator returns exactly what SOHPredictor would. Non-zero tolerances
+trade accuracy for model calls among features that do cross splits. Other models are
+quantized by tolerance (so with zero tolerances only identical vectors are reused).
+
+The exact default does not reach an order of magnitude across a fleet: most packs cross
+some split between blocks, and benchmarks/bench_soh_evaluator.py saves 2.6-4.9x model
+rows there (6-12x only for the dashboard's single pack at real time). FLEET_TOLERANCES
+with FLEET_MAX_STALENESS_S is the lossy fleet setting that does: 10-14x fewer model rows
+(by cache size), with 99% of pack scores within ~1.1 SoH points of the model (mean ~0.3,
+worst single score ~5-6); the dashboard's smoothed SoH stays within ~0.7 points with it.
+"""
+import collections
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from inference.soh_predictor import SOHPredictor
+from utils.instrumentation import metrics
+from utils.state_store import FleetStateStore
+
+# Largest change of a feature (in its own units) that may go without a re-score; features
+# not listed re-score whenever they cross a split. The default is exact. LOOSE_TOLERANCES
+# saves ~20% more model rows; it moves the dashboard's smoothed SoH by up to ~0.4 points
+# but single unsmoothed fleet scores by up to ~5 (benchmarks/bench_soh_evaluator.py).
+DEFAULT_TOLERANCES = {}
+LOOSE_TOLERANCES = {
+    "cycle": 0.5,
+    "mean_voltage": 0.5,          # V
+    "min_voltage": 0.5,
+    "max_voltage": 0.5,
+    "voltage_std": 0.05,
+    "rolling_voltage_std": 0.05,
+    "capacity_ah": 0.1,           # Ah
+    "delta_capacity": 0.01,
+    "capacity_ratio": 0.001,
+}
+# Fleet monitoring (fleet pipeline, ingested telemetry): 4x LOOSE_TOLERANCES, and every pack
+# re-scored at least every 2 h of its clock (see the module docstring for the SoH bound).
+FLEET_TOLERANCES = {name: 4 * tolerance for name, tolerance in LOOSE_TOLERANCES.items()}
+FLEET_MAX_STALENESS_S = 7200.0
+DEFAULT_CACHE_SIZE = 1 << 16
+
+
+def split_points(model, n_features):
+    """Sorted split thresholds of each input feature of a FlatForest (None for other models)"""
+    if not all(hasattr(model, name) for name in ("feature", "threshold", "is_leaf")):
+        return None
+    split = ~model.is_leaf
+    return [np.unique(model.threshold[split & (model.feature == j)]) for j in range(n_features)]
+
+
+class SOHEvaluator:
+    """
+    Per-pack gate + LRU cache around an SOHPredictor. Packs are identified by
+    arbitrary hashable ids and join on first sight (like BatchSOCPredictor); their
+    state lives in a FleetStateStore (its own, or one shared with other components).
+
+        evaluator = SOHEvaluator()
+        soh = evaluator.evaluate(pack_ids, {**window.features(cycle), **static}, now)
+        evaluator.summary()   # {"rows", "skip_rate", "hit_rate", "model_rows", "reduction", ...}
+    """
+    def __init__(self, predictor=None, tolerances=None, max_staleness_s=None, cache_size=DEFAULT_CACHE_SIZE,
+                 capacity=1024, store=None):
+        self.predictor = predictor or SOHPredictor()
+        self.feature_order = list(self.predictor.feature_order)
+        tolerances = {**DEFAULT_TOLERANCES, **(tolerances or {})}
+        self.tolerance = np.array([tolerances.get(name, 0.0) for name in self.feature_order])
+        self.max_staleness_s = max_staleness_s
+        self.cache_size = cache_size
+        self._cache = collections.OrderedDict()
+        self._splits = None  # resolved with the model, on first use
+        self._key_dtype = np.float64
+
+        # Per-pack state in a FleetStateStore (its own, or shared with other components)
+        n_features = len(self.feature_order)
+        self.store = FleetStateStore(capacity) if store is None else store
+        self.store.add_field("soh.features", shape=(n_features,), default=np.nan)
+        self.store.add_field("soh.keys", shape=(n_features,), default=np.nan)
+        self.store.add_field("soh.time", default=-np.inf)
+        self.store.add_field("soh.value", default=np.nan)
+
+        self.stats = {"calls": 0, "rows": 0, "skipped": 0, "hits": 0, "model_rows": 0, "model_calls": 0}
+
+    def __len__(self):
+        return len(self.store)
+
+    @property
+    def scored_features(self):
+        return self.store["soh.features"]
+
+    @property
+    def scored_keys(self):
+        return self.store["soh.keys"]
+
+    @property
+    def scored_time(self):
+        return self.store["soh.time"]
+
+    @property
+    def soh(self):
+        return self.store["soh.value"]
+
+    def _as_matrix(self, features, n_rows):
+        """float64 (n_rows, n_features) in feature_order from a dict of columns or a matrix"""
+        if isinstance(features, dict):
+            X = np.empty((n_rows, len(self.feature_order)))
+            for j, name in enumerate(self.feature_order):
+                X[:, j] = features.get(name, 0)
+            return X
+        X = np.asarray(features, dtype=np.float64)
+        if X.shape != (n_rows, len(self.feature_order)):
+            raise ValueError(f"expected a ({n_rows}, {len(self.feature_order)}) matrix in feature_order, got shape {X.shape}")
+        return X
+
+    def _quantize(self, X):
+        """Cache keys: interval between split thresholds (tree models) or multiples of the tolerance"""
+        if self._splits is None:
+            self._splits = split_points(self.predictor.model, len(self.feature_order)) or False
+            if self._splits and max(len(thresholds) for thresholds in self._splits) < 2 ** 15:
+                self._key_dtype = np.int16  # compact cache keys
+        if not self._splits:
+            return np.where(self.tolerance > 0, np.round(X / np.where(self.tolerance > 0, self.tolerance, 1.0)), X)
+
+        # The model compares float32 inputs with `x < threshold`; NaN takes its own branch
+        X32 = X.astype(np.float32)
+        keys = np.empty(X.shape)
+        for j, thresholds in enumerate(self._splits):
+            keys[:, j] = np.searchsorted(thresholds, X32[:, j], side="right")
+        keys[np.isnan(X32)] = -1
+        return keys
+
+    def evaluate(self, pack_ids, features, now):
+        """
+        pack_ids: sequence of pack ids (no duplicates within one call)
+        features: dict of per-pack feature columns keyed by name (scalars broadcast, missing
+                  ones are 0, as in SOHPredictor.predict_many) or an (n, n_features) matrix
+        now: timestamp in seconds (scalar or per pack) for the staleness limit
+        Returns a float64 array of SOH per pack.
+        """
+        slots = self.store.slots(pack_ids)
+        scored_features, scored_keys, scored_time, soh = (self.scored_features, self.scored_keys,
+                                                          self.scored_time, self.soh)
+        X = self._as_matrix(features, len(slots))
+        keys = self._quantize(X)
+        now = np.broadcast_to(np.asarray(now, dtype=np.float64), slots.shape)
+
+        # 1. Gate: a feature moved to another key and past its tolerance, stale, or new
+        moved = (keys != scored_keys[slots]) & ~(np.abs(X - scored_features[slots]) <= self.tolerance)
+        due = moved.any(axis=1) | np.isnan(soh[slots])
+        if self.max_staleness_s is not None:
+            due |= now - scored_time[slots] >= self.max_staleness_s
+        due_rows = np.flatnonzero(due)
+
+        # 2. Cache lookup for the due packs (packs sharing a key in this call share one row)
+        pending = {}
+        for row, key in zip(due_rows.tolist(), map(bytes, keys[due_rows].astype(self._key_dtype))):
+            value = self._cache.get(key)
+            if value is None:
+                pending.setdefault(key, []).append(row)
+            else:
+                self._cache.move_to_end(key)
+                soh[slots[row]] = value
+
+        # 3. One model call for the distinct misses
+        if pending:
+            scored = self.predictor.predict_many(X[[rows[0] for rows in pending.values()]].astype(np.float32))
+            for (key, rows), value in zip(pending.items(), scored.tolist()):
+                soh[slots[rows]] = value
+                self._cache[key] = value
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            self.stats["model_calls"] += 1
+
+        due_slots = slots[due_rows]
+        scored_features[due_slots] = X[due_rows]
+        scored_keys[due_slots] = keys[due_rows]
+        scored_time[due_slots] = now[due_rows]
+
+        n_skipped = len(slots) - len(due_rows)
+        n_scored = len(pending)
+        n_hits = len(due_rows) - n_scored
+        self.stats["calls"] += 1
+        self.stats["rows"] += len(slots)
+        self.stats["skipped"] += n_skipped
+        self.stats["hits"] += n_hits
+        self.stats["model_rows"] += n_scored
+        metrics.inc("elektra_soh_rows_total", n_skipped, outcome="skipped")
+        metrics.inc("elektra_soh_rows_total", n_hits, outcome="cache_hit")
+        metrics.inc("elektra_soh_rows_total", n_scored, outcome="scored")
+        return soh[slots]
+
+    def evaluate_one(self, dynamic_features, static_features, now, pack_id=0):
+        """SOHPredictor.predict for one pack, through the gate and the cache"""
+        return float(self.evaluate([pack_id], {**dynamic_features, **static_features}, now)[0])
+
+    def summary(self):
+        """Counters plus skip rate, cache hit rate (of the due rows) and rows per model row"""
+        stats = dict(self.stats)
+        rows, due = stats["rows"], stats["rows"] - stats["skipped"]
+        stats["skip_rate"] = stats["skipped"] / rows if rows else 0.0
+        stats["hit_rate"] = stats["hits"] / due if due else 0.0
+        stats["reduction"] = rows / stats["model_rows"] if stats["model_rows"] else float("inf")
+        stats["cache_entries"] = len(self._cache)
+        return stats
@@ -1,16 +1,32 @@
-import pandas as pd
-import joblib
 import numpy as np
 import os
 import sys
+import threading
 
 # Allow imports from parent
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+from inference import model_registry
+from inference.tree_compiler import FlatForest, load_flat_model
+from utils.paths import resolve_path
+
+SOH_MODEL_PATH = "models/elektra_soh_model.pkl"
+# NumPy-only export of the same model (python -m inference.tree_compiler); used when present and up to date
+SOH_FLAT_MODEL_PATH = "models/elektra_soh_model.flat.npz"
+# Batches from this many rows go to the XGBoost booster when it can be loaded: the flat
+# forest is faster below it (per-call overhead), the booster ~2.5-3x faster above it
+BOOSTER_MIN_ROWS = 32
+
+_NOT_LOADED = object()
+
 class SOHPredictor:
-    def __init__(self):
-        self.model_path = "models/elektra_soh_model.pkl"
-        self.model = joblib.load(self.model_path) if os.path.exists(self.model_path) else None
+    def __init__(self, model_path=SOH_MODEL_PATH, flat_model_path=SOH_FLAT_MODEL_PATH):
+        # Resolved against the package root; the model itself is loaded on first use
+        # and shared with every other predictor through the model registry
+        self.model_path = resolve_path(model_path)
+        self.flat_model_path = resolve_path(flat_model_path) if flat_model_path else None
+        self._model = _NOT_LOADED
+        self._booster = _NOT_LOADED
 
         self.feature_order = [
             "cycle", "mean_voltage", "voltage_std", "min_voltage", "max_voltage",
@@ -23,6 +39,109 @@ class SOHPredictor:
         # Fallback names if your model uses the exact names from your snippet
         # (Assuming the model was trained with the keys generated by load_dvdq_features)
 
+        # Preallocated input buffers (grown on demand, reused across calls)
+        self._row = np.zeros((1, len(self.feature_order)), dtype=np.float32)
+        self._buffer = np.zeros((0, len(self.feature_order)), dtype=np.float32)
+
+    @property
+    def model(self):
+        if self._model is _NOT_LOADED:
+            model = None
+            if self.flat_model_path:
+                # Skipped (None) if missing or exported from a different pickle
+                model = model_registry.get_model(
+                    self.flat_model_path, loader=lambda path: load_flat_model(path, self.model_path))
+            if model is None:
+                model = model_registry.get_model(self.model_path)
+            self._model = model
+        return self._model
+
+    @model.setter
+    def model(self, model):
+        self._model = model
+
+    @property
+    def booster(self):
+        """XGBoost booster of the pickled model for large batches (None without xgboost or for other models)"""
+        if self._booster is _NOT_LOADED:
+            booster = None
+            try:
+                model = model_registry.get_model(self.model_path)
+            except ImportError:
+                model = None
+            if hasattr(model, "get_booster"):
+                booster = model.get_booster()
+            self._booster = booster
+        return self._booster
+
+    def preload(self):
+        """Loads the model on a background thread; returns the thread (None if already loaded)"""
+        if self._model is not _NOT_LOADED:
+            return None
+        thread = threading.Thread(target=lambda: self.model, name="soh-model-preload", daemon=True)
+        thread.start()
+        return thread
+
+    def _as_matrix(self, features):
+        """Returns a float32 (n_rows, n_features) matrix in feature_order, reusing buffers"""
+        n_features = len(self.feature_order)
+
+        if isinstance(features, dict):
+            n_rows = max((np.size(v) for v in features.values()), default=0)
+            X = self._rows_buffer(n_rows)
+            for j, name in enumerate(self.feature_order):
+                # Missing columns are filled with 0 (same as the old reindex)
+                X[:, j] = features.get(name, 0)
+            return X
+
+        features = np.asarray(features)
+        if features.ndim != 2 or features.shape[1] != n_features:
+            raise ValueError(f"expected a (n_rows, {n_features}) matrix in feature_order, got shape {features.shape}")
+
+        if features.dtype == np.float32 and features.flags.c_contiguous:
+            return features
+        X = self._rows_buffer(features.shape[0])
+        X[...] = features
+        return X
+
+    def _rows_buffer(self, n_rows):
+        if self._buffer.shape[0] < n_rows:
+            self._buffer = np.zeros((n_rows, len(self.feature_order)), dtype=np.float32)
+        return self._buffer[:n_rows]
+
+    def predict_many(self, features):
+        """
+        Scores many packs in one model call.
+        features: 2-D array (n_rows, n_features) already in feature_order,
+                  or a dict of column arrays keyed by feature name.
+        Returns a float64 array of SOH values in [0, 100].
+        With the flat forest loaded, batches of BOOSTER_MIN_ROWS or more are scored by the
+        XGBoost booster instead when xgboost is installed (same predictions, faster in bulk).
+        Note: input buffers are reused, so one predictor should not be shared across threads.
+        """
+        X = self._as_matrix(features)
+
+        if self.model:
+            booster = None
+            if hasattr(self.model, "get_booster"):
+                booster = self.model.get_booster()
+            elif isinstance(self.model, FlatForest) and X.shape[0] >= BOOSTER_MIN_ROWS:
+                booster = self.booster
+            if booster is not None:
+                # XGBoost: skip the sklearn wrapper and DMatrix construction
+                pred = booster.inplace_predict(X)
+            else:
+                pred = self.model.predict(X)
+            pred = np.asarray(pred, dtype=np.float64)
+        else:
+            # Fallback Logic (if no model file exists)
+            # Degrade based on cycle and instability
+            cycle = X[:, self.feature_order.index("cycle")].astype(np.float64)
+            rolling_std = X[:, self.feature_order.index("rolling_voltage_std")].astype(np.float64)
+            pred = 100.0 - (cycle * 0.05) - (rolling_std * 100)
+
+        return np.clip(pred, 0, 100)
+
     def predict(self, dynamic_features, static_features):
         """
         dynamic_features: dict of changing values (cycle, voltage_std, etc.)
@@ -33,22 +152,10 @@ class SOHPredictor:
         # "inject static chemistry features"
         combined_features = {**dynamic_features, **static_features}
         
-        # 2. Create DataFrame
-        df = pd.DataFrame([combined_features])
-        
-        # 3. Handle Missing Columns (Model safety)
-        # We try to reindex to match the model's expected input feature vector
+        # 2. Fill the preallocated row in feature_order
         # If specific columns like 'peak_count' are missing from the simple loader, we fill 0
-        df = df.reindex(columns=self.feature_order, fill_value=0)
-        
-        # 4. Predict
-        if self.model:
-            pred = float(self.model.predict(df)[0])
-        else:
-            # Fallback Logic (if no model file exists)
-            # Degrade based on cycle and instability
-            cycle_penalty = dynamic_features.get('cycle', 0) * 0.05
-            instability_penalty = dynamic_features.get('rolling_voltage_std', 0) * 100
-            pred = 100.0 - cycle_penalty - instability_penalty
+        for j, name in enumerate(self.feature_order):
+            self._row[0, j] = combined_features.get(name, 0)
         
-        return float(np.clip(pred, 0, 100))
\ No newline at end of file
+        # 3. Predict
+        return float(self.predict_many(self._row)[0])
@@ -0,0 +1,351 @@
+"""
+Compiles a fitted tree ensemble (XGBoost, LightGBM or scikit-learn) into flat NumPy
+arrays and evaluates every tree for a whole batch with vectorized traversal.
+
+The flat artifact (.npz) needs only NumPy to load and score, so serving does not
+have to import (or unpickle into) the original library.
+
+Export: python -m inference.tree_compiler [models/elektra_soh_model.pkl] [models/elektra_soh_model.flat.npz]
+"""
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.paths import resolve_path
+
+# XGBoost objectives whose prediction is the raw margin (no link function)
+_IDENTITY_OBJECTIVES = {"reg:squarederror", "reg:squaredlogerror", "reg:pseudohubererror",
+                        "reg:absoluteerror", "reg:quantileerror"}
+
+
+class FlatForest:
+    """
+    Tree ensemble as flat arrays: every node of every tree lives in one table.
+
+    Nodes are numbered breadth-first per tree so both children of a split are adjacent:
+    next = left[node] + (not x < threshold[node]). Leaves point to themselves with a +inf
+    threshold, so each row walks exactly `depth` steps per tree with no branching.
+    Thresholds are float32 and the test is always `x < threshold` on float32 inputs,
+    which is exactly how the source libraries decide (``<=`` splits are converted).
+
+    prediction = base_score + scale * sum(leaf values)
+    With float32_sum the sum is accumulated in float32, base score first and then tree by
+    tree, which is XGBoost's own order - results then match it bit for bit.
+    """
+    ARRAYS = ("feature", "threshold", "left", "default_left", "value", "roots")
+
+    def __init__(self, feature, threshold, left, default_left, value, roots,
+                 base_score=0.0, scale=1.0, float32_sum=False, n_features=None, source_hash=""):
+        self.feature = np.asarray(feature, dtype=np.int32)
+        self.threshold = np.asarray(threshold, dtype=np.float32)
+        self.left = np.asarray(left, dtype=np.int32)
+        self.default_left = np.asarray(default_left, dtype=bool)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.base_score = float(base_score)
+        self.scale = float(scale)
+        self.float32_sum = bool(float32_sum)
+        self.n_features = int(n_features if n_features is not None else self.feature.max() + 1)
+        self.source_hash = source_hash
+        self.depth = self._max_depth()
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def is_leaf(self):
+        return self.left == np.arange(len(self.left))
+
+    def _max_depth(self):
+        depth = 0
+        node = self.roots[~self.is_leaf[self.roots]]
+        while len(node):
+            children = np.concatenate([self.left[node], self.left[node] + 1])
+            node = children[~self.is_leaf[children]]
+            depth += 1
+        return depth
+
+    def predict(self, X, chunk_elements=1 << 16):
+        """X: (n_rows, n_features). Rows are scored in chunks of ~chunk_elements (row, tree) pairs"""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] < self.n_features:
+            raise ValueError(f"expected (n_rows, {self.n_features}) features, got shape {X.shape}")
+
+        n_rows, n_cols = X.shape
+        out = np.empty(n_rows, dtype=np.float64)
+        step = max(1, chunk_elements // max(self.n_trees, 1))
+        has_missing = bool(np.isnan(X).any())
+
+        for start in range(0, n_rows, step):
+            Xc = X[start:start + step]
+            flat_x = Xc.ravel()
+            row_offset = (np.arange(len(Xc), dtype=np.int32) * n_cols)[:, None]
+            node = np.broadcast_to(self.roots, (len(Xc), self.n_trees))
+
+            for _ in range(self.depth):
+                x = flat_x.take(row_offset + self.feature.take(node))
+                go_left = x < self.threshold.take(node)
+                if has_missing:
+                    missing = np.isnan(x)
+                    go_left[missing] = self.default_left.take(node)[missing]
+                node = self.left.take(node) + ~go_left
+
+            if self.float32_sum:
+                # cumsum is strictly sequential (unlike sum's pairwise reduction)
+                acc = np.empty((len(Xc), self.n_trees + 1), dtype=np.float32)
+                acc[:, 0] = self.base_score
+                acc[:, 1:] = self.value.take(node)
+                out[start:start + step] = np.cumsum(acc, axis=1, dtype=np.float32)[:, -1]
+            else:
+                out[start:start + step] = self.base_score + self.scale * self.value.take(node).sum(axis=1)
+
+        return out
+
+    def save(self, path):
+        """Uncompressed .npz: loading is a straight read, no unpickling"""
+        np.savez(
+            path,
+            **{name: getattr(self, name) for name in self.ARRAYS},
+            meta=np.array(json.dumps({
+                "base_score": self.base_score, "scale": self.scale, "float32_sum": self.float32_sum,
+                "n_features": self.n_features, "source_hash": self.source_hash,
+            })),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in cls.ARRAYS}
+            meta = json.loads(str(data["meta"]))
+        return cls(**arrays, **meta)
+
+
+def _float32_lt_threshold(threshold, split_le):
+    """
+    float32 t such that (x < t) == (x OP threshold) for every float32 x,
+    where OP is <= when split_le (sklearn/LightGBM) and < otherwise (XGBoost, already float32).
+    """
+    threshold = np.asarray(threshold, dtype=np.float64)
+    if not split_le:
+        return threshold.astype(np.float32)
+    # Largest float32 <= threshold, then step up: x <= threshold  <=>  x < next float32
+    t32 = threshold.astype(np.float32)
+    t32 = np.where(t32.astype(np.float64) > threshold, np.nextafter(t32, np.float32(-np.inf)), t32)
+    return np.nextafter(t32, np.float32(np.inf))
+
+
+class _Builder:
+    """Accumulates trees into the flat node table (breadth-first renumbered)"""
+    def __init__(self, split_le):
+        self.split_le = split_le
+        self.feature, self.threshold, self.left = [], [], []
+        self.default_left, self.value, self.roots = [], [], []
+        self.n_nodes = 0
+
+    def add_tree(self, feature, threshold, left, right, default_left, value):
+        """Per-tree arrays with local child indices (-1 for leaves), root at 0"""
+        left = np.asarray(left, dtype=np.int64)
+        right = np.asarray(right, dtype=np.int64)
+        threshold = _float32_lt_threshold(threshold, self.split_le)
+
+        # Breadth-first order: children of every split get consecutive ids
+        order = [0]
+        new_left = {}
+        for node in order:
+            if left[node] >= 0:
+                new_left[node] = len(order)
+                order.append(int(left[node]))
+                order.append(int(right[node]))
+
+        order = np.array(order)
+        new_id = np.empty(len(left), dtype=np.int64)
+        new_id[order] = np.arange(len(order)) + self.n_nodes
+        is_leaf = left[order] < 0
+        child = np.array([new_left.get(int(n), 0) for n in order]) + self.n_nodes
+
+        self.roots.append(self.n_nodes)
+        self.feature.append(np.where(is_leaf, 0, np.asarray(feature)[order]))
+        self.threshold.append(np.where(is_leaf, np.float32(np.inf), threshold[order]))
+        self.left.append(np.where(is_leaf, new_id[order], child))
+        self.default_left.append(np.where(is_leaf, True, np.asarray(default_left, dtype=bool)[order]))
+        self.value.append(np.where(is_leaf, np.asarray(value, dtype=np.float64)[order], 0.0))
+        self.n_nodes += len(order)
+
+    def build(self, **kwargs):
+        return FlatForest(
+            np.concatenate(self.feature), np.concatenate(self.threshold).astype(np.float32),
+            np.concatenate(self.left), np.concatenate(self.default_left),
+            np.concatenate(self.value), np.array(self.roots), **kwargs,
+        )
+
+
+def _from_xgboost(booster):
+    model = json.loads(booster.save_raw("json"))["learner"]
+    objective = model["objective"]["name"]
+    if objective not in _IDENTITY_OBJECTIVES:
+        raise ValueError(f"unsupported XGBoost objective: {objective}")
+    gbm = model["gradient_booster"]
+    if gbm["name"] != "gbtree":
+        raise ValueError(f"unsupported XGBoost booster: {gbm['name']}")
+
+    builder = _Builder(split_le=False)
+    for tree in gbm["model"]["trees"]:
+        if any(tree["split_type"]):
+            raise ValueError("categorical splits are not supported")
+        builder.add_tree(
+            tree["split_indices"],
+            np.asarray(tree["split_conditions"], dtype=np.float32),
+            tree["left_children"], tree["right_children"],
+            tree["default_left"],
+            np.asarray(tree["split_conditions"], dtype=np.float32),   # leaf weight for leaves
+        )
+
+    params = model["learner_model_param"]
+    base_score = float(params["base_score"].strip("[]"))
+    return builder.build(base_score=base_score, float32_sum=True, n_features=int(params["num_feature"]))
+
+
+def _from_lightgbm(booster):
+    dump = booster.dump_model()
+    if not dump["objective"].startswith("regression"):
+        raise ValueError(f"unsupported LightGBM objective: {dump['objective']}")
+
+    builder = _Builder(split_le=True)
+    for info in dump["tree_info"]:
+        nodes = []
+
+        def visit(node):
+            idx = len(nodes)
+            nodes.append(None)
+            if "leaf_value" in node or "split_index" not in node:
+                nodes[idx] = (0, 0.0, -1, -1, False, node.get("leaf_value", 0.0))
+            else:
+                if node["decision_type"] != "<=":
+                    raise ValueError("categorical splits are not supported")
+                if node["missing_type"] == "Zero":
+                    raise ValueError("zero-as-missing splits are not supported")
+                # missing_type None: LightGBM scores NaN as 0.0
+                default_left = node["default_left"] if node["missing_type"] == "NaN" else 0.0 <= node["threshold"]
+                left = visit(node["left_child"])
+                right = visit(node["right_child"])
+                nodes[idx] = (node["split_feature"], node["threshold"], left, right, default_left, 0.0)
+            return idx
+
+        visit(info["tree_structure"])
+        builder.add_tree(*zip(*nodes))
+
+    return builder.build(n_features=dump["max_feature_idx"] + 1)
+
+
+def _add_sklearn_tree(builder, tree):
+    t = tree.tree_
+    missing_left = getattr(t, "missing_go_to_left", np.zeros(t.node_count, dtype=bool))
+    builder.add_tree(t.feature, t.threshold, t.children_left, t.children_right,
+                     missing_left, t.value[:, 0, 0])
+
+
+def _from_sklearn(model):
+    builder = _Builder(split_le=True)
+    n_features = model.n_features_in_
+
+    if hasattr(model, "tree_"):
+        _add_sklearn_tree(builder, model)
+        return builder.build(n_features=n_features)
+
+    estimators = np.asarray(model.estimators_, dtype=object).ravel()
+    for tree in estimators:
+        _add_sklearn_tree(builder, tree)
+
+    if hasattr(model, "learning_rate"):
+        # Gradient boosting: init prediction + learning_rate * sum(trees)
+        init = model.init_
+        if init == "zero":
+            base = 0.0
+        elif hasattr(init, "constant_"):
+            base = float(np.ravel(init.constant_)[0])
+        else:
+            raise ValueError("only constant (DummyRegressor) init estimators are supported")
+        return builder.build(base_score=base, scale=model.learning_rate, n_features=n_features)
+
+    # Bagging (random forest / extra trees): average of trees
+    return builder.build(scale=1.0 / len(estimators), n_features=n_features)
+
+
+def compile_model(model, source_hash=""):
+    """Converts a fitted XGBoost / LightGBM / scikit-learn tree ensemble into a FlatForest"""
+    if hasattr(model, "get_booster"):
+        forest = _from_xgboost(model.get_booster())
+    elif type(model).__name__ == "Booster" and hasattr(model, "save_raw"):
+        forest = _from_xgboost(model)
+    elif hasattr(model, "booster_") or hasattr(model, "dump_model"):
+        forest = _from_lightgbm(getattr(model, "booster_", model))
+    elif hasattr(model, "tree_") or hasattr(model, "estimators_"):
+        forest = _from_sklearn(model)
+    else:
+        raise TypeError(f"don't know how to compile {type(model).__name__}")
+    forest.source_hash = source_hash
+    return forest
+
+
+def file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+
+
+def load_flat_model(path, source_path=None):
+    """
+    Loads a FlatForest artifact. If source_path is given, returns None when the
+    artifact was exported from a different version of that file (stale export).
+    """
+    forest = FlatForest.load(path)
+    if source_path is not None and os.path.exists(source_path) and forest.source_hash != file_hash(source_path):
+        return None
+    return forest
+
+
+def export(model_path, out_path, n_check=1000, seed=0):
+    """Compiles the pickled model, checks it against the original on random rows and saves it"""
+    import joblib
+
+    model = joblib.load(model_path)
+    forest = compile_model(model, source_hash=file_hash(model_path))
+
+    # Verify on random rows spanning each feature's split thresholds
+    rng = np.random.default_rng(seed)
+    lo = np.full(forest.n_features, -1.0)
+    hi = np.full(forest.n_features, 1.0)
+    splits = ~forest.is_leaf
+    for f in range(forest.n_features):
+        thr = forest.threshold[splits & (forest.feature == f)]
+        if len(thr):
+            lo[f], hi[f] = thr.min() - 1.0, thr.max() + 1.0
+    X = rng.uniform(lo, hi, size=(n_check, forest.n_features)).astype(np.float32)
+
+    if hasattr(model, "get_booster"):
+        expected = model.get_booster().inplace_predict(X)
+    else:
+        expected = model.predict(X)
+    max_err = float(np.max(np.abs(forest.predict(X) - np.asarray(expected, dtype=np.float64))))
+
+    forest.save(out_path)
+    return forest, max_err
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    model_path = resolve_path(argv[0] if argv else "models/elektra_soh_model.pkl")
+    out_path = resolve_path(argv[1] if len(argv) > 1 else os.path.splitext(model_path)[0] + ".flat.npz")
+
+    forest, max_err = export(model_path, out_path)
+    print(f"✅ {forest.n_trees} trees, {len(forest.feature)} nodes, depth {forest.depth} -> {out_path}")
+    print(f"   max |flat - original| on random rows: {max_err:.3g}")
+
+
+if __name__ == "__main__":
+    main()
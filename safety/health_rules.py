@@ -1,15 +1,30 @@
 # safety/health_rules.py
-def check_safety(soc, soh, temp):
-    alerts = []
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from safety.rule_engine import DEFAULT_RULES
 
-    if soc < 15:
-        alerts.append("🔋 Low SOC – Recharge soon")
+# Rules the original three checks correspond to (same thresholds and messages)
+LEGACY_CODES = ("LOW_SOC", "LOW_SOH", "OVERHEAT")
 
-    if soh < 70:
-        alerts.append("❤️ Battery health degrading")
 
-    if temp > 50:
-        alerts.append("🔥 Battery overheating")
+def check_safety(soc, soh, temp):
+    """
+    Single-pack, stateless check kept for existing callers: the LOW_SOC / LOW_SOH /
+    OVERHEAT rows of the rule table, without hysteresis or debounce.
+    Streams and fleets should use safety.rule_engine.SafetyEngine.
+    """
+    values = {"soc": soc, "soh": soh, "temperature": temp}
+    alerts = []
+
+    for rule in DEFAULT_RULES:
+        if rule["code"] not in LEGACY_CODES:
+            continue
+        x = values[rule["signal"]]
+        if (x > rule["threshold"]) if rule["op"] == ">" else (x < rule["threshold"]):
+            alerts.append(rule["message"])
 
     if not alerts:
         alerts.append("✅ Battery operating normally")
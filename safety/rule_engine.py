@@ -0,0 +1,228 @@
+"""
+Declarative, vectorized safety rules for a whole fleet.
+
+Every rule is one row of a table (see DEFAULT_RULES):
+  code        structured alert code (also the rule's bit in the returned masks)
+  signal      input array the rule reads ("soc", "soh", "temperature", ...)
+  op          ">" / "<" on the value, or "rate>" / "rate<" on its change per second
+  threshold   level at which the alert is raised
+  clear       level at which it is cleared again (hysteresis; on the safe side of threshold)
+  debounce_s  the threshold must be exceeded continuously this long before raising
+  severity    SEVERITY_INFO / SEVERITY_WARNING / SEVERITY_CRITICAL
+  message     human-readable text for dashboards
+
+SafetyEngine.evaluate takes (steps, n_packs) blocks (or one (n_packs,) tick) and runs
+the whole block without a Python loop over samples: hysteresis and debounce are
+resolved with forward-filled event indices. Per-pack state (active alerts, when the
+current exceedance began, last sample for rate rules) carries over between calls.
+An alert is reported as "raised" only on the sample where it becomes active, so a
+pack hovering around a threshold does not re-alert every tick.
+"""
+import numpy as np
+
+SEVERITY_INFO, SEVERITY_WARNING, SEVERITY_CRITICAL = 0, 1, 2
+SEVERITY_NAMES = ("INFO", "WARNING", "CRITICAL")
+
+DEFAULT_RULES = [
+    {"code": "LOW_SOC", "signal": "soc", "op": "<", "threshold": 15.0, "clear": 17.0,
+     "debounce_s": 0.0, "severity": SEVERITY_WARNING, "message": "🔋 Low SOC – Recharge soon"},
+    {"code": "CRITICAL_SOC", "signal": "soc", "op": "<", "threshold": 5.0, "clear": 7.0,
+     "debounce_s": 0.0, "severity": SEVERITY_CRITICAL, "message": "🪫 Critically low SOC – Stop and recharge"},
+    {"code": "LOW_SOH", "signal": "soh", "op": "<", "threshold": 70.0, "clear": 71.0,
+     "debounce_s": 30.0, "severity": SEVERITY_WARNING, "message": "❤️ Battery health degrading"},
+    {"code": "OVERHEAT", "signal": "temperature", "op": ">", "threshold": 50.0, "clear": 48.0,
+     "debounce_s": 2.0, "severity": SEVERITY_CRITICAL, "message": "🔥 Battery overheating"},
+    {"code": "FAST_TEMP_RISE", "signal": "temperature", "op": "rate>", "threshold": 0.5, "clear": 0.1,
+     "debounce_s": 5.0, "severity": SEVERITY_WARNING, "message": "🌡️ Temperature rising fast"},
+]
+
+_OPS = {">": (1.0, False), "<": (-1.0, False), "rate>": (1.0, True), "rate<": (-1.0, True)}
+
+
+def _last_index(mask):
+    """For every sample, the step index of the most recent True at or before it (-1 if none)"""
+    steps = np.arange(1, mask.shape[0] + 1, dtype=np.int32).reshape((-1,) + (1,) * (mask.ndim - 1))
+    index = mask * steps
+    index -= 1
+    return np.maximum.accumulate(index, axis=0, out=index)
+
+
+class SafetyEngine:
+    """
+    Evaluates a rule table over arrays of pack signals.
+    Rule i is bit i of the returned masks (at most 32 rules).
+    """
+    def __init__(self, n_packs, rules=None, store=None):
+        self.rules = [dict(rule) for rule in (DEFAULT_RULES if rules is None else rules)]
+        if len(self.rules) > 32:
+            raise ValueError("at most 32 rules are supported")
+        for rule in self.rules:
+            if rule["op"] not in _OPS:
+                raise ValueError(f"unknown op {rule['op']!r} in rule {rule['code']}")
+            sign = _OPS[rule["op"]][0]
+            if sign * (rule["clear"] - rule["threshold"]) > 0:
+                raise ValueError(f"clear level of rule {rule['code']} is not on the safe side of its threshold")
+
+        self.codes = [rule["code"] for rule in self.rules]
+        self.severity = np.array([rule["severity"] for rule in self.rules], dtype=np.int8)
+        self.signals = sorted({rule["signal"] for rule in self.rules})
+        self.n_packs = int(n_packs)
+
+        # Per-pack state: own arrays, or fields of a FleetStateStore whose slots 0 .. n_packs-1
+        # are the packs (the state then survives a checkpoint / restore of the store)
+        self.store = store
+        if store is None:
+            self.reset()
+            return
+        if len(store) < self.n_packs:
+            raise ValueError(f"the store holds {len(store)} packs; add the {self.n_packs} packs first")
+        n_rules = len(self.rules)
+        store.add_field("safety.active", shape=(n_rules,), dtype=bool, default=False)
+        store.add_field("safety.since", shape=(n_rules,), default=np.nan)
+        store.add_field("safety.last_time", default=np.nan)
+        for name in self.signals:
+            store.add_field(f"safety.last.{name}", default=np.nan)
+        self._bind()
+
+    def _bind(self):
+        """State arrays as (rules, packs) views of the store's fields (the store may have reallocated)"""
+        n, store = self.n_packs, self.store
+        self.active = store["safety.active"][:n].T
+        self.since = store["safety.since"][:n].T
+        self.last_time = store["safety.last_time"][:n]
+        self.last_value = {name: store[f"safety.last.{name}"][:n] for name in self.signals}
+
+    def reset(self, packs=None):
+        """Clears the state of all packs (or an index / mask of packs)"""
+        if self.store is not None:
+            self._bind()
+            packs = slice(None) if packs is None else packs
+        elif packs is None:
+            n_rules = len(self.rules)
+            self.active = np.zeros((n_rules, self.n_packs), dtype=bool)
+            self.since = np.full((n_rules, self.n_packs), np.nan)  # start of the current exceedance
+            self.last_value = {name: np.full(self.n_packs, np.nan) for name in self.signals}
+            self.last_time = np.full(self.n_packs, np.nan)
+            return
+        self.active[:, packs] = False
+        self.since[:, packs] = np.nan
+        for values in self.last_value.values():
+            values[packs] = np.nan
+        self.last_time[packs] = np.nan
+
+    def _rates(self, x, t, last_x, last_t):
+        """d(signal)/dt per sample, using the previous call's last sample for the first row"""
+        prev_x = np.concatenate([last_x[None], x[:-1]])
+        prev_t = np.concatenate([last_t[None], t[:-1]])
+        dt = t - prev_t
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(dt > 0, (x - prev_x) / dt, np.nan)
+
+    def evaluate(self, time, packs=None, **signals):
+        """
+        time: scalar, (steps,) or (steps, n_packs) timestamps in seconds
+        signals: one array per signal name, (n_packs,) for a single tick or (steps, n_packs)
+                 (per-pack constants such as soh may be (n_packs,) alongside 2-D blocks)
+        packs: optional index array of the packs the columns belong to (no duplicates);
+               n_packs then reads len(packs) above and the other packs' state is untouched
+
+        Returns a dict of arrays shaped like the input block:
+          "active"   uint32 bitmask of rules active after each sample
+          "raised"   uint32 bitmask of rules that became active at that sample
+          "cleared"  uint32 bitmask of rules that cleared at that sample
+          "severity" int8 highest active severity, -1 if none
+        """
+        missing = [name for name in self.signals if name not in signals]
+        if missing:
+            raise ValueError(f"missing signals: {', '.join(missing)}")
+
+        # 1. Everything as (steps, n_packs) float arrays
+        single = all(np.ndim(signals[name]) <= 1 for name in self.signals)
+        steps = 1 if single else max(np.shape(signals[name])[0] for name in self.signals if np.ndim(signals[name]) == 2)
+        # State of the packs in this call (views of the full arrays when packs is None)
+        if self.store is not None:
+            self._bind()
+        cols = slice(None) if packs is None else np.asarray(packs, dtype=np.intp)
+        carried = self.active[:, cols]
+        since = self.since[:, cols]
+        last_time = self.last_time[cols]
+        shape = (steps, len(last_time))
+        values = {name: np.broadcast_to(np.asarray(signals[name], dtype=np.float64), shape) for name in self.signals}
+        t = np.asarray(time, dtype=np.float64)
+        # Timestamps shared by all packs (the usual case) are gathered from a 1-D array
+        shared_time = t.ndim == 0 or (t.ndim == 1 and not single)
+        t_steps = np.broadcast_to(t, (steps,)) if shared_time else None
+        t = np.broadcast_to(t[:, None] if t.ndim == 1 and not single else t, shape)
+
+        active_mask = np.zeros(shape, dtype=np.uint32)
+        raised_mask = np.zeros(shape, dtype=np.uint32)
+        cleared_mask = np.zeros(shape, dtype=np.uint32)
+        severity = np.full(shape, -1, dtype=np.int8)
+        rates = {}
+
+        for i, rule in enumerate(self.rules):
+            sign, is_rate = _OPS[rule["op"]]
+            x = values[rule["signal"]]
+            if is_rate:
+                if rule["signal"] not in rates:
+                    rates[rule["signal"]] = self._rates(x, t, self.last_value[rule["signal"]][cols], last_time)
+                x = rates[rule["signal"]]
+
+            # 2. Raw exceedance and its clear condition (NaN is neither: state holds)
+            if sign > 0:
+                beyond, back = x > rule["threshold"], x <= rule["clear"]
+            else:
+                beyond, back = x < rule["threshold"], x >= rule["clear"]
+
+            # 3. Debounce: how long the current run of exceedance has lasted
+            if rule["debounce_s"] > 0:
+                run_start = _last_index(~beyond) + 1                 # first index of the current run
+                if shared_time:
+                    start_time = t_steps[np.minimum(run_start, steps - 1)]
+                else:
+                    start_time = np.take_along_axis(t, np.minimum(run_start, steps - 1), axis=0)
+                # A run that began in an earlier call started at the carried time
+                carried_start = np.where(np.isnan(since[i]), t[0], since[i])
+                start_time = np.where(run_start == 0, carried_start, start_time)
+                raise_event = beyond & (t - start_time >= rule["debounce_s"])
+            else:
+                start_time = None
+                raise_event = beyond
+
+            # 4. Hysteresis: the state follows the latest raise/clear event (or the carried state)
+            last_raise = _last_index(raise_event)
+            last_back = _last_index(back)
+            state = np.where(np.maximum(last_raise, last_back) < 0, carried[i], last_raise > last_back)
+
+            previous = np.concatenate([carried[i][None], state[:-1]])
+            bit = np.uint32(1 << i)
+            active_mask |= state * bit
+            raised_mask |= (state & ~previous) * bit
+            cleared_mask |= (previous & ~state) * bit
+            severity[state & (severity < self.severity[i])] = self.severity[i]
+
+            # 5. Carry-over
+            carried[i] = state[-1]
+            if start_time is not None:
+                since[i] = np.where(beyond[-1], start_time[-1], np.nan)
+
+        self.active[:, cols] = carried
+        self.since[:, cols] = since
+        for name in self.signals:
+            self.last_value[name][cols] = values[name][-1]
+        self.last_time[cols] = t[-1]
+
+        result = {"active": active_mask, "raised": raised_mask, "cleared": cleared_mask, "severity": severity}
+        if single:
+            result = {key: value[0] for key, value in result.items()}
+        return result
+
+    def decode(self, mask):
+        """Rule codes set in one bitmask, most severe first"""
+        mask = int(mask)
+        hits = [i for i in range(len(self.rules)) if mask >> i & 1]
+        return [self.codes[i] for i in sorted(hits, key=lambda i: -self.severity[i])]
+
+    def messages(self, mask):
+        by_code = {rule["code"]: rule["message"] for rule in self.rules}
+        return [by_code[code] for code in self.decode(mask)]
@@ -0,0 +1,138 @@
+import numpy as np
+import os
+
+from simulation.ev_signal_generator import EVSignalGenerator
+from simulation.fleet_signal_generator import FleetSignalGenerator, MODES
+
+SIGNALS = ("voltage", "current", "temperature", "soc", "power")
+
+# A step_block() call costs about as much as ~2 fleet steps per pack: packs are run one
+# at a time in blocks unless segments are shorter than this many steps per pack
+BLOCK_STEPS_PER_PACK = 2
+
+
+def repeat_schedule(segments, duration_s):
+    """
+    Expands a repeating pattern into an absolute mode schedule.
+    segments: list of (segment_duration_s, mode), e.g. one day of driving/charging
+    Returns a list of (start_s, mode) covering duration_s.
+    """
+    period = sum(seg_duration for seg_duration, _ in segments)
+    if period <= 0:
+        raise ValueError("schedule segments must have a positive total duration")
+
+    schedule = []
+    t = 0.0
+    while t < duration_s:
+        for seg_duration, mode in segments:
+            if t >= duration_s:
+                break
+            schedule.append((t, mode))
+            t += seg_duration
+    return schedule
+
+
+def _schedule_steps(mode_schedule, dt, n_steps):
+    """Converts (start_s, mode) pairs into {step_index: mode} on the simulated clock"""
+    if isinstance(mode_schedule, str):
+        mode_schedule = [(0.0, mode_schedule)]
+
+    changes = {}
+    for start_s, mode in sorted(mode_schedule, key=lambda entry: entry[0]):
+        if mode not in MODES:
+            raise ValueError(f"unknown operation mode: {mode!r}")
+        step_idx = max(0, int(np.ceil(start_s / dt - 1e-9)))
+        if step_idx < n_steps:
+            changes[step_idx] = mode
+    return changes
+
+
+def simulate(duration_s, dt=1.0, mode_schedule="DISCHARGE", seed=None, n_packs=1,
+             speed_factor=1.0, start_time=0.0, dtype=np.float32, path=None):
+    """
+    Runs the fleet generator headless on a simulated clock (no wall clock, no sleeps).
+
+    duration_s: simulated seconds to generate
+    dt: simulated seconds per sample
+    mode_schedule: a mode name, or a list of (start_s, mode) pairs (see repeat_schedule)
+    speed_factor: passed to the physics; selects the same current/temperature response
+                  the dashboard would use at that speed
+    path: optionally write the result to .npz or .parquet
+
+    Returns columnar arrays: "time" (n_steps,), "mode" and every signal (n_steps, n_packs).
+
+    Each pack runs on its own EVSignalGenerator, one vectorized step_block() per
+    constant-mode segment of the schedule, written straight into the output columns.
+    Only wide fleets with short segments (fewer than BLOCK_STEPS_PER_PACK steps per pack
+    and segment) step every pack together with FleetSignalGenerator instead. A single
+    pack follows the same trajectory as FleetSignalGenerator(1, seed) either way; more
+    packs draw from one independent stream per pack (spawned from seed) in blocks.
+    """
+    n_steps = int(round(duration_s / dt))
+    changes = _schedule_steps(mode_schedule, dt, n_steps)
+
+    result = {"time": start_time + dt * np.arange(1, n_steps + 1, dtype=np.float64)}
+    result["mode"] = np.empty((n_steps, n_packs), dtype=np.int8)
+    for name in SIGNALS:
+        result[name] = np.empty((n_steps, n_packs), dtype=dtype)
+
+    # Constant-mode segments: (first step, end step, mode; None = the generator's initial mode)
+    bounds = sorted(changes)
+    segments = [(0, bounds[0] if bounds else n_steps, None)] if not bounds or bounds[0] > 0 else []
+    segments += [(lo, hi, changes[lo]) for lo, hi in zip(bounds, bounds[1:] + [n_steps])]
+
+    real_dt = dt / speed_factor
+    if n_steps >= BLOCK_STEPS_PER_PACK * n_packs * len(segments):
+        seeds = [seed] if n_packs == 1 else np.random.SeedSequence(seed).spawn(n_packs)
+        for p, pack_seed in enumerate(seeds):
+            car = EVSignalGenerator(start_time=start_time, seed=pack_seed)
+            for lo, hi, mode in segments:
+                if mode is not None:
+                    car.set_mode(mode)
+                data = car.step_block(hi - lo, real_dt, speed_factor)
+                result["mode"][lo:hi, p] = MODES.index(car.operation_mode)
+                for name in SIGNALS:
+                    result[name][lo:hi, p] = data[name]
+    else:
+        car = FleetSignalGenerator(n_packs, seed=seed, start_time=start_time)
+        for i in range(n_steps):
+            if i in changes:
+                car.set_mode(changes[i])
+
+            data = car.step(real_dt, speed_factor)
+
+            result["mode"][i] = car.operation_mode
+            for name in SIGNALS:
+                result[name][i] = data[name]
+
+    if path is not None:
+        save_simulation(result, path)
+    return result
+
+
+def save_simulation(result, path):
+    """Writes a simulate() result to compressed NPZ or (long-format) Parquet"""
+    ext = os.path.splitext(path)[1].lower()
+
+    if ext == ".npz":
+        np.savez_compressed(path, **result)
+    elif ext == ".parquet":
+        import pandas as pd
+
+        n_steps, n_packs = result["soc"].shape
+        columns = {
+            "time": np.repeat(result["time"], n_packs),
+            "pack": np.tile(np.arange(n_packs, dtype=np.int32), n_steps),
+        }
+        for name, values in result.items():
+            if name != "time":
+                columns[name] = values.reshape(-1)
+        pd.DataFrame(columns).to_parquet(path, index=False)
+    else:
+        raise ValueError(f"unsupported output format: {ext!r} (use .npz or .parquet)")
+
+
+def load_simulation(path):
+    """Reads back a .npz written by save_simulation"""
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
@@ -1,78 +1,278 @@
+"""
+Synthetic dV/dQ curves for the anode and cathode, fresh or aged.
+
+Every curve is a sum of Gaussian peaks (one per phase transition) plus sensor noise.
+Aging moves each peak by a fixed amount per aging step: the centre drifts by `drift`
+volts, the width grows by `broadening` (relative) and the amplitude loses `fade`
+(relative, compounded). `variation` adds cell-to-cell spread to all three.
+
+generate_curves() builds one batch with all peaks of all curves as one broadcast array
+operation; generate_dataset() splits a large sweep into fixed batches, fans them out
+over a process pool and writes one compressed .npz shard per batch (results do not
+depend on the number of workers).
+
+Run as a script it still writes the two reference curves (dv_dq_anode.csv,
+dv_dq_cathode.csv) and plots them; --curves N generates an aged dataset instead:
+    python -m simulation.dvdq_simulator --curves 1000000 --out data/dvdq_aged --workers 8
+"""
+import argparse
+import glob
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
+
+# (Amplitude, Voltage Location, Width) per peak
+# Anode dV/dQ usually has sharp peaks during phase transitions.
+# We simulate discharge (negative peaks) to match the previous real data.
+ANODE_PEAKS = [
+    (-30.0, 0.10, 0.02),  # Major Graphite Stage 1
+    (-15.0, 0.21, 0.04),  # Graphite Stage 2
+    (-8.0,  0.50, 0.15),  # Silicon tail / SEI interaction
+]
+# Cathode peaks are broader and at higher voltages (3.5V - 4.2V)
+CATHODE_PEAKS = [
+    (5.0,  3.6, 0.1),   # Transition 1
+    (12.0, 3.8, 0.08),  # Major Nickel Peak
+    (8.0,  4.1, 0.09),  # High voltage phase
+]
+
+# Per electrode: voltage axis, fresh peaks, whether the stored curve is |dV/dQ| (the
+# feature extraction expects positive peaks) and the default aging rates per step
+ELECTRODES = {
+    "anode": {"voltage_range": (0.0, 1.5), "peaks": ANODE_PEAKS, "absolute": True,
+              "aging": {"drift": 0.0005, "broadening": 0.01, "fade": 0.008}},
+    "cathode": {"voltage_range": (3.0, 4.3), "peaks": CATHODE_PEAKS, "absolute": False,
+                "aging": {"drift": 0.001, "broadening": 0.008, "fade": 0.01}},
+}
+
+N_POINTS = 1000
+DEFAULT_BATCH_SIZE = 4096
+
 
 def gaussian(x, amp, mu, sigma):
     """Creates a bell-curve peak (simulating a chemical reaction)."""
     return amp * np.exp(-((x - mu)**2) / (2 * sigma**2))
 
+
 def generate_synthetic_profile(voltage_range, peaks, noise_level=0.05):
     """
     Generates a synthetic dV/dQ curve by combining multiple peaks.
     voltage_range: (min_v, max_v)
     peaks: list of tuples (amplitude, center_voltage, width)
     """
-    voltage = np.linspace(voltage_range[0], voltage_range[1], 1000)
+    import pandas as pd
+
+    voltage = np.linspace(voltage_range[0], voltage_range[1], N_POINTS)
     dvdq = np.zeros_like(voltage)
-    
+
     # Add physics-based peaks
     for amp, mu, sigma in peaks:
         dvdq += gaussian(voltage, amp, mu, sigma)
-        
+
     # Add realistic sensor noise
     dvdq += np.random.normal(0, noise_level, size=len(voltage))
-    
+
     return pd.DataFrame({"voltage": voltage, "dvdq": dvdq})
 
-# ==========================================
-# 1. GENERATE SYNTHETIC ANODE (Graphite/Silicon)
-# ==========================================
-# Anode dV/dQ usually has sharp peaks during phase transitions.
-# We simulate discharge (negative peaks) to match your previous real data.
-anode_peaks = [
-    # (Amplitude, Voltage Location, Width)
-    (-30.0, 0.10, 0.02), # Major Graphite Stage 1
-    (-15.0, 0.21, 0.04), # Graphite Stage 2
-    (-8.0,  0.50, 0.15)  # Silicon tail / SEI interaction
-]
 
-df_anode = generate_synthetic_profile((0.0, 1.5), anode_peaks)
-# Sort by voltage for area calculation
-df_anode = df_anode.sort_values(by="voltage")
+def aged_peaks(peaks, steps, drift=0.0, broadening=0.0, fade=0.0, variation=0.0, rng=None):
+    """
+    Peak parameters after `steps` aging steps.
+    peaks: (n_peaks, 3) fresh (amplitude, centre, width)
+    steps: (n_curves,) aging step of every curve
+    variation: relative cell-to-cell spread (normal, 1 sigma) of every parameter's aging
+    Returns amplitude, centre, width as (n_curves, n_peaks) arrays.
+    """
+    peaks = np.asarray(peaks, dtype=np.float64)
+    steps = np.asarray(steps, dtype=np.float64)[:, None]
+    spread = np.ones((3,) + (len(steps), len(peaks)))
+    if variation:
+        rng = rng if rng is not None else np.random.default_rng()
+        spread += variation * rng.standard_normal(spread.shape)
+
+    amp = peaks[:, 0] * (1.0 - fade) ** (steps * spread[0])
+    mu = peaks[:, 1] + drift * steps * spread[1]
+    sigma = peaks[:, 2] * (1.0 + broadening * steps * spread[2])
+    return amp, mu, sigma
 
-# Invert signal for the AI (The app expects positive peaks for feature extraction)
-# We save the file with POSITIVE peaks so find_peaks() works easily.
-df_anode["dvdq"] = df_anode["dvdq"].abs()
 
-df_anode.to_csv("dv_dq_anode.csv", index=False)
-print("✅ Generated 'dv_dq_anode.csv' (Synthetic Graphite/Si Profile)")
+def generate_curves(electrode, steps, n_points=N_POINTS, noise_level=0.05, seed=None, dtype=np.float32,
+                    drift=None, broadening=None, fade=None, variation=0.0):
+    """
+    One batch of aged curves for "anode" or "cathode".
+    steps: (n_curves,) aging step per curve (0 = fresh); drift/broadening/fade default
+           to the electrode's rates in ELECTRODES
+    Returns {"voltage" (n_points,), "dvdq" (n_curves, n_points), "amp"/"mu"/"sigma" (n_curves, n_peaks)}.
+    """
+    spec = ELECTRODES[electrode]
+    aging = dict(spec["aging"])
+    for name, value in (("drift", drift), ("broadening", broadening), ("fade", fade)):
+        if value is not None:
+            aging[name] = value
+
+    rng = np.random.default_rng(seed)
+    amp, mu, sigma = aged_peaks(spec["peaks"], steps, variation=variation, rng=rng, **aging)
+    voltage = np.linspace(*spec["voltage_range"], n_points)
+
+    # 1. All peaks of all curves at once: (n_curves, n_peaks, n_points), summed over peaks
+    v = voltage.astype(np.float32)
+    z = (v - mu[:, :, None].astype(np.float32)) * (1.0 / sigma[:, :, None]).astype(np.float32)
+    z *= z
+    z *= -0.5
+    np.exp(z, out=z)
+    z *= amp[:, :, None].astype(np.float32)
+    dvdq = z.sum(axis=1)
+
+    # 2. Sensor noise
+    dvdq += noise_level * rng.standard_normal(dvdq.shape, dtype=np.float32)
+    if spec["absolute"]:
+        np.abs(dvdq, out=dvdq)
+
+    return {"voltage": voltage, "dvdq": dvdq.astype(dtype, copy=False),
+            "amp": amp.astype(np.float32), "mu": mu.astype(np.float32), "sigma": sigma.astype(np.float32)}
+
+
+def _generate_batch(steps, seed_seq, electrodes, path, params):
+    """One dataset batch for every electrode; written to `path` if given, else returned"""
+    seeds = seed_seq.spawn(len(electrodes))
+    batch = {"step": steps.astype(np.int32)}
+    for electrode, seed in zip(electrodes, seeds):
+        curves = generate_curves(electrode, steps, seed=seed, **params)
+        for name, values in curves.items():
+            batch[f"{electrode}_{name}"] = values
+    if path is None:
+        return batch
+    np.savez_compressed(path, **batch)
+    return len(steps)
+
+
+def generate_dataset(n_curves, max_step=100, path=None, electrodes=("anode", "cathode"), n_workers=None,
+                     batch_size=DEFAULT_BATCH_SIZE, seed=0, steps=None, overwrite=False, **params):
+    """
+    n_curves aged curves per electrode, aging steps drawn uniformly from [0, max_step]
+    (or given explicitly as `steps`). Extra keyword arguments go to generate_curves.
+
+    path=None: returns the whole dataset as arrays ("step", "<electrode>_dvdq", ...).
+    path=dir:  writes part-XXXXX.npz shards (plus meta.json) and returns the directory;
+               read them back with load_dataset / iter_dataset. A directory that already
+               holds a dataset is refused (FileExistsError) unless overwrite=True, which
+               deletes its shards first.
+    n_workers: process count (None = all cores, 1 = in this process).
+    """
+    rng = np.random.default_rng(np.random.SeedSequence(seed).spawn(1)[0])
+    steps = rng.integers(0, max_step + 1, n_curves) if steps is None else np.asarray(steps)
+    n_curves = len(steps)
+    bounds = list(range(0, n_curves, batch_size)) + [n_curves]
+    # Batch seeds depend only on (seed, batch index): the same data for any worker count
+    seeds = np.random.SeedSequence(seed).spawn(len(bounds))[1:]
+
+    if path is not None:
+        os.makedirs(path, exist_ok=True)
+        existing = glob.glob(os.path.join(path, "part-*.npz"))
+        if (existing or os.path.exists(os.path.join(path, "meta.json"))) and not overwrite:
+            raise FileExistsError(f"{path} already holds a dataset; pass overwrite=True to replace it")
+        for stale in existing:
+            os.remove(stale)
+    jobs = [
+        (steps[lo:hi], seeds[i], tuple(electrodes),
+         None if path is None else os.path.join(path, f"part-{i:05d}.npz"), params)
+        for i, (lo, hi) in enumerate(zip(bounds[:-1], bounds[1:]))
+    ]
+
+    if n_workers == 1 or len(jobs) == 1:
+        results = [_generate_batch(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            results = list(pool.map(_generate_batch, *zip(*jobs)))
+
+    if path is None:
+        return {name: (results[0][name] if name.endswith("_voltage") else
+                       np.concatenate([batch[name] for batch in results]))
+                for name in results[0]}
+
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump({"n_curves": int(n_curves), "max_step": int(max_step), "seed": seed,
+                   "electrodes": list(electrodes), "batch_size": batch_size,
+                   "params": {k: (v.__name__ if isinstance(v, type) else v) for k, v in params.items()}}, f, indent=2)
+    return path
+
+
+def iter_dataset(path):
+    """Yields the shards of a generate_dataset directory in order, one dict of arrays each"""
+    for part in sorted(glob.glob(os.path.join(path, "part-*.npz"))):
+        with np.load(part) as data:
+            yield {name: data[name] for name in data.files}
+
+
+def load_dataset(path):
+    """Whole generate_dataset directory as one dict of arrays"""
+    parts = list(iter_dataset(path))
+    if not parts:
+        raise FileNotFoundError(f"no dataset shards in {path}")
+    return {name: (parts[0][name] if name.endswith("_voltage") else np.concatenate([p[name] for p in parts]))
+            for name in parts[0]}
+
+
+def write_reference_curves(out_dir=".", plot=True):
+    """The two fresh reference curves the dashboard's chemistry features are read from"""
+    # 1. Anode (Graphite/Silicon); saved with POSITIVE peaks so find_peaks() works easily
+    df_anode = generate_synthetic_profile(ELECTRODES["anode"]["voltage_range"], ANODE_PEAKS)
+    df_anode = df_anode.sort_values(by="voltage")
+    df_anode["dvdq"] = df_anode["dvdq"].abs()
+    df_anode.to_csv(os.path.join(out_dir, "dv_dq_anode.csv"), index=False)
+    print("✅ Generated 'dv_dq_anode.csv' (Synthetic Graphite/Si Profile)")
+
+    # 2. Cathode (NCA/NMC)
+    df_cathode = generate_synthetic_profile(ELECTRODES["cathode"]["voltage_range"], CATHODE_PEAKS)
+    df_cathode = df_cathode.sort_values(by="voltage")
+    df_cathode.to_csv(os.path.join(out_dir, "dv_dq_cathode.csv"), index=False)
+    print("✅ Generated 'dv_dq_cathode.csv' (Synthetic NCA Profile)")
+
+    # Optional: Plot to verify
+    if not plot:
+        return
+    try:
+        import matplotlib.pyplot as plt
+
+        plt.figure(figsize=(10, 4))
+        plt.subplot(1, 2, 1)
+        plt.plot(df_anode["voltage"], df_anode["dvdq"], color="red")
+        plt.title("Synthetic Anode (Inverted for AI)")
+
+        plt.subplot(1, 2, 2)
+        plt.plot(df_cathode["voltage"], df_cathode["dvdq"], color="blue")
+        plt.title("Synthetic Cathode")
+        plt.tight_layout()
+        plt.show()
+    except Exception:
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Synthetic dV/dQ curves: the reference pair or an aged dataset")
+    parser.add_argument("--curves", type=int, default=0, help="generate this many aged curves per electrode")
+    parser.add_argument("--out", default="dvdq_dataset", help="dataset directory (with --curves)")
+    parser.add_argument("--max-step", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--dtype", choices=("float32", "float16"), default="float32")
+    parser.add_argument("--variation", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--overwrite", action="store_true", help="replace a dataset already in --out")
+    parser.add_argument("--no-plot", action="store_true")
+    args = parser.parse_args(argv)
+
+    if not args.curves:
+        write_reference_curves(plot=not args.no_plot)
+        return
+
+    generate_dataset(args.curves, max_step=args.max_step, path=args.out, n_workers=args.workers,
+                     batch_size=args.batch_size, seed=args.seed, dtype=np.dtype(args.dtype).type,
+                     variation=args.variation, overwrite=args.overwrite)
+    print(f"✅ Wrote {args.curves:,} aged curves per electrode to {args.out}")
 
-# ==========================================
-# 2. GENERATE SYNTHETIC CATHODE (NCA/NMC)
-# ==========================================
-# Cathode peaks are broader and at higher voltages (3.5V - 4.2V)
-cathode_peaks = [
-    (5.0,  3.6, 0.1),  # Transition 1
-    (12.0, 3.8, 0.08), # Major Nickel Peak
-    (8.0,  4.1, 0.09)  # High voltage phase
-]
 
-df_cathode = generate_synthetic_profile((3.0, 4.3), cathode_peaks)
-df_cathode = df_cathode.sort_values(by="voltage")
-df_cathode.to_csv("dv_dq_cathode.csv", index=False)
-print("✅ Generated 'dv_dq_cathode.csv' (Synthetic NCA Profile)")
-
-# Optional: Plot to verify
-try:
-    plt.figure(figsize=(10, 4))
-    plt.subplot(1, 2, 1)
-    plt.plot(df_anode["voltage"], df_anode["dvdq"], color="red")
-    plt.title("Synthetic Anode (Inverted for AI)")
-    
-    plt.subplot(1, 2, 2)
-    plt.plot(df_cathode["voltage"], df_cathode["dvdq"], color="blue")
-    plt.title("Synthetic Cathode")
-    plt.tight_layout()
-    plt.show()
-except:
-    pass
\ No newline at end of file
+if __name__ == "__main__":
+    main()
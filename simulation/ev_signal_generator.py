@@ -1,21 +1,101 @@
-import numpy as np
+import functools
+import os
+import sys
 import time
 
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.ocv_tables import get_ocv_table
+from utils.scan import clipped_cumsum, linear_recurrence
+
+# Drive cycle: IDLE -> ACCEL -> CRUISE -> REGEN -> repeat
+# phase -> (target current mean, std, duration s, next phase)
+DRIVE_CYCLE = {
+    "IDLE": (-2.0, 0.0, 30.0, "ACCEL"),
+    "ACCEL": (-180.0, 10.0, 15.0, "CRUISE"),  # Heavy discharge
+    "CRUISE": (-60.0, 5.0, 60.0, "REGEN"),    # Highway cruise
+    "REGEN": (80.0, 8.0, 10.0, "IDLE"),       # Regenerative braking
+}
+DRIVE_MEAN = np.array([mean for mean, _, _, _ in DRIVE_CYCLE.values()])
+DRIVE_STD = np.array([std for _, std, _, _ in DRIVE_CYCLE.values()])
+DRIVE_TIMING = {phase: (duration, following) for phase, (_, _, duration, following) in DRIVE_CYCLE.items()}
+
+# Charging: CC below 80% SoC (labelled CV after 2 min), CV taper, off from 98%
+CC_DURATION = 120.0
+CHARGE_TARGET = ((80.0, 5.0), (20.0, 2.0), (0.0, 0.0))  # (mean, std) per regime
+
+# step_block(): CHARGE steps per vectorized segment, and how many run one at a time
+# when the charge regime flips sooner than that (SoC hovering around a threshold)
+CHARGE_WINDOW = 512
+CHARGE_MIN_SEGMENT = 32
+
+
+def pack_ocv(soc_pct):
+    """Standard Li-Ion OCV Curve (works on scalars and arrays)"""
+    s = soc_pct / 100.0
+    # 3.0V empty -> 4.2V full per cell (96s pack = 288V -> 403V)
+    return 288 + (70 * s) + (45 * s**3)
+
+
+def degraded_capacity(nominal_ah, cycle, temperature, current):
+    """
+    Usable capacity under the dashboard's aging model: 0.015% per cycle plus temperature
+    stress above 25 °C and current stress, never below half the nominal capacity.
+    """
+    temp_stress = np.maximum(0.0, (temperature - 25) * 0.0001)
+    current_stress = np.abs(current) * 0.00000005
+    capacity = nominal_ah * (1.0 - (cycle * 0.00015 + temp_stress + current_stress))
+    return np.clip(capacity, nominal_ah * 0.5, nominal_ah)
+
+
+def _running_sum(x0, dt, n):
+    """x0 + dt, x0 + dt + dt, ... summed one step at a time (bit-equal to `x += dt` in a loop)"""
+    return np.cumsum(np.concatenate([[x0], np.full(n, dt)]))[1:]
+
+
+@functools.lru_cache(maxsize=64)
+def _fresh_timer(sim_dt, duration):
+    """Phase timer after each step of a phase started from zero, up to the step that ends it"""
+    n = int(duration / sim_dt) + 3
+    timers = _running_sum(0.0, sim_dt, n)
+    while timers[-1] <= duration:
+        n *= 2
+        timers = _running_sum(0.0, sim_dt, n)
+    timers = timers[:int(np.argmax(timers > duration)) + 1]
+    timers.flags.writeable = False
+    return timers
+
+
+def _charge_regime(soc):
+    """0: constant current, 1: constant voltage taper, 2: full"""
+    return np.where(soc < 80.0, 0, np.where(soc >= 98.0, 2, 1))
+
+
 class EVSignalGenerator:
-    def __init__(self):
+    def __init__(self, start_time=None, seed=None, chemistry=None):
+        # Clock: wall clock by default, simulated seconds if start_time is given
+        self.sim_time = start_time
+        # Noise: seed (or numpy Generator) makes a run reproducible
+        self.rng = np.random.default_rng(seed)
+        # OCV: pack_ocv by default, or the temperature-dependent table of a chemistry
+        # (utils.ocv_tables, the same tables the SoC estimators invert)
+        self.ocv_table = None if chemistry is None else get_ocv_table(chemistry)
+
         # State
         self.soc = 50.0        # %
         self.temp = 25.0       # °C
         self.current = 0.0     # Amps
         self.voltage = 350.0   # Volts
         self.odometer = 0.0    # km
-        
+
         # Physics Constants
         self.capacity_ah = 100.0 # 100 Ah Battery
         self.resistance = 0.05   # 50mOhm Internal Resistance
-        
+
         # Drive Cycle State Machine
-        self.phase_timer = 0
+        self.phase_timer = 0.0
         self.phase = "IDLE"
         self.operation_mode = "STANDBY"  # STANDBY, DISCHARGE, CHARGE
 
@@ -23,14 +103,14 @@ class EVSignalGenerator:
         """Set operation mode: STANDBY, DISCHARGE, CHARGE"""
         if mode in ["STANDBY", "DISCHARGE", "CHARGE"]:
             self.operation_mode = mode
-            self.phase_timer = 0
+            self.phase_timer = 0.0
             self.phase = "IDLE"
 
-    def _get_ocv(self, soc_pct):
-        """Standard Li-Ion OCV Curve"""
-        s = soc_pct / 100.0
-        # 3.0V empty -> 4.2V full per cell (96s pack = 288V -> 403V)
-        return 288 + (70 * s) + (45 * s**3)
+    def _get_ocv(self, soc_pct, temperature=25.0):
+        """Standard Li-Ion OCV Curve, or the chemistry's OCV table"""
+        if self.ocv_table is None:
+            return pack_ocv(soc_pct)
+        return self.ocv_table.ocv(soc_pct, temperature)
 
     def step(self, real_dt, speed_factor):
         """
@@ -39,108 +119,236 @@ class EVSignalGenerator:
         """
         # 1. CALCULATE SIMULATED TIME
         sim_dt = real_dt * speed_factor
-        
+        if self.sim_time is not None:
+            self.sim_time += sim_dt
+
+        # One draw for every noise source: target, current, temperature, voltage
+        z_target, z_current, z_temp, z_voltage = self.rng.standard_normal(4).tolist()
+
         # 2. UPDATE DRIVE CYCLE based on operation mode
-        self.phase_timer += sim_dt
-        
-        # --- OPERATION MODE LOGIC ---
-        if self.operation_mode == "STANDBY":
-            # Minimal current, natural decay
-            target_i = np.random.normal(-0.5, 0.2)
-            
-        elif self.operation_mode == "DISCHARGE":
-            # Driving cycle: IDLE -> ACCEL -> CRUISE -> REGEN -> repeat
-            if self.phase == "IDLE":
-                target_i = -2.0
-                if self.phase_timer > 30:
-                    self.phase = "ACCEL"
-                    self.phase_timer = 0
-            
-            elif self.phase == "ACCEL":
-                target_i = -180.0 + np.random.normal(0, 10)  # Heavy discharge
-                if self.phase_timer > 15:
-                    self.phase = "CRUISE"
-                    self.phase_timer = 0
-                    
-            elif self.phase == "CRUISE":
-                target_i = -60.0 + np.random.normal(0, 5)  # Highway cruise
-                if self.phase_timer > 60:
-                    self.phase = "REGEN"
-                    self.phase_timer = 0
-                    
-            elif self.phase == "REGEN":
-                target_i = 80.0 + np.random.normal(0, 8)  # Regenerative braking
-                if self.phase_timer > 10:
-                    self.phase = "IDLE"
-                    self.phase_timer = 0
-        
-        elif self.operation_mode == "CHARGE":
-            # Charging profiles: CC (constant current) -> CV (constant voltage)
-            if self.soc < 80.0:
-                # Constant current phase - fast charging
-                target_i = 80.0 + np.random.normal(0, 5)  # Charge current
-                if self.phase_timer > 120:  # Charge for 2 min simulated
-                    self.phase = "CV"
-                    self.phase_timer = 0
-            else:
-                # Constant voltage phase - taper charging
-                target_i = 20.0 + np.random.normal(0, 2)  # Lower current
-                if self.soc >= 98.0:
-                    target_i = 0.0
-        
-        # 3. PHYSICS UPDATE
-        
-        # Smooth current response
-        if speed_factor > 10:
-            self.current = target_i + np.random.normal(0, 5.0)
-        else:
-            self.current = (0.9 * self.current) + (0.1 * target_i) + np.random.normal(0, 2.0)
+        target_i = self._target_current(z_target, sim_dt)
 
-        # Coulomb Counting (The Drain/Charge)
-        ah_used = self.current * (sim_dt / 3600.0)
-        self.soc += (ah_used / self.capacity_ah) * 100.0
-        self.soc = np.clip(self.soc, 0.0, 100.0)
+        # 3. PHYSICS UPDATE
+        self._integrate(target_i, z_current, sim_dt, speed_factor)
 
         # Temperature model
         load_ratio = abs(self.current) / 200.0
-        
-        if self.operation_mode == "CHARGE":
-            target_temp = 25.0 + (load_ratio * 35.0)  # Charging heats less than discharging
-        else:
-            target_temp = 25.0 + (load_ratio * 40.0)
-        
+        heat_gain = 35.0 if self.operation_mode == "CHARGE" else 40.0  # Charging heats less than discharging
+        target_temp = 25.0 + (load_ratio * heat_gain)
+
         if speed_factor > 50:
             self.temp = target_temp
         else:
             self.temp = (0.99 * self.temp) + (0.01 * target_temp)
-        
-        self.temp += np.random.normal(0, 0.1)
-        self.temp = np.clip(self.temp, -10, 70)
+
+        self.temp += 0.1 * z_temp
+        self.temp = min(max(self.temp, -10.0), 70.0)
 
         # Voltage Sag (V = OCV - IR)
-        ocv = self._get_ocv(self.soc)
+        ocv = self._get_ocv(self.soc, self.temp)
         sag = self.current * self.resistance
         self.voltage = ocv + sag
-        self.voltage += np.random.normal(0, 0.2)
-        self.voltage = np.clip(self.voltage, 280, 410)
+        self.voltage += 0.2 * z_voltage
+        self.voltage = min(max(self.voltage, 280.0), 410.0)
 
         return {
-            "time": time.time(),
+            "time": time.time() if self.sim_time is None else self.sim_time,
             "voltage": self.voltage,
             "current": self.current,
             "temperature": self.temp,
             "soc": self.soc,
             "power": self.voltage * self.current / 1000.0  # kW
         }
-        ocv = self._get_ocv(self.soc)
-        sag = self.current * self.resistance
-        self.voltage = ocv + sag # Current is negative, so V drops
-        self.voltage += np.random.normal(0, 0.2)
+
+    def _target_current(self, z, sim_dt):
+        """Advances the operation-mode state machine by one step; returns the target current"""
+        self.phase_timer += sim_dt
+
+        if self.operation_mode == "STANDBY":
+            # Minimal current, natural decay
+            return -0.5 + 0.2 * z
+
+        if self.operation_mode == "DISCHARGE":
+            mean, std, duration, following = DRIVE_CYCLE[self.phase]
+            if self.phase_timer > duration:
+                self.phase = following
+                self.phase_timer = 0.0
+            return mean + std * z
+
+        # CHARGE: constant current (fast charging) -> constant voltage (taper)
+        regime = 0 if self.soc < 80.0 else (2 if self.soc >= 98.0 else 1)
+        if regime == 0 and self.phase_timer > CC_DURATION:
+            self.phase = "CV"
+            self.phase_timer = 0.0
+        mean, std = CHARGE_TARGET[regime]
+        return mean + std * z
+
+    def _integrate(self, target_i, z, sim_dt, speed_factor):
+        """Current response and Coulomb counting for one step"""
+        # Smooth current response
+        if speed_factor > 10:
+            self.current = target_i + 5.0 * z
+        else:
+            self.current = (0.9 * self.current) + (0.1 * target_i) + 2.0 * z
+
+        # Coulomb Counting (The Drain/Charge)
+        ah_used = self.current * (sim_dt / 3600.0)
+        self.soc += (ah_used / self.capacity_ah) * 100.0
+        self.soc = min(max(self.soc, 0.0), 100.0)
+
+    def step_block(self, n, real_dt, speed_factor):
+        """
+        n consecutive step(real_dt, speed_factor) calls in one pass, for long offline runs.
+        Returns a dict of arrays (same keys as step()). The noise for the whole block is one
+        draw laid out exactly as n step() calls draw it, so blocks and single steps can be
+        mixed and a seeded run follows the same trajectory either way (up to rounding in
+        the vectorized recurrences). The drive cycle, current lag, Coulomb counting and
+        temperature lag are solved as prefix scans; only CHARGE steps next to the 80% / 98%
+        thresholds run one at a time.
+        """
+        n = int(n)
+        sim_dt = real_dt * speed_factor
+        z = self.rng.standard_normal((n, 4))
+        if n == 0:
+            return {key: np.empty(0) for key in ("time", "voltage", "current", "temperature", "soc", "power")}
+
+        # 1. Simulated time
+        if self.sim_time is None:
+            t = np.full(n, time.time())
+        else:
+            t = _running_sum(self.sim_time, sim_dt, n)
+            self.sim_time = float(t[-1])
+
+        # 2. Drive cycle, current and SoC
+        if self.operation_mode == "CHARGE":
+            current, soc = self._charge_block(z, sim_dt, speed_factor)
+        else:
+            if self.operation_mode == "STANDBY":
+                self.phase_timer = float(_running_sum(self.phase_timer, sim_dt, n)[-1])
+                target_i = -0.5 + 0.2 * z[:, 0]
+            else:
+                phases = self._advance_phases(n, sim_dt, DRIVE_TIMING)
+                target_i = DRIVE_MEAN[phases] + DRIVE_STD[phases] * z[:, 0]
+            current, soc = self._integrate_block(target_i, z[:, 1], sim_dt, speed_factor)
+            self.current, self.soc = float(current[-1]), float(soc[-1])
+
+        # 3. Temperature
+        heat_gain = 35.0 if self.operation_mode == "CHARGE" else 40.0
+        target_temp = 25.0 + (np.abs(current) / 200.0) * heat_gain
+        if speed_factor > 50:
+            temp = np.clip(target_temp + 0.1 * z[:, 2], -10, 70)
+        else:
+            temp = linear_recurrence(0.99, (0.01 * target_temp) + 0.1 * z[:, 2], self.temp)
+            if temp.min() < -10 or temp.max() > 70:
+                temp = self._temperature_loop(target_temp, z[:, 2])
+        self.temp = float(temp[-1])
+
+        # 4. Voltage
+        voltage = np.clip(self._get_ocv(soc, temp) + current * self.resistance + 0.2 * z[:, 3], 280, 410)
+        self.voltage = float(voltage[-1])
 
         return {
-            "time": time.time(),
-            "voltage": self.voltage,
-            "current": self.current,
-            "temperature": self.temp,
-            "soc": self.soc
-        }
\ No newline at end of file
+            "time": t,
+            "voltage": voltage,
+            "current": current,
+            "temperature": temp,
+            "soc": soc,
+            "power": voltage * current / 1000.0  # kW
+        }
+
+    def _advance_phases(self, n, sim_dt, cycle):
+        """
+        Phase of each of n steps under `cycle` ({phase: (duration s, next phase)}) as an
+        index into list(cycle); leaves phase and timer where n step()s would. Timers are
+        summed in step()'s order, so every switch lands on the same step, and after the
+        first switch each phase starts from a zero timer, so the pattern just repeats.
+        """
+        names = list(cycle)
+        p = names.index(self.phase)
+        timers = _running_sum(self.phase_timer, sim_dt, n)
+        over = np.flatnonzero(timers > cycle[self.phase][0])
+        if not len(over):
+            self.phase_timer = float(timers[-1])
+            return np.full(n, p)
+        first = int(over[0]) + 1
+        rest = n - first
+
+        if not sim_dt > 0:
+            # Time stands still: the next phase never ends
+            self.phase = cycle[self.phase][1]
+            self.phase_timer = float(_running_sum(0.0, sim_dt, rest)[-1]) if rest else 0.0
+            return np.concatenate([np.full(first, p), np.full(rest, names.index(self.phase))])
+
+        # One lap of the cycle from the next phase, each phase from a zero timer
+        lap = []
+        phase = cycle[self.phase][1]
+        while phase not in lap:
+            lap.append(phase)
+            phase = cycle[phase][1]
+        lengths = np.array([len(_fresh_timer(sim_dt, cycle[phase][0])) for phase in lap])
+        pattern = np.repeat([names.index(phase) for phase in lap], lengths)
+
+        # Where the block ends inside the lap
+        starts = np.cumsum(lengths) - lengths
+        pos = rest % len(pattern)
+        s = int(np.searchsorted(starts, pos, side="right")) - 1
+        steps_in = int(pos - starts[s])
+        self.phase = lap[s]
+        self.phase_timer = float(_fresh_timer(sim_dt, cycle[lap[s]][0])[steps_in - 1]) if steps_in else 0.0
+        return np.concatenate([np.full(first, p), np.resize(pattern, rest)])
+
+    def _integrate_block(self, target_i, z, sim_dt, speed_factor):
+        """_integrate() over a block from the current state (which is left unchanged)"""
+        if speed_factor > 10:
+            current = target_i + 5.0 * z
+        else:
+            current = linear_recurrence(0.9, (0.1 * target_i) + 2.0 * z, self.current)
+        soc = clipped_cumsum(self.soc, ((current * (sim_dt / 3600.0)) / self.capacity_ah) * 100.0, 0.0, 100.0)
+        return current, soc
+
+    def _charge_block(self, z, sim_dt, speed_factor):
+        """
+        CHARGE steps. The target current depends on the SoC, so the block is solved in
+        segments that stay in one charge regime: integrate a window assuming the regime
+        holds, keep the steps up to the first that starts in another one, repeat.
+        """
+        n = len(z)
+        current = np.empty(n)
+        soc = np.empty(n)
+        cc_cycle = {self.phase: (CC_DURATION, "CV"), "CV": (CC_DURATION, "CV")}
+        i = 0
+        while i < n:
+            regime = int(_charge_regime(self.soc))
+            m = min(n - i, CHARGE_WINDOW)
+            mean, std = CHARGE_TARGET[regime]
+            seg_current, seg_soc = self._integrate_block(mean + std * z[i:i + m, 0], z[i:i + m, 1], sim_dt, speed_factor)
+            flips = np.flatnonzero(_charge_regime(np.concatenate([[self.soc], seg_soc[:-1]])) != regime)
+            k = int(flips[0]) if len(flips) else m
+
+            if k < CHARGE_MIN_SEGMENT and len(flips):
+                # SoC hovering around a threshold: a few steps one at a time
+                end = min(i + CHARGE_MIN_SEGMENT, n)
+                for j, (z_target, z_current) in enumerate(z[i:end, :2].tolist(), start=i):
+                    self._integrate(self._target_current(z_target, sim_dt), z_current, sim_dt, speed_factor)
+                    current[j], soc[j] = self.current, self.soc
+                i = end
+                continue
+
+            if regime == 0:
+                self._advance_phases(k, sim_dt, cc_cycle)
+            else:
+                self.phase_timer = float(_running_sum(self.phase_timer, sim_dt, k)[-1])
+            current[i:i + k] = seg_current[:k]
+            soc[i:i + k] = seg_soc[:k]
+            self.current, self.soc = float(seg_current[k - 1]), float(seg_soc[k - 1])
+            i += k
+        return current, soc
+
+    def _temperature_loop(self, target_temp, z):
+        """Temperature lag one step at a time (when the -10..70 °C clip binds)"""
+        temp = np.empty(len(target_temp))
+        x = self.temp
+        for k, (target, noise) in enumerate(zip(target_temp.tolist(), z.tolist())):
+            x = min(max((0.99 * x) + (0.01 * target) + 0.1 * noise, -10.0), 70.0)
+            temp[k] = x
+        return temp
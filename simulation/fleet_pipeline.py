@@ -0,0 +1,296 @@
+"""
+Multi-process fleet simulation + scoring pipeline.
+
+Packs are split into contiguous shards. Every shard runs two processes:
+  simulate  FleetSignalGenerator -> telemetry blocks
+  score     BatchSOCPredictor (per step) -> fleet features -> SOHEvaluator (per block)
+            -> SafetyEngine rules (per step)
+Telemetry moves from one to the other through a shared-memory ring (utils.shared_ring)
+and scores are written straight into shared result arrays, so no telemetry is pickled.
+
+Results are one snapshot per block (the last step of each block; alerts are the bitmask
+of rules active at any step of the block) for every pack, and
+are deterministic for a given seed and shard count: each shard's generator is seeded
+from SeedSequence(seed).spawn(n_shards).
+
+Run: python -m simulation.fleet_pipeline --packs 20000 --steps 3600 --shards 4
+"""
+import argparse
+import multiprocessing as mp
+import os
+import queue
+import sys
+import time
+
+import numpy as np
+from multiprocessing import shared_memory
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from simulation.batch_simulation import _schedule_steps
+from simulation.fleet_signal_generator import FleetSignalGenerator
+from utils.shared_ring import END_OF_STREAM, SharedRing
+
+TELEMETRY = ("voltage", "current", "temperature", "soc")
+STAGES = ("simulate", "soc", "features", "soh", "safety")
+
+# Shared result arrays: name -> dtype, each (n_blocks, n_packs)
+RESULTS = {"true_soc": np.float32, "soc": np.float32, "soh": np.float32, "alerts": np.uint32}
+
+
+def shard_bounds(n_packs, n_shards):
+    """[(lo, hi), ...] contiguous pack ranges, sizes differing by at most one"""
+    edges = np.linspace(0, n_packs, n_shards + 1).round().astype(int)
+    return list(zip(edges[:-1].tolist(), edges[1:].tolist()))
+
+
+class _SharedResults:
+    """The (n_blocks, n_packs) result arrays in one shared-memory segment"""
+    def __init__(self, n_blocks, n_packs, name=None):
+        self.n_blocks, self.n_packs = n_blocks, n_packs
+        sizes = [n_blocks * n_packs * np.dtype(dtype).itemsize for dtype in RESULTS.values()]
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=max(sum(sizes), 1))
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+
+        self.arrays = {}
+        offset = 0
+        for (key, dtype), size in zip(RESULTS.items(), sizes):
+            self.arrays[key] = np.ndarray((n_blocks, n_packs), dtype=dtype, buffer=self.shm.buf, offset=offset)
+            offset += size
+
+    def __reduce__(self):
+        return (_SharedResults, (self.n_blocks, self.n_packs, self.name))
+
+    def close(self):
+        self.arrays = {}
+        self.shm.close()
+
+
+def _simulate_worker(ring, lo, hi, seed_seq, n_steps, block_steps, dt, speed_factor, changes, stats_queue):
+    car = FleetSignalGenerator(hi - lo, seed=np.random.default_rng(seed_seq), start_time=0.0)
+    real_dt = dt / speed_factor
+    busy = 0.0
+    try:
+        for start in range(0, n_steps, block_steps):
+            rows = min(block_steps, n_steps - start)
+            block = ring.acquire_write()
+
+            t0 = time.perf_counter()
+            for j in range(rows):
+                if start + j in changes:
+                    car.set_mode(changes[start + j])
+                data = car.step(real_dt, speed_factor)
+                block["time"][j] = data["time"]
+                for name in TELEMETRY:
+                    block[name][j] = data[name]
+            busy += time.perf_counter() - t0
+
+            del block
+            ring.commit_write(rows)
+        ring.close_stream()
+    finally:
+        ring.close()
+    stats_queue.put((lo, {"simulate": busy}, {}))
+
+
+def _score_worker(ring, results, lo, hi, cycle, total_capacity_ah, feature_window, stats_queue):
+    # Imported in the worker: the SoH model is loaded once per scoring process
+    from inference.soc_predictor import BatchSOCPredictor
+    from inference.soh_evaluator import FLEET_MAX_STALENESS_S, FLEET_TOLERANCES, SOHEvaluator
+    from safety.rule_engine import SafetyEngine
+    from utils.dvdq_features import load_chemistry_features
+    from utils.streaming_features import FleetFeatureWindow
+
+    n = hi - lo
+    soc_model = BatchSOCPredictor(total_capacity_ah=total_capacity_ah, capacity=n)
+    soh_model = SOHEvaluator(tolerances=FLEET_TOLERANCES, max_staleness_s=FLEET_MAX_STALENESS_S, capacity=n)
+    window = FleetFeatureWindow(n, window=feature_window, nominal_capacity=total_capacity_ah)
+    safety = SafetyEngine(n)
+    soc_block = None
+    static_features = load_chemistry_features()
+    pack_ids = list(range(lo, hi))
+    busy = dict.fromkeys(STAGES[1:], 0.0)
+    out = {key: results.arrays[key][:, lo:hi] for key in RESULTS}
+
+    b = 0
+    try:
+        while True:
+            rows, block = ring.acquire_read()
+            if rows == END_OF_STREAM:
+                break
+            voltage, current, temperature = block["voltage"][:rows], block["current"][:rows], block["temperature"][:rows]
+
+            # 1. SoC: one batched filter update per step
+            t0 = time.perf_counter()
+            if soc_block is None or len(soc_block) < rows:
+                soc_block = np.empty((rows, n))
+            for j in range(rows):
+                soc_block[j] = soc_model.predict(pack_ids, voltage[j], current[j], temperature[j], block["time"][j])
+            soc = soc_block[rows - 1]
+            t1 = time.perf_counter()
+
+            # 2. Dynamic features over each pack's recent voltage window
+            window.update(voltage)
+            features = {**window.features(cycle), **static_features}
+            t2 = time.perf_counter()
+
+            # 3. SoH for every pack of the shard at once (the model only sees packs that changed)
+            soh = soh_model.evaluate(pack_ids, features, block["time"][rows - 1])
+            t3 = time.perf_counter()
+
+            # 4. Safety rules over every sample of the block (stateful across blocks)
+            flags = safety.evaluate(block["time"][:rows], soc=soc_block[:rows], soh=soh, temperature=temperature)
+            alerts = np.bitwise_or.reduce(flags["active"], axis=0)
+            t4 = time.perf_counter()
+
+            out["true_soc"][b] = block["soc"][rows - 1]
+            out["soc"][b] = soc
+            out["soh"][b] = soh
+            out["alerts"][b] = alerts
+
+            busy["soc"] += t1 - t0
+            busy["features"] += t2 - t1
+            busy["soh"] += t3 - t2
+            busy["safety"] += t4 - t3
+            del voltage, current, temperature, block
+            ring.release_read()
+            b += 1
+    finally:
+        del out
+        ring.close()
+        results.close()
+    stats_queue.put((lo, busy, {key: soh_model.stats[key] for key in ("rows", "hits", "model_rows")}))
+
+
+def run_pipeline(n_packs, n_steps, n_shards=None, seed=0, dt=1.0, block_steps=60, ring_slots=4,
+                 mode_schedule="DISCHARGE", speed_factor=1.0, cycle=500, total_capacity_ah=100.0,
+                 feature_window=100):
+    """
+    Simulates and scores n_packs for n_steps steps of dt simulated seconds.
+
+    n_shards: shards (two processes each); defaults to the CPU count
+    block_steps: steps per telemetry block; SoH and safety are evaluated once per block
+    cycle: battery age fed to the SoH model (scalar or one value per pack)
+
+    Returns a dict with "time" (n_blocks,), "true_soc", "soc", "soh", "alerts"
+    (n_blocks, n_packs) and "stats" (wall time and per-stage throughput).
+    """
+    n_shards = max(1, min(n_shards or os.cpu_count() or 1, n_packs))
+    n_blocks = -(-n_steps // block_steps)
+    changes = _schedule_steps(mode_schedule, dt, n_steps)
+    cycle = np.broadcast_to(np.asarray(cycle, dtype=np.float64), (n_packs,))
+    seeds = np.random.SeedSequence(seed).spawn(n_shards)
+    bounds = shard_bounds(n_packs, n_shards)
+
+    ctx = mp.get_context()
+    results = _SharedResults(n_blocks, n_packs)
+    stats_queue = ctx.Queue()
+    rings, procs = [], []
+    start = time.perf_counter()
+    try:
+        for (lo, hi), seed_seq in zip(bounds, seeds):
+            fields = {"time": ((block_steps,), np.float64)}
+            fields.update({name: ((block_steps, hi - lo), np.float64) for name in TELEMETRY})
+            ring = SharedRing(ring_slots, fields, ctx=ctx)
+            rings.append(ring)
+            procs.append(ctx.Process(
+                target=_simulate_worker, name=f"simulate[{lo}:{hi}]",
+                args=(ring, lo, hi, seed_seq, n_steps, block_steps, dt, speed_factor, changes, stats_queue)))
+            procs.append(ctx.Process(
+                target=_score_worker, name=f"score[{lo}:{hi}]",
+                args=(ring, results, lo, hi, cycle[lo:hi], total_capacity_ah, feature_window, stats_queue)))
+        for p in procs:
+            p.start()
+
+        # Every worker reports once on success; a crashed worker never does
+        busy = dict.fromkeys(STAGES, 0.0)
+        soh_counts = {"rows": 0, "hits": 0, "model_rows": 0}
+        reports = 0
+        while reports < len(procs):
+            try:
+                _, stage_busy, counts = stats_queue.get(timeout=0.5)
+            except queue.Empty:
+                failed = [p.name for p in procs if p.exitcode not in (None, 0)]
+                if failed:
+                    raise RuntimeError(f"pipeline worker(s) failed: {', '.join(failed)}")
+                continue
+            for stage, seconds in stage_busy.items():
+                busy[stage] += seconds
+            for key, count in counts.items():
+                soh_counts[key] += count
+            reports += 1
+        for p in procs:
+            p.join()
+        wall = time.perf_counter() - start
+
+        output = {key: array.copy() for key, array in results.arrays.items()}
+    finally:
+        for p in procs:
+            if p.is_alive():
+                p.terminate()
+                p.join()
+        for ring in rings:
+            ring.close()
+            ring.unlink()
+        results.close()
+        results.shm.unlink()
+
+    last_steps = np.minimum(np.arange(1, n_blocks + 1) * block_steps, n_steps)
+    output["time"] = last_steps * dt
+
+    # Per-stage throughput: pack-samples (or pack-evaluations) per busy second, summed over shards
+    pack_steps = n_packs * n_steps
+    evaluations = {"simulate": pack_steps, "soc": pack_steps, "features": pack_steps,
+                   "soh": n_packs * n_blocks, "safety": pack_steps}
+    output["stats"] = {
+        "n_shards": n_shards,
+        "wall_s": wall,
+        "pack_steps_per_s": pack_steps / wall,
+        "stages": {
+            stage: {"busy_s": busy[stage],
+                    "items": evaluations[stage],
+                    "items_per_busy_s": evaluations[stage] / busy[stage] if busy[stage] else float("inf")}
+            for stage in STAGES
+        },
+        "soh_model_rows": soh_counts["model_rows"],
+        "soh_cache_hits": soh_counts["hits"],
+    }
+    return output
+
+
+def format_stats(stats):
+    lines = [f"shards: {stats['n_shards']}  wall: {stats['wall_s']:.2f} s  "
+             f"throughput: {stats['pack_steps_per_s']:,.0f} pack-steps/s",
+             f"{'stage':<10} | {'busy s':>8} | {'items':>12} | {'items / busy s':>15}"]
+    for stage, s in stats["stages"].items():
+        lines.append(f"{stage:<10} | {s['busy_s']:>8.2f} | {s['items']:>12,} | {s['items_per_busy_s']:>15,.0f}")
+    evaluations = stats["stages"]["soh"]["items"]
+    lines.append(f"SoH model rows: {stats['soh_model_rows']:,} of {evaluations:,} pack evaluations "
+                 f"({evaluations / max(stats['soh_model_rows'], 1):.1f}x fewer, {stats['soh_cache_hits']:,} cache hits)")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sharded multi-process fleet simulation + scoring")
+    parser.add_argument("--packs", type=int, default=10_000)
+    parser.add_argument("--steps", type=int, default=3600)
+    parser.add_argument("--shards", type=int, default=None, help="defaults to the CPU count")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dt", type=float, default=1.0)
+    parser.add_argument("--block-steps", type=int, default=60)
+    parser.add_argument("--mode", default="DISCHARGE")
+    args = parser.parse_args(argv)
+
+    result = run_pipeline(args.packs, args.steps, n_shards=args.shards, seed=args.seed, dt=args.dt,
+                          block_steps=args.block_steps, mode_schedule=args.mode)
+    print(format_stats(result["stats"]))
+    print(f"final SoC estimate mean: {result['soc'][-1].mean():.2f} %  "
+          f"(true {result['true_soc'][-1].mean():.2f} %), mean SoH {result['soh'][-1].mean():.2f} %, "
+          f"packs with alerts: {int((result['alerts'][-1] != 0).sum())}")
+
+
+if __name__ == "__main__":
+    main()
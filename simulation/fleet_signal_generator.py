@@ -0,0 +1,172 @@
+import numpy as np
+import time
+
+from simulation.ev_signal_generator import pack_ocv
+from utils.ocv_tables import get_ocv_table
+from utils.state_store import FleetStateStore, StoreField
+
+# Operation modes / drive-cycle phases as integer codes (index into these tuples to decode)
+MODES = ("STANDBY", "DISCHARGE", "CHARGE")
+PHASES = ("IDLE", "ACCEL", "CRUISE", "REGEN", "CV")
+
+MODE_STANDBY, MODE_DISCHARGE, MODE_CHARGE = 0, 1, 2
+PHASE_IDLE, PHASE_ACCEL, PHASE_CRUISE, PHASE_REGEN, PHASE_CV = 0, 1, 2, 3, 4
+
+# Drive cycle: IDLE -> ACCEL -> CRUISE -> REGEN -> repeat (CV only appears while charging)
+PHASE_DURATION = np.array([30.0, 15.0, 60.0, 10.0, np.inf])
+PHASE_NEXT = np.array([PHASE_ACCEL, PHASE_CRUISE, PHASE_REGEN, PHASE_IDLE, PHASE_CV])
+CC_DURATION = 120.0
+
+# Target current regimes: mean + std * N(0, 1)
+# 0: STANDBY | 1-4: DISCHARGE IDLE/ACCEL/CRUISE/REGEN | 5: CHARGE CC | 6: CHARGE CV | 7: CHARGE full
+TARGET_MEAN = np.array([-0.5, -2.0, -180.0, -60.0, 80.0, 80.0, 20.0, 0.0])
+TARGET_STD = np.array([0.2, 0.0, 10.0, 5.0, 8.0, 5.0, 2.0, 0.0])
+
+
+class FleetSignalGenerator:
+    """
+    Vectorized EVSignalGenerator: advances N packs per step().
+    All per-pack state lives in NumPy arrays and every noise source is a single RNG draw.
+    The arrays are fields of a FleetStateStore (pack i in slot i): pass a store to share
+    it with the estimators, or a restored one to resume a checkpointed fleet (clock and
+    RNG included). With a chemistry, OCV comes from its table (utils.ocv_tables) at each
+    pack's temperature instead of pack_ocv.
+    """
+    # State
+    soc = StoreField("sim.soc")                      # %
+    temp = StoreField("sim.temp")                    # °C
+    current = StoreField("sim.current")              # Amps
+    voltage = StoreField("sim.voltage")              # Volts
+    # Physics Constants (per pack, so fleets can be heterogeneous)
+    capacity_ah = StoreField("sim.capacity_ah")
+    resistance = StoreField("sim.resistance")
+    ambient = StoreField("sim.ambient")              # °C the pack relaxes to
+    # Drive Cycle State Machine
+    phase_timer = StoreField("sim.phase_timer")
+    phase = StoreField("sim.phase")
+    operation_mode = StoreField("sim.operation_mode")
+
+    def __init__(self, n_packs, seed=None, soc=50.0, temp=25.0, start_time=None, ambient=25.0, store=None,
+                 chemistry=None):
+        self.n_packs = int(n_packs)
+        self.rng = np.random.default_rng(seed)
+        self.ocv_table = None if chemistry is None else get_ocv_table(chemistry)
+
+        # Clock: wall clock by default, simulated seconds if start_time is given
+        self.sim_time = start_time
+
+        self.store = FleetStateStore(self.n_packs) if store is None else store
+        restored = "sim.soc" in self.store.fields
+        if not np.array_equal(self.store.slots(range(self.n_packs)), np.arange(self.n_packs)):
+            raise ValueError("packs 0 .. n_packs-1 must be the first slots of the store")
+        for name, dtype, default in (("sim.soc", np.float64, 50.0), ("sim.temp", np.float64, 25.0),
+                                     ("sim.current", np.float64, 0.0), ("sim.voltage", np.float64, 350.0),
+                                     ("sim.capacity_ah", np.float64, 100.0), ("sim.resistance", np.float64, 0.05),
+                                     ("sim.ambient", np.float64, 25.0), ("sim.phase_timer", np.float64, 0.0),
+                                     ("sim.phase", np.int8, PHASE_IDLE),
+                                     ("sim.operation_mode", np.int8, MODE_STANDBY)):
+            self.store.add_field(name, dtype=dtype, default=default)
+        self.store.checkpoint_hooks.append(self._save_clock)
+
+        if restored:
+            self.sim_time = self.store.meta.get("sim.time", self.sim_time)
+            if "sim.rng" in self.store.meta:
+                self.rng.bit_generator.state = self.store.meta["sim.rng"]
+        else:
+            self.soc = soc
+            self.temp = temp
+            self.ambient = ambient
+
+    def _save_clock(self, store):
+        store.meta["sim.time"] = self.sim_time
+        store.meta["sim.rng"] = self.rng.bit_generator.state
+
+    def set_mode(self, mode, packs=None):
+        """Set operation mode (STANDBY, DISCHARGE, CHARGE) for all packs or an index/mask of packs"""
+        if mode not in MODES:
+            return
+        if packs is None:
+            packs = slice(None)
+        self.operation_mode[packs] = MODES.index(mode)
+        self.phase_timer[packs] = 0
+        self.phase[packs] = PHASE_IDLE
+
+    def _target_current(self, z):
+        mode, soc = self.operation_mode, self.soc
+        charge_regime = np.where(soc < 80.0, 5, np.where(soc >= 98.0, 7, 6))
+        drive_regime = 1 + np.minimum(self.phase, PHASE_REGEN)
+        regime = np.where(mode == MODE_STANDBY, 0,
+                          np.where(mode == MODE_DISCHARGE, drive_regime, charge_regime))
+        return TARGET_MEAN[regime] + TARGET_STD[regime] * z
+
+    def _advance_phases(self):
+        mode, phase, phase_timer = self.operation_mode, self.phase, self.phase_timer
+        # Driving: move to the next phase once the current one has run its course
+        done = (mode == MODE_DISCHARGE) & (phase_timer > PHASE_DURATION[phase])
+        # Charging: CC hands over to CV after 2 min simulated
+        done_cc = (mode == MODE_CHARGE) & (self.soc < 80.0) & (phase_timer > CC_DURATION)
+
+        phase[done] = PHASE_NEXT[phase[done]]
+        phase[done_cc] = PHASE_CV
+        phase_timer[done | done_cc] = 0
+
+    def step(self, real_dt, speed_factor):
+        """
+        real_dt: Real world time elapsed (e.g. 0.1s)
+        speed_factor: Time multiplier (e.g. 100x)
+        Returns a dict of per-pack arrays (same keys as EVSignalGenerator.step).
+        """
+        # 1. CALCULATE SIMULATED TIME
+        sim_dt = real_dt * speed_factor
+        if self.sim_time is not None:
+            self.sim_time += sim_dt
+
+        # One draw for every noise source: target, current, temperature, voltage
+        z = self.rng.standard_normal((4, self.n_packs))
+
+        # 2. UPDATE DRIVE CYCLE based on operation mode
+        self.phase_timer += sim_dt
+        target_i = self._target_current(z[0])
+        self._advance_phases()
+
+        # 3. PHYSICS UPDATE (in place on the store's rows)
+        soc, temp, current, voltage = self.soc, self.temp, self.current, self.voltage
+
+        # Smooth current response
+        if speed_factor > 10:
+            current[:] = target_i + 5.0 * z[1]
+        else:
+            current[:] = (0.9 * current) + (0.1 * target_i) + 2.0 * z[1]
+
+        # Coulomb Counting (The Drain/Charge)
+        ah_used = current * (sim_dt / 3600.0)
+        soc += (ah_used / self.capacity_ah) * 100.0
+        np.clip(soc, 0.0, 100.0, out=soc)
+
+        # Temperature model (charging heats less than discharging)
+        load_ratio = np.abs(current) / 200.0
+        heat_gain = np.where(self.operation_mode == MODE_CHARGE, 35.0, 40.0)
+        target_temp = self.ambient + (load_ratio * heat_gain)
+
+        if speed_factor > 50:
+            temp[:] = target_temp
+        else:
+            temp[:] = (0.99 * temp) + (0.01 * target_temp)
+
+        temp += 0.1 * z[2]
+        np.clip(temp, -10, 70, out=temp)
+
+        # Voltage Sag (V = OCV - IR)
+        ocv = pack_ocv(soc) if self.ocv_table is None else self.ocv_table.ocv(soc, temp)
+        voltage[:] = ocv + current * self.resistance
+        voltage += 0.2 * z[3]
+        np.clip(voltage, 280, 410, out=voltage)
+
+        return {
+            "time": time.time() if self.sim_time is None else self.sim_time,
+            "voltage": voltage.copy(),
+            "current": current.copy(),
+            "temperature": temp.copy(),
+            "soc": soc.copy(),
+            "power": voltage * current / 1000.0  # kW
+        }
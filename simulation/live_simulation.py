@@ -0,0 +1,339 @@
+"""
+The dashboard's single-car digital twin, run on a background thread.
+
+The simulation advances at its own rate (speed_factor simulated seconds per wall second)
+no matter how often, or whether, anything is rendered; the UI polls snapshot() and
+series() at a fixed frame rate. Every tick the worker
+  1. steps the physics in sub-steps of max(min_step_s, speed_factor / max_samples_per_s)
+     simulated seconds (one vectorized block per tick), with SoC (Coulomb + OCV) and
+     rolling features per sub-step
+  2. feeds the LSTM (only while it is the selected estimator) and the SoH model (through
+     SOHEvaluator) once with the newest sample
+  3. runs the safety rules over the whole block of sub-steps in one call
+  4. appends the block to the history ring buffer (and the telemetry store, if given)
+series() decimates the history server-side, so a chart over a million samples ships
+a few thousand points to the browser. With utils.instrumentation enabled every stage
+above is timed ("sim.*" stages; the per-sub-step ones as time per tick), and profile()
+samples the worker's stacks. With a `source` (simulation.replay.ReplaySource) step 1 reads
+the next speed_factor x tick of a recording instead of running the physics.
+"""
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from inference.lstm_soc_predictor import LSTMSOCPredictor
+from inference.soc_predictor import SOCPredictor
+from inference.soh_evaluator import SOHEvaluator
+from inference.soh_predictor import SOHPredictor
+from safety.rule_engine import SafetyEngine
+from simulation.ev_signal_generator import EVSignalGenerator, degraded_capacity
+from utils.decimation import decimate_indices
+from utils.instrumentation import SamplingProfiler, metrics
+from utils.streaming_features import RingBuffer, StreamingFeatureEngine
+
+HISTORY_COLUMNS = ("time", "voltage", "current", "soc", "temperature", "capacity_ratio", "power")
+ESTIMATORS = ("coulomb", "lstm")
+
+
+class LiveSimulation:
+    """
+    One simulated car plus its estimators, advanced by a worker thread.
+    Settings (speed, age, estimator, mode) may be changed from any thread at any time;
+    they take effect on the next tick. The worker exits on stop(), or by itself when
+    nobody has polled it for idle_timeout_s (an abandoned browser tab).
+    """
+    def __init__(self, static_features=None, store=None, pack_id="car", history_size=1_000_000,
+                 nominal_capacity=100.0, tick_s=0.05, max_samples_per_s=1000, min_step_s=0.1,
+                 idle_timeout_s=30.0, source=None, seed=None):
+        self.static_features = dict(static_features or {})
+        self.store = store
+        self.pack_id = pack_id
+        self.nominal_capacity = nominal_capacity
+        self.tick_s = tick_s
+        self.max_samples_per_s = max_samples_per_s
+        self.min_step_s = min_step_s
+        self.idle_timeout_s = idle_timeout_s
+        self.source = source
+
+        # Settings
+        self.speed_factor = 100.0
+        self.cycle = 10.0
+        self.estimator = "coulomb"
+
+        # Models and state (timestamps are simulated seconds, starting at the wall clock)
+        self.car = EVSignalGenerator(start_time=time.time(), seed=seed)
+        self.soc_ai = SOCPredictor(total_capacity_ah=nominal_capacity)
+        # LSTM SoC (NumPy runtime, no TensorFlow); built when first selected, as it needs the
+        # training scaler, and fed only while selected (Coulomb until its window fills)
+        self.soc_lstm = None
+        self.soh_ai = SOHPredictor()
+        # Load the SoH model (shared by all sessions) while the page renders
+        self.soh_ai.preload()
+        # Re-scores only when the features cross one of the model's splits (exact)
+        self.soh_eval = SOHEvaluator(self.soh_ai, capacity=1)
+        # Stateful alert rules (hysteresis, debounce, dT/dt) for the single simulated pack
+        self.safety = SafetyEngine(n_packs=1)
+        self.features = StreamingFeatureEngine(window=100, nominal_capacity=nominal_capacity)
+        self.history = RingBuffer(history_size, columns=HISTORY_COLUMNS)
+
+        self.sim_clock = 0.0          # simulated seconds since this simulation was created
+        self.capacity_ah = nominal_capacity
+        self.smoothed_soc = 50.0
+        self.smoothed_soh = 100.0
+        self.soc_alpha = 0.15         # EMA smoothing factor for SOC (per sample)
+        self.soh_alpha = 0.1          # EMA smoothing factor for SOH (per tick)
+        self.soh_buffer = []          # SOH predictions collected before smoothing
+        self.soh_buffer_size = 20
+        self.lstm_soc = None
+        self.latest = None
+        self.stats = {"ticks": 0, "samples": 0, "busy_s": 0.0, "wall_s": 0.0, "sim_s": 0.0}
+        self.error = None
+        self._pending_s = 0.0
+
+        self._frame = {}              # series() copy buffers, reused so frames do not page-fault fresh memory
+        self._series_cache = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_poll = time.monotonic()
+
+        if store is not None and source is None:
+            self._restore()
+
+    def _restore(self):
+        """Refills the history from the telemetry store so a page reload keeps its charts"""
+        stored = self.store.last(self.pack_id, self.history.size)
+        if not len(stored["time"]):
+            return
+        self.history.extend({
+            "time": stored["time"],
+            "voltage": stored["voltage"],
+            "current": stored["current"],
+            "soc": stored["soc"],
+            "temperature": stored["temperature"],
+            "capacity_ratio": stored["capacity_ah"] / self.nominal_capacity,
+            "power": stored["voltage"] * stored["current"] / 1000.0,
+        })
+        # Continue after the newest stored sample (the store only accepts increasing time)
+        self.car.sim_time = max(self.car.sim_time, float(stored["time"][-1]))
+
+    # --- control (any thread) ---
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._last_poll = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="live-simulation", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=1.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def set_mode(self, mode):
+        with self._lock:
+            self.car.set_mode(mode)
+
+    def configure(self, speed_factor=None, cycle=None, estimator=None):
+        """ValueError for estimator="lstm" without the LSTM's training scaler (the estimator is unchanged)"""
+        if estimator is not None and estimator not in ESTIMATORS:
+            raise ValueError(f"estimator must be one of {ESTIMATORS}, got {estimator!r}")
+        if estimator == "lstm" and self.soc_lstm is None:
+            self.soc_lstm = LSTMSOCPredictor(total_capacity_ah=self.nominal_capacity)
+        with self._lock:
+            if speed_factor is not None:
+                self.speed_factor = float(speed_factor)
+            if cycle is not None:
+                self.cycle = float(cycle)
+            if estimator is not None:
+                self.estimator = estimator
+
+    def profile(self, seconds=3.0, interval=0.005):
+        """Samples the worker thread's stacks for `seconds` (blocking); returns the SamplingProfiler"""
+        if not self.running:
+            raise RuntimeError("the simulation is not running")
+        return SamplingProfiler(self._thread, interval=interval).run_for(seconds)
+
+    # --- worker ---
+
+    def _run(self):
+        last = time.perf_counter()
+        try:
+            while not self._stop.is_set():
+                if time.monotonic() - self._last_poll > self.idle_timeout_s:
+                    break
+                now = time.perf_counter()
+                # A stalled tick (e.g. a GC pause) is not caught up in one huge block
+                elapsed = min(now - last, 0.5)
+                last = now
+                with self._lock:
+                    self._advance(elapsed * self.speed_factor)
+                busy = time.perf_counter() - now
+                metrics.observe_stage("sim.tick", busy)
+                self.stats["busy_s"] += busy
+                self.stats["wall_s"] += elapsed
+                self._stop.wait(max(self.tick_s - busy, 0.0))
+        except Exception as exc:
+            self.error = exc
+            raise
+
+    def _advance(self, sim_seconds):
+        """Advances the simulation by ~sim_seconds in whole sub-steps (the remainder carries over)"""
+        if self.source is not None:
+            recorded = self.source.read(sim_seconds)
+            if not len(recorded.get("time", ())):
+                return
+            self._score(*self._ingest(recorded), sim_seconds)
+            return
+
+        speed = self.speed_factor
+        step = max(self.min_step_s, speed / self.max_samples_per_s)
+        self._pending_s += sim_seconds
+        n = int(self._pending_s // step)
+        if n == 0:
+            return
+        self._pending_s -= n * step
+
+        # 1. Physics for the whole block, then SoC and rolling features per sub-step
+        with metrics.timer("sim.physics"):
+            data = self.car.step_block(n, step / speed, speed)
+            # Capacity degrades with cycles + temperature + current stress
+            data["capacity_ah"] = degraded_capacity(self.nominal_capacity, self.cycle,
+                                                    data["temperature"], data["current"])
+        self._score(*self._ingest(data), n * step)
+
+    def _ingest(self, recorded):
+        """Rest of step 1 for a block of samples, simulated or recorded (capacity as given, or nominal)"""
+        t, voltage, current, temperature = (recorded[name] for name in ("time", "voltage", "current", "temperature"))
+        n = len(t)
+        capacity = np.broadcast_to(recorded.get("capacity_ah", self.nominal_capacity), (n,))
+        use_lstm = self.estimator == "lstm" and self.lstm_soc is not None
+
+        with metrics.timer("sim.features"):
+            for k in range(n):
+                self.features.update(voltage[k], capacity[k])
+        with metrics.timer("sim.soc"):
+            soc_raw = self.soc_ai.predict_series(voltage, current, temperature, t)
+            if use_lstm:
+                soc_raw = np.full(n, self.lstm_soc)
+            smoothed = np.empty(n)
+            for k, raw in enumerate(soc_raw.tolist()):
+                self.smoothed_soc = self.soc_alpha * raw + (1 - self.soc_alpha) * self.smoothed_soc
+                smoothed[k] = self.smoothed_soc
+        self.capacity_ah = float(capacity[-1])
+
+        power = voltage * current / 1000.0
+        block = np.stack([t, voltage, current, smoothed, temperature, capacity / self.nominal_capacity, power])
+        data = {"time": t[-1], "voltage": voltage[-1], "current": current[-1],
+                "temperature": temperature[-1], "power": power[-1]}
+        return block, data
+
+    def _score(self, block, data, sim_seconds):
+        """Steps 2-4 for a block of new samples (data: the newest one)"""
+        n = block.shape[1]
+        t, voltage, current, soc, temperature, capacity_ratio, power = block
+        metrics.observe("elektra_batch_size", n, stage="sim.tick")
+        metrics.inc("elektra_samples_total", n, source="live_simulation")
+
+        # 2. LSTM and SoH once per tick, on the newest sample
+        if self.estimator == "lstm":
+            with metrics.timer("sim.lstm"):
+                self.lstm_soc = float(self.soc_lstm.predict(
+                    [self.pack_id], [data['voltage']], [data['current']], [data['temperature']], data['time'])[0])
+        else:
+            self.lstm_soc = None
+        with metrics.timer("sim.soh"):
+            pred_soh_raw = self.soh_eval.evaluate_one(
+                self.features.features(self.cycle), self.static_features, data['time'], self.pack_id)
+        self.soh_buffer.append(pred_soh_raw)
+        if len(self.soh_buffer) > self.soh_buffer_size:
+            self.soh_buffer.pop(0)
+        if len(self.soh_buffer) >= 5:
+            buffer_mean = np.mean(self.soh_buffer)
+            self.smoothed_soh = self.soh_alpha * buffer_mean + (1 - self.soh_alpha) * self.smoothed_soh
+        soh = float(np.clip(self.smoothed_soh, 0, 100))
+
+        # 3. Safety rules over the whole block
+        with metrics.timer("sim.safety"):
+            flags = self.safety.evaluate(t, soc=soc[:, None], soh=[soh], temperature=temperature[:, None])
+
+        # 4. History and persistence
+        with metrics.timer("sim.history"):
+            self.history.extend(dict(zip(HISTORY_COLUMNS, block)))
+        if self.store is not None:
+            with metrics.timer("sim.store"):
+                try:
+                    self.store.append(self.pack_id, t, voltage=voltage, current=current, temperature=temperature,
+                                      soc=soc, soh=np.full(n, soh), capacity_ah=capacity_ratio * self.nominal_capacity)
+                except ValueError:
+                    pass  # another session already wrote a newer sample for this pack
+
+        self.sim_clock += sim_seconds
+        self.stats["ticks"] += 1
+        self.stats["samples"] += n
+        self.stats["sim_s"] += sim_seconds
+        self.latest = {
+            "time": data['time'],
+            "voltage": data['voltage'],
+            "current": data['current'],
+            "temperature": data['temperature'],
+            "soc": float(soc[-1]),
+            "soh": soh,
+            "cycle": self.cycle,
+            "mode": "REPLAY" if self.source is not None else self.car.operation_mode,
+            "sim_clock": self.sim_clock,
+            "alerts": self.safety.messages(flags["active"][-1, 0]),
+            "severity": int(flags["severity"][-1, 0]),
+        }
+
+    # --- readers (UI thread) ---
+
+    def snapshot(self):
+        """Newest values, alerts and worker statistics (None values before the first tick)"""
+        self._last_poll = time.monotonic()
+        with self._lock:
+            latest = dict(self.latest) if self.latest else {}
+            stats = dict(self.stats)
+        stats["achieved_speed"] = stats["sim_s"] / stats["wall_s"] if stats["wall_s"] else 0.0
+        stats["load"] = stats["busy_s"] / stats["wall_s"] if stats["wall_s"] else 0.0
+        stats["soh"] = self.soh_eval.summary()
+        latest["stats"] = stats
+        latest["running"] = self.running
+        latest["error"] = self.error
+        return latest
+
+    def series(self, columns, n_out=2000, method="minmax_lttb"):
+        """
+        Decimated history for charts: {column: (time, values)} with at most ~n_out points each.
+        Each column gets its own selection, so spikes in every signal survive.
+        """
+        self._last_poll = time.monotonic()
+        key = (self.history.count, tuple(columns), n_out, method)
+        if self._series_cache is not None and self._series_cache[0] == key:
+            return self._series_cache[1]   # nothing new since the last frame
+        with metrics.timer("ui.copy"), self._lock:
+            t = self.history.column("time", self._frame_buffer("time"))
+            values = {name: self.history.column(name, self._frame_buffer(name)) for name in columns}
+        out = {}
+        with metrics.timer("ui.decimate"):
+            for name, y in values.items():
+                index = decimate_indices(t, y, n_out, method)
+                out[name] = (t[index], y[index])
+        self._series_cache = (key, out)
+        return out
+
+    def _frame_buffer(self, name):
+        if name not in self._frame:
+            self._frame[name] = np.empty(self.history.size, dtype=self.history.data.dtype)
+        return self._frame[name]
@@ -0,0 +1,482 @@
+"""
+Replay of recorded pack telemetry through the estimators.
+
+    summary = backtest("logs/pack7.csv")                        # as fast as possible
+    for result in replay("logs/pack7.parquet", realtime=True):  # paced at the recorded rate
+        ...
+
+Recordings are read in chunks (read_chunks), never whole: CSV through pandas' chunked
+reader, Parquet one record batch at a time (pyarrow), NPZ by streaming each member's
+bytes out of the zip archive. Every chunk runs through the dashboard's stages,
+vectorized over the chunk:
+  1. SoC       SOCPredictor.predict_series (Coulomb + OCV, same values as per-sample predict)
+  2. features  the SoH voltage-window features at the first sample of every
+               soh_interval_s of recorded time
+  3. SoH       SOHPredictor.predict_many on those points, held until the next one
+  4. safety    the SafetyEngine rule table over every sample (check_safety's LOW_SOC /
+               LOW_SOH / OVERHEAT rows plus the stateful rules)
+All state carries over between chunks, so results do not depend on chunk_rows, and
+memory is bounded by chunk_rows whatever the file size.
+
+Columns are matched by name: time (seconds, or datetimes), voltage, current and
+temperature are required; soc (the BMS' own estimate, scored against), capacity_ah
+and cycle are used when present. `columns` maps these names to the file's own.
+
+Run: python -m simulation.replay recording.csv [--pack 7] [--realtime --speed 10]
+"""
+import argparse
+import os
+import sys
+import time
+import zipfile
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from inference.soc_predictor import SOCPredictor
+from inference.soh_predictor import SOHPredictor
+from safety.rule_engine import SafetyEngine
+from utils.dvdq_features import load_chemistry_features
+from utils.streaming_features import window_features
+
+REQUIRED = ("time", "voltage", "current", "temperature")
+OPTIONAL = ("soc", "capacity_ah", "cycle")
+DEFAULT_CHUNK_ROWS = 1 << 16
+
+# Per-sample keys of a process() result (the rest are per SoH evaluation point)
+SAMPLE_KEYS = ("time", "voltage", "current", "temperature", "true_soc", "soc", "soh",
+               "active", "raised", "severity")
+
+
+# --- readers ---
+
+def read_chunks(path, chunk_rows=DEFAULT_CHUNK_ROWS, columns=None, pack=None, pack_column="pack"):
+    """
+    Yields the recording as dicts of float64 column arrays, at most chunk_rows rows each.
+    columns: {name: column in the file} for names that differ from REQUIRED/OPTIONAL
+    pack: keep only this pack's rows (long-format files with a pack column, or the
+          pack index of 2-D NPZ arrays as written by simulation.batch_simulation)
+    """
+    names = {name: name for name in REQUIRED + OPTIONAL}
+    names.update(columns or {})
+    lower = path.lower()
+    if lower.endswith((".csv", ".csv.gz")):
+        chunks = _csv_chunks(path, names, chunk_rows, pack, pack_column)
+    elif lower.endswith((".parquet", ".pq")):
+        chunks = _parquet_chunks(path, names, chunk_rows, pack, pack_column)
+    elif lower.endswith(".npz"):
+        chunks = _npz_chunks(path, names, chunk_rows, pack)
+    else:
+        raise ValueError(f"unsupported recording format: {path!r} (use .csv, .parquet or .npz)")
+    for chunk in chunks:
+        if len(chunk["time"]):
+            yield chunk
+
+
+def _select(names, available, path):
+    """{name: file column} for the names the file has; raises if a required one is missing"""
+    present = {name: column for name, column in names.items() if column in available}
+    missing = [f"{name} ({names[name]!r})" for name in REQUIRED if name not in present]
+    if missing:
+        raise ValueError(f"{path}: missing column(s) {', '.join(missing)}")
+    return present
+
+
+def _as_seconds(values):
+    """Timestamps as float seconds (numbers pass through; datetimes become Unix time)"""
+    values = np.asarray(values)
+    if values.dtype.kind in "iuf":
+        return values.astype(np.float64)
+    if values.dtype.kind != "M":
+        import pandas as pd
+
+        values = pd.to_datetime(values, utc=True).tz_localize(None).to_numpy()
+    return values.astype("datetime64[ns]").astype(np.int64) / 1e9
+
+
+def _from_frame(frame, present, pack, pack_column):
+    if pack is not None:
+        frame = frame[frame[pack_column].to_numpy() == pack]
+    return {name: _as_seconds(frame[column].to_numpy()) if name == "time"
+            else frame[column].to_numpy(dtype=np.float64)
+            for name, column in present.items()}
+
+
+def _csv_chunks(path, names, chunk_rows, pack, pack_column):
+    import pandas as pd
+
+    present = _select(names, set(pd.read_csv(path, nrows=0).columns), path)
+    usecols = list(present.values()) + ([pack_column] if pack is not None else [])
+    for frame in pd.read_csv(path, usecols=usecols, chunksize=chunk_rows):
+        yield _from_frame(frame, present, pack, pack_column)
+
+
+def _parquet_chunks(path, names, chunk_rows, pack, pack_column):
+    import pyarrow.parquet as pq
+
+    parquet = pq.ParquetFile(path)
+    present = _select(names, set(parquet.schema_arrow.names), path)
+    read = list(present.values()) + ([pack_column] if pack is not None else [])
+    for batch in parquet.iter_batches(batch_size=chunk_rows, columns=read):
+        yield _from_frame(batch.to_pandas(), present, pack, pack_column)
+
+
+_NPY_HEADER_READERS = {(1, 0): np.lib.format.read_array_header_1_0, (2, 0): np.lib.format.read_array_header_2_0}
+
+
+def _npz_chunks(path, names, chunk_rows, pack):
+    with zipfile.ZipFile(path) as archive:
+        members = {os.path.splitext(member)[0]: member for member in archive.namelist()}
+        present = _select(names, set(members), path)
+
+        # 1. Open every member as a stream positioned after its .npy header
+        streams = {}
+        try:
+            for name, column in present.items():
+                stream = archive.open(members[column])
+                streams[name] = stream
+                version = np.lib.format.read_magic(stream)
+                if version not in _NPY_HEADER_READERS:
+                    raise ValueError(f"{path}: unsupported .npy version {version} in {column!r}")
+                shape, fortran_order, dtype = _NPY_HEADER_READERS[version](stream)
+                if fortran_order or dtype.hasobject or len(shape) not in (1, 2):
+                    raise ValueError(f"{path}: {column!r} must be a C-ordered 1-D or 2-D numeric array")
+                streams[name] = (stream, shape, dtype)
+
+            lengths = {shape[0] for _, shape, _ in streams.values()}
+            if len(lengths) != 1:
+                raise ValueError(f"{path}: columns have different lengths {sorted(lengths)}")
+            n_rows = lengths.pop()
+
+            # 2. Read chunk_rows rows of every member at a time
+            for start in range(0, n_rows, chunk_rows):
+                rows = min(chunk_rows, n_rows - start)
+                chunk = {}
+                for name, (stream, shape, dtype) in streams.items():
+                    width = shape[1] if len(shape) == 2 else 1
+                    values = np.frombuffer(stream.read(rows * width * dtype.itemsize), dtype=dtype)
+                    if len(shape) == 2:
+                        if pack is None and width > 1:
+                            raise ValueError(f"{path}: {name!r} holds {width} packs; pass pack=")
+                        values = values.reshape(rows, width)[:, pack or 0]
+                    chunk[name] = values.astype(np.float64)
+                yield chunk
+        finally:
+            for entry in streams.values():
+                (entry[0] if isinstance(entry, tuple) else entry).close()
+
+
+# --- scoring ---
+
+class Replay:
+    """
+    Estimator state for one recorded pack. process() takes consecutive chunks (dicts
+    of column arrays, as read_chunks yields them) and scores every sample.
+    """
+    def __init__(self, static_features=None, cycle=500, nominal_capacity=100.0, soh_interval_s=300.0,
+                 feature_window=100, std_window=5, rolling_window=10):
+        self.static_features = load_chemistry_features() if static_features is None else dict(static_features)
+        self.cycle = cycle
+        self.nominal_capacity = nominal_capacity
+        self.soh_interval_s = soh_interval_s
+        self.feature_window = feature_window
+        self.std_window = std_window
+        self.rolling_window = rolling_window
+
+        self.soc_model = SOCPredictor(total_capacity_ah=nominal_capacity)
+        self.soh_model = SOHPredictor()
+        self.safety = SafetyEngine(n_packs=1)
+
+        self.samples = 0
+        self.last_time = None
+        self._tail = np.empty(0)        # last feature_window - 1 voltages
+        self._capacity = nominal_capacity
+        self._bucket = np.nan           # soh_interval_s bucket of the last sample
+        self._soh = np.nan              # SoH held from the last evaluation point
+
+    def process(self, chunk):
+        """
+        Scores one chunk. Returns the per-sample arrays of SAMPLE_KEYS ("soc" is the
+        estimate, "true_soc" the recorded value or NaN; "active"/"raised"/"severity" as
+        SafetyEngine.evaluate returns them) plus "soh_time"/"soh_points" at the SoH
+        evaluation points.
+        """
+        t = np.asarray(chunk["time"], dtype=np.float64)
+        voltage, current, temperature = chunk["voltage"], chunk["current"], chunk["temperature"]
+        n = len(t)
+        if np.any(np.diff(t) < 0) or (self.last_time is not None and t[0] < self.last_time):
+            raise ValueError("timestamps must be non-decreasing")
+
+        # 1. SoC over every sample
+        soc = self.soc_model.predict_series(voltage, current, temperature, t)
+
+        # 2. Voltage-window features at the first sample of every soh_interval_s
+        bucket = np.floor(t / self.soh_interval_s)
+        points = np.flatnonzero(bucket != np.concatenate([[self._bucket], bucket[:-1]]))
+        capacity = np.broadcast_to(chunk.get("capacity_ah", self.nominal_capacity), (n,)).astype(np.float64)
+        previous_capacity = np.concatenate([[self._capacity], capacity[:-1]])
+        cycle = chunk["cycle"][points] if "cycle" in chunk else np.full(len(points), float(self.cycle))
+        features = {
+            "cycle": cycle,
+            **self._window_features(voltage, points),
+            "capacity_ah": capacity[points],
+            "capacity_ratio": capacity[points] / self.nominal_capacity,
+            "delta_capacity": (capacity[points] - previous_capacity[points]) / capacity[points],
+            **self.static_features,
+        }
+
+        # 3. SoH at those points, held in between
+        soh_points = self.soh_model.predict_many(features) if len(points) else np.empty(0)
+        held = np.searchsorted(points, np.arange(n), side="right")
+        soh = np.concatenate([[self._soh], soh_points])[held]
+
+        # 4. Safety rules over the whole chunk
+        flags = self.safety.evaluate(t, soc=soc[:, None], soh=soh[:, None], temperature=temperature[:, None])
+
+        self.samples += n
+        self.last_time = float(t[-1])
+        self._capacity = float(capacity[-1])
+        self._bucket = bucket[-1]
+        self._soh = soh[-1]
+        return {
+            "time": t,
+            "voltage": voltage,
+            "current": current,
+            "temperature": temperature,
+            "true_soc": chunk["soc"] if "soc" in chunk else np.full(n, np.nan),
+            "soc": soc,
+            "soh": soh,
+            "active": flags["active"][:, 0],
+            "raised": flags["raised"][:, 0],
+            "severity": flags["severity"][:, 0],
+            "soh_time": t[points],
+            "soh_points": soh_points,
+        }
+
+    def _window_features(self, voltage, points):
+        """Window features ending at each point (windows reach back into earlier chunks)"""
+        window = self.feature_window
+        offset = len(self._tail)
+        extended = np.concatenate([self._tail, np.asarray(voltage, dtype=np.float64)])
+        self._tail = extended[-(window - 1):].copy() if window > 1 else np.empty(0)
+        if not len(points):
+            return window_features(np.empty((0, 0)), self.std_window, self.rolling_window)
+
+        # Points with a full window share one strided view; the first few of a recording do not
+        ends = offset + points                       # index of each point in `extended`
+        seen = self.samples + points + 1             # samples up to and including each point
+        full = seen >= window
+        full_features = None
+        if full.any():
+            from numpy.lib.stride_tricks import sliding_window_view
+
+            hist = sliding_window_view(extended, window)[ends[full] - window + 1].T
+            full_features = window_features(hist, self.std_window, self.rolling_window)
+        partial = [window_features(extended[end - m + 1:end + 1, None], self.std_window, self.rolling_window)
+                   for end, m in zip(ends[~full], seen[~full])]
+
+        out = {}
+        for name in ("mean_voltage", "voltage_std", "min_voltage", "max_voltage", "rolling_voltage_std"):
+            values = np.empty(len(points))
+            if full_features is not None:
+                values[full] = full_features[name]
+            values[~full] = [features[name][0] for features in partial]
+            out[name] = values
+        return out
+
+
+def replay(path, realtime=False, speed=1.0, tick_s=0.1, chunk_rows=DEFAULT_CHUNK_ROWS, columns=None,
+           pack=None, pack_column="pack", **replay_kwargs):
+    """
+    Yields process() results for a recording.
+    realtime=False: one result per chunk, as fast as the estimators run (backtesting)
+    realtime=True: results are sliced and paced so samples arrive `speed` times faster
+                   than recorded, at most one slice per tick_s (dashboards)
+    replay_kwargs go to Replay (static_features, cycle, soh_interval_s, ...)
+    """
+    engine = Replay(**replay_kwargs)
+    results = (engine.process(chunk) for chunk in read_chunks(path, chunk_rows, columns, pack, pack_column))
+    return _paced(results, speed, tick_s) if realtime else results
+
+
+def _paced(results, speed, tick_s):
+    start_wall = start_time = None
+    for result in results:
+        t = result["time"]
+        if start_wall is None:
+            start_wall, start_time = time.monotonic(), t[0]
+        lo = 0
+        while lo < len(t):
+            due = start_time + (time.monotonic() - start_wall) * speed
+            hi = int(np.searchsorted(t, due, side="right"))
+            if hi > lo:
+                yield _slice(result, lo, hi)
+                lo = hi
+            if hi < len(t):
+                time.sleep(max(tick_s, (t[hi] - due) / speed))
+
+
+def _slice(result, lo, hi):
+    out = {key: result[key][lo:hi] for key in SAMPLE_KEYS}
+    t = result["time"]
+    keep = (result["soh_time"] >= t[lo]) & (result["soh_time"] <= t[hi - 1])
+    out["soh_time"] = result["soh_time"][keep]
+    out["soh_points"] = result["soh_points"][keep]
+    return out
+
+
+def backtest(path, store=None, pack_id=None, **kwargs):
+    """
+    Replays a whole recording as fast as possible and summarizes it:
+    sample count, recorded duration, wall time and speed-up, SoC error against the
+    recorded soc column (if any), the SoH trajectory (one point per soh_interval_s)
+    and, per alert rule, how often it was raised and how long it was active.
+    store: optionally append every scored sample to a TelemetryStore under pack_id
+    kwargs go to replay() (chunk_rows, columns, pack, cycle, soh_interval_s, ...)
+    """
+    kwargs.pop("realtime", None)
+    codes = SafetyEngine(n_packs=1).codes
+    bits = [np.uint32(1 << i) for i in range(len(codes))]
+
+    samples = 0
+    first_time = last_time = None
+    abs_error = sq_error = max_error = 0.0
+    scored = 0
+    raised = np.zeros(len(codes), dtype=np.int64)
+    active_s = np.zeros(len(codes))
+    previous_active = np.uint32(0)
+    soh_time, soh_points = [], []
+
+    start = time.perf_counter()
+    for result in replay(path, **kwargs):
+        t = result["time"]
+        samples += len(t)
+        if first_time is None:
+            first_time = t[0]
+
+        # 1. SoC error where the recording has its own SoC
+        error = result["soc"] - result["true_soc"]
+        valid = ~np.isnan(error)
+        if valid.any():
+            error = error[valid]
+            abs_error += np.abs(error).sum()
+            sq_error += (error ** 2).sum()
+            max_error = max(max_error, float(np.abs(error).max()))
+            scored += len(error)
+
+        # 2. Alerts: raise events, and time spent active (each interval counts for the
+        #    state at its start)
+        active = np.concatenate([[previous_active], result["active"][:-1]])
+        dt = np.diff(np.concatenate([[t[0] if last_time is None else last_time], t]))
+        for i, bit in enumerate(bits):
+            raised[i] += np.count_nonzero(result["raised"] & bit)
+            active_s[i] += dt[(active & bit) != 0].sum()
+        previous_active = result["active"][-1]
+        last_time = t[-1]
+
+        soh_time.append(result["soh_time"])
+        soh_points.append(result["soh_points"])
+        if store is not None:
+            store.append(pack_id, t, voltage=result["voltage"], current=result["current"],
+                         temperature=result["temperature"], soc=result["soc"], soh=result["soh"])
+    wall = time.perf_counter() - start
+
+    duration = float(last_time - first_time) if samples else 0.0
+    soh_time = np.concatenate(soh_time) if soh_time else np.empty(0)
+    soh_points = np.concatenate(soh_points) if soh_points else np.empty(0)
+    return {
+        "samples": samples,
+        "duration_s": duration,
+        "wall_s": wall,
+        "samples_per_s": samples / wall if wall else float("inf"),
+        "speedup": duration / wall if wall else float("inf"),
+        "soc_mae": abs_error / scored if scored else float("nan"),
+        "soc_rmse": float(np.sqrt(sq_error / scored)) if scored else float("nan"),
+        "soc_max_error": max_error if scored else float("nan"),
+        "soh_time": soh_time,
+        "soh": soh_points,
+        "alerts": {code: {"raised": int(raised[i]), "active_s": float(active_s[i])} for i, code in enumerate(codes)},
+    }
+
+
+class ReplaySource:
+    """
+    A recording as a live signal source: read(seconds) returns the next `seconds` of
+    recorded samples (dict of column arrays, possibly empty), so a consumer ticking
+    at speed_factor replays the file at that multiple of its recorded rate.
+    """
+    def __init__(self, path, chunk_rows=DEFAULT_CHUNK_ROWS, columns=None, pack=None, pack_column="pack"):
+        self.path = path
+        self._chunks = read_chunks(path, chunk_rows, columns, pack, pack_column)
+        self._pending = None
+        self._clock = None
+        self.exhausted = False
+
+    def read(self, seconds):
+        parts = []
+        while not self.exhausted:
+            if self._pending is None:
+                self._pending = next(self._chunks, None)
+                if self._pending is None:
+                    self.exhausted = True
+                    break
+                if self._clock is None:
+                    self._clock = self._pending["time"][0]
+            t = self._pending["time"]
+            end = self._clock + seconds
+            k = int(np.searchsorted(t, end, side="right"))
+            parts.append({name: values[:k] for name, values in self._pending.items()})
+            if k < len(t):
+                self._pending = {name: values[k:] for name, values in self._pending.items()}
+                break
+            self._pending = None
+        if self._clock is not None:
+            self._clock += seconds
+        if not parts:
+            return {}
+        return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a telemetry recording through the estimators")
+    parser.add_argument("path", help=".csv, .parquet or .npz recording")
+    parser.add_argument("--pack", type=int, default=None, help="pack to replay from a multi-pack file")
+    parser.add_argument("--column", action="append", default=[], metavar="NAME=COLUMN",
+                        help="file column for a signal, e.g. --column time=timestamp (repeatable)")
+    parser.add_argument("--cycle", type=float, default=500, help="battery age fed to the SoH model")
+    parser.add_argument("--soh-interval", type=float, default=300.0, help="recorded seconds between SoH evaluations")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument("--realtime", action="store_true", help="pace the replay at the recorded rate")
+    parser.add_argument("--speed", type=float, default=1.0, help="with --realtime: multiple of the recorded rate")
+    args = parser.parse_args(argv)
+
+    columns = dict(item.split("=", 1) for item in args.column)
+    kwargs = dict(chunk_rows=args.chunk_rows, columns=columns, pack=args.pack, cycle=args.cycle,
+                  soh_interval_s=args.soh_interval)
+
+    if args.realtime:
+        codes = SafetyEngine(n_packs=1).codes
+        for result in replay(args.path, realtime=True, speed=args.speed, **kwargs):
+            for i in np.flatnonzero(result["raised"]):
+                raised = [code for bit, code in enumerate(codes) if result["raised"][i] >> bit & 1]
+                print(f"{result['time'][i]:.1f}  raised {', '.join(raised)}")
+            print(f"{result['time'][-1]:.1f}  V {result['voltage'][-1]:6.1f}  I {result['current'][-1]:7.1f}  "
+                  f"SoC {result['soc'][-1]:5.1f} %  SoH {result['soh'][-1]:5.1f} %", end="\r")
+        print()
+        return
+
+    summary = backtest(args.path, **kwargs)
+    print(f"{summary['samples']:,} samples, {summary['duration_s'] / 86400:.2f} recorded days in "
+          f"{summary['wall_s']:.2f} s ({summary['samples_per_s']:,.0f} samples/s, {summary['speedup']:,.0f}x real time)")
+    if summary["soc_max_error"] == summary["soc_max_error"]:
+        print(f"SoC error vs recorded: MAE {summary['soc_mae']:.2f}  RMSE {summary['soc_rmse']:.2f}  "
+              f"max {summary['soc_max_error']:.2f} (% points)")
+    if len(summary["soh"]):
+        print(f"SoH: first {summary['soh'][0]:.1f} %  last {summary['soh'][-1]:.1f} %  min {summary['soh'].min():.1f} %")
+    for code, stats in summary["alerts"].items():
+        print(f"  {code:<16} raised {stats['raised']:>6}x  active {stats['active_s'] / 3600:>8.2f} h")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+What-if sweeps over battery age, ambient temperature, usage schedule and pack capacity.
+
+    table = run_sweep(cycles=[0, 500, 1000, 2000], ambient_c=[-5, 10, 25, 40],
+                      schedules=["commute", "taxi"], capacity_ah=[60, 80, 100])
+
+Every combination of the grids is one scenario. Scenarios are simulated together as
+the packs of one FleetSignalGenerator (batch_size per batch), and batches run on a pool
+of processes. Each batch steps
+  physics   FleetSignalGenerator with per-pack ambient temperature; usable capacity
+            follows the dashboard's aging model (cycles, temperature and current stress)
+  SoC       BatchSOCPredictor every step, against the nominal capacity as a BMS would
+  SoH       FleetFeatureWindow + SOHEvaluator every soh_interval_s
+  safety    SafetyEngine rules over every step, in blocks of block_steps
+and reduces the run to one row per scenario: final/min SoH, final SoC, hours below
+15% SoC, peak temperature, SoC estimation error and alert counts.
+Results depend only on seed and batch_size, not on the worker count.
+
+The defaults step every 5 simulated seconds with the physics' fast-response branch,
+i.e. what the dashboard shows at 5000x.
+
+Run: python -m simulation.sweep --cycles 0 500 1000 2000 --ambient -10 25 40 --days 7
+"""
+import argparse
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from simulation.batch_simulation import _schedule_steps, repeat_schedule
+from simulation.ev_signal_generator import degraded_capacity
+from simulation.fleet_signal_generator import FleetSignalGenerator
+
+# Daily usage patterns: (duration_s, mode) segments, repeated over the sweep duration
+SCHEDULES = {
+    "commute": [(7 * 3600, "STANDBY"), (3600, "DISCHARGE"), (9 * 3600, "STANDBY"),
+                (3600, "DISCHARGE"), (2 * 3600, "STANDBY"), (4 * 3600, "CHARGE")],
+    "taxi": [(3 * 3600, "DISCHARGE"), (3600, "CHARGE")],
+    "parked": [(86400, "STANDBY")],
+}
+
+GRID = ("cycle", "ambient_c", "schedule", "capacity_ah")
+LOW_SOC = 15.0
+DEFAULT_BATCH_SIZE = 2048
+
+
+def scenario_grid(cycles=(500,), ambient_c=(25.0,), schedules=("commute",), capacity_ah=(100.0,)):
+    """Cartesian product of the grids as columns: {"cycle", "ambient_c", "schedule" (index), "capacity_ah"}"""
+    rows = list(itertools.product(cycles, ambient_c, range(len(schedules)), capacity_ah))
+    columns = np.array(rows, dtype=np.float64).reshape(-1, 4).T
+    grid = dict(zip(GRID, columns))
+    grid["schedule"] = grid["schedule"].astype(np.int16)
+    return grid
+
+
+def _mode_changes(schedule_index, schedules, duration_s, dt, n_steps):
+    """{step: [(mode, pack indices), ...]} for every schedule used by the batch"""
+    changes = {}
+    for k, segments in enumerate(schedules):
+        packs = np.flatnonzero(schedule_index == k)
+        if not len(packs):
+            continue
+        mode_schedule = segments if isinstance(segments, str) else repeat_schedule(segments, duration_s)
+        for step, mode in _schedule_steps(mode_schedule, dt, n_steps).items():
+            changes.setdefault(step, []).append((mode, packs))
+    return changes
+
+
+def _run_batch(scenarios, seed_seq, schedules, config):
+    """Simulates one batch of scenarios; returns {metric: (n,) array}"""
+    # Imported in the worker: the SoH model is loaded once per process
+    from inference.soc_predictor import BatchSOCPredictor
+    from inference.soh_evaluator import SOHEvaluator
+    from safety.rule_engine import SafetyEngine
+    from utils.dvdq_features import load_chemistry_features
+    from utils.streaming_features import FleetFeatureWindow
+
+    n = len(scenarios["cycle"])
+    dt, speed = config["dt"], config["speed_factor"]
+    duration_s, block_steps = config["duration_s"], config["block_steps"]
+    n_steps = int(round(duration_s / dt))
+    soh_every = max(1, int(round(config["soh_interval_s"] / (dt * block_steps))))  # in blocks
+    cycle, nominal = scenarios["cycle"], scenarios["capacity_ah"]
+
+    car = FleetSignalGenerator(n, seed=np.random.default_rng(seed_seq), soc=config["initial_soc"],
+                               temp=scenarios["ambient_c"], ambient=scenarios["ambient_c"], start_time=0.0)
+    car.capacity_ah = nominal.copy()
+    changes = _mode_changes(scenarios["schedule"], schedules, duration_s, dt, n_steps)
+    soc_model = BatchSOCPredictor(capacity=n)
+    soh_model = SOHEvaluator(capacity=n)
+    window = FleetFeatureWindow(n, window=config["feature_window"], nominal_capacity=nominal)
+    safety = SafetyEngine(n)
+    static_features = load_chemistry_features()
+    pack_ids = list(range(n))
+
+    # 1. Per-scenario accumulators
+    low_soc_steps = np.zeros(n, dtype=np.int64)
+    peak_temp = np.full(n, -np.inf)
+    soc_abs_error = np.zeros(n)
+    raised = np.zeros((len(safety.codes), n), dtype=np.int64)
+    soh = np.full(n, np.nan)
+    min_soh = np.full(n, np.inf)
+
+    block = {name: np.empty((block_steps, n)) for name in ("time", "voltage", "temperature", "soc", "true_soc")}
+    real_dt = dt / speed
+    n_blocks = -(-n_steps // block_steps)
+    for b in range(n_blocks):
+        rows = min(block_steps, n_steps - b * block_steps)
+
+        # 2. Physics and SoC per step
+        for j in range(rows):
+            step = b * block_steps + j
+            for mode, packs in changes.get(step, ()):
+                car.set_mode(mode, packs)
+            data = car.step(real_dt, speed)
+            block["time"][j] = data["time"]
+            block["voltage"][j] = data["voltage"]
+            block["temperature"][j] = data["temperature"]
+            block["true_soc"][j] = data["soc"]
+            block["soc"][j] = soc_model.predict(pack_ids, data["voltage"], data["current"], data["temperature"],
+                                                data["time"], capacity_ah=nominal)
+            car.capacity_ah = degraded_capacity(nominal, cycle, data["temperature"], data["current"])
+        t, voltage, temperature = block["time"][:rows, 0], block["voltage"][:rows], block["temperature"][:rows]
+        soc, true_soc = block["soc"][:rows], block["true_soc"][:rows]
+
+        # 3. SoH every soh_every blocks (and on the last one)
+        window.update(voltage, car.capacity_ah)
+        if b % soh_every == 0 or b == n_blocks - 1:
+            soh = soh_model.evaluate(pack_ids, {**window.features(cycle), **static_features}, t[-1])
+            np.minimum(min_soh, soh, out=min_soh)
+
+        # 4. Safety over the block, then the block's share of the summary
+        flags = safety.evaluate(t, soc=soc, soh=soh, temperature=temperature)
+        for i in range(len(safety.codes)):
+            raised[i] += np.count_nonzero(flags["raised"] & np.uint32(1 << i), axis=0)
+        low_soc_steps += np.count_nonzero(true_soc < LOW_SOC, axis=0)
+        np.maximum(peak_temp, temperature.max(axis=0), out=peak_temp)
+        soc_abs_error += np.abs(soc - true_soc).sum(axis=0)
+
+    summary = {
+        "final_soh": soh,
+        "min_soh": min_soh,
+        "final_soc": car.soc.copy(),
+        "hours_below_15_soc": low_soc_steps * dt / 3600.0,
+        "peak_temp_c": peak_temp,
+        "soc_mae": soc_abs_error / max(n_steps, 1),
+        "alerts": raised.sum(axis=0),
+    }
+    for code, counts in zip(safety.codes, raised):
+        summary[f"alerts_{code.lower()}"] = counts
+    return summary
+
+
+def run_sweep(cycles=(500,), ambient_c=(25.0,), schedules=("commute",), capacity_ah=(100.0,),
+              duration_s=7 * 86400, dt=5.0, speed_factor=5000.0, block_steps=60, soh_interval_s=6 * 3600,
+              initial_soc=80.0, feature_window=100, n_workers=None, batch_size=DEFAULT_BATCH_SIZE, seed=0):
+    """
+    Simulates every combination of the grids for duration_s simulated seconds.
+
+    schedules: names from SCHEDULES, or a dict {name: daily (duration_s, mode) segments or a mode name}
+    n_workers: process count (None = all cores, 1 = in this process)
+
+    Returns a pandas DataFrame, one row per scenario: the grid columns (schedule by name),
+    then final_soh, min_soh, final_soc, hours_below_15_soc, peak_temp_c, soc_mae, alerts
+    (raised, all rules) and alerts_<code> per rule. df.attrs["stats"] holds wall time
+    and throughput.
+    """
+    import pandas as pd
+
+    if not isinstance(schedules, dict):
+        unknown = [name for name in schedules if name not in SCHEDULES]
+        if unknown:
+            raise ValueError(f"unknown schedule(s) {unknown}; known: {sorted(SCHEDULES)}")
+        schedules = {name: SCHEDULES[name] for name in schedules}
+    names = list(schedules)
+    grid = scenario_grid(cycles, ambient_c, names, capacity_ah)
+    n = len(grid["cycle"])
+    config = {"dt": dt, "speed_factor": speed_factor, "duration_s": duration_s, "block_steps": block_steps,
+              "soh_interval_s": soh_interval_s, "initial_soc": initial_soc, "feature_window": feature_window}
+
+    # Batch seeds depend only on (seed, batch index): the same results for any worker count
+    bounds = list(range(0, n, batch_size)) + [n]
+    seeds = np.random.SeedSequence(seed).spawn(len(bounds) - 1)
+    jobs = [({key: values[lo:hi] for key, values in grid.items()}, seeds[i], list(schedules.values()), config)
+            for i, (lo, hi) in enumerate(zip(bounds[:-1], bounds[1:]))]
+
+    start = time.perf_counter()
+    if n_workers == 1 or len(jobs) == 1:
+        results = [_run_batch(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            results = list(pool.map(_run_batch, *zip(*jobs)))
+    wall = time.perf_counter() - start
+
+    table = pd.DataFrame({
+        "cycle": grid["cycle"],
+        "ambient_c": grid["ambient_c"],
+        "schedule": np.array(names, dtype=object)[grid["schedule"]],
+        "capacity_ah": grid["capacity_ah"],
+        **{name: np.concatenate([batch[name] for batch in results]) for name in results[0]},
+    })
+    n_steps = int(round(duration_s / dt))
+    table.attrs["stats"] = {"scenarios": n, "steps": n_steps, "wall_s": wall,
+                            "scenarios_per_s": n / wall, "scenario_steps_per_s": n * n_steps / wall}
+    return table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parallel battery aging what-if sweep")
+    parser.add_argument("--cycles", type=float, nargs="+", default=[0, 500, 1000, 2000])
+    parser.add_argument("--ambient", type=float, nargs="+", default=[-10, 10, 25, 40], help="ambient °C")
+    parser.add_argument("--schedules", nargs="+", default=sorted(SCHEDULES), choices=sorted(SCHEDULES))
+    parser.add_argument("--capacity", type=float, nargs="+", default=[100.0], help="nominal capacity (Ah)")
+    parser.add_argument("--days", type=float, default=7.0)
+    parser.add_argument("--dt", type=float, default=5.0, help="simulated seconds per step")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the table to .csv or .parquet")
+    args = parser.parse_args(argv)
+
+    table = run_sweep(args.cycles, args.ambient, args.schedules, args.capacity, duration_s=args.days * 86400,
+                      dt=args.dt, n_workers=args.workers, batch_size=args.batch_size, seed=args.seed)
+    stats = table.attrs["stats"]
+    print(f"{stats['scenarios']:,} scenarios x {stats['steps']:,} steps in {stats['wall_s']:.1f} s "
+          f"({stats['scenario_steps_per_s']:,.0f} scenario-steps/s)")
+    columns = ["cycle", "ambient_c", "schedule", "capacity_ah", "final_soh", "hours_below_15_soc", "peak_temp_c", "alerts"]
+    print(table.sort_values("final_soh")[columns].to_string(index=False, float_format=lambda x: f"{x:.1f}"))
+    if args.out:
+        if args.out.lower().endswith(".parquet"):
+            table.to_parquet(args.out, index=False)
+        else:
+            table.to_csv(args.out, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Server-side downsampling of long series before they are sent to a chart.
+
+A browser line chart can only show about one point per pixel column, so shipping a
+million samples per trace costs serialization and rendering time without changing the
+picture. These helpers pick a few thousand representative samples instead:
+
+  minmax       the smallest and largest sample of every bucket; keeps every spike and
+               the exact y-range, very cheap (one reshape + argmin/argmax)
+  lttb         Largest-Triangle-Three-Buckets: one sample per bucket, the one forming
+               the largest triangle with its neighbours; best visual shape per point
+  minmax_lttb  min-max pre-selection down to a few points per output bucket, then LTTB
+               on those; LTTB quality at close to min-max cost on very long series
+
+All functions return indices into the input so several columns can share one selection.
+"""
+import numpy as np
+
+METHODS = ("minmax", "lttb", "minmax_lttb")
+
+
+def minmax_indices(y, n_buckets):
+    """Indices (sorted) of the min and max sample of each of ~n_buckets equal buckets, plus both ends"""
+    y = np.asarray(y)
+    n = len(y)
+    if n <= 2 * n_buckets + 2:
+        return np.arange(n)
+
+    size = -(-n // n_buckets)
+    full = n // size
+    blocks = y[:full * size].reshape(full, size)
+    offsets = np.arange(full) * size
+    picks = [offsets + blocks.argmin(axis=1), offsets + blocks.argmax(axis=1), [0, n - 1]]
+    if full * size < n:
+        tail = y[full * size:]
+        picks.append([full * size + tail.argmin(), full * size + tail.argmax()])
+    return np.unique(np.concatenate(picks))
+
+
+def lttb_indices(x, y, n_out):
+    """Indices (sorted) of the n_out samples chosen by Largest-Triangle-Three-Buckets"""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n <= n_out:
+        return np.arange(n)
+    if n_out < 3:
+        raise ValueError("lttb needs n_out >= 3")
+
+    # 1. Interior buckets: first and last samples are always kept
+    every = (n - 2) / (n_out - 2)
+    edges = (np.arange(n_out - 1) * every).astype(np.int64) + 1
+    edges[-1] = n - 1
+
+    # 2. Mean point of every bucket (the "third vertex" of the previous bucket's triangle)
+    counts = np.diff(edges)
+    mean_x = np.append(np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / counts, x[-1])
+    mean_y = np.append(np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / counts, y[-1])
+
+    # 3. Sequential pass: each pick depends on the previous one
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    if every <= 16:
+        # Small buckets (e.g. after min-max pre-selection): plain floats beat per-slice NumPy calls
+        xs, ys, lo_hi = x.tolist(), y.tolist(), edges.tolist()
+        mx, my = mean_x.tolist(), mean_y.tolist()
+        for i in range(n_out - 2):
+            ax, ay = xs[a], ys[a]
+            dx, dy = ax - mx[i + 1], my[i + 1] - ay
+            best = -1.0
+            for j in range(lo_hi[i], lo_hi[i + 1]):
+                area = abs(dx * (ys[j] - ay) - (ax - xs[j]) * dy)
+                if area > best:
+                    best, pick = area, j
+            a = pick
+            out[i + 1] = a
+        return out
+
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        ax, ay = x[a], y[a]
+        area = np.abs((ax - mean_x[i + 1]) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (mean_y[i + 1] - ay))
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+    return out
+
+
+def decimate_indices(x, y, n_out, method="minmax_lttb"):
+    """Indices of at most ~n_out samples of (x, y) chosen with `method` (see METHODS)"""
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}, got {method!r}")
+    n = len(y)
+    if n <= n_out:
+        return np.arange(n)
+    if method == "minmax":
+        return minmax_indices(y, n_out // 2)
+    if method == "lttb":
+        return lttb_indices(x, y, n_out)
+
+    # minmax_lttb: only worth the extra pass when the series is much longer than the output
+    if n <= 8 * n_out:
+        return lttb_indices(x, y, n_out)
+    candidates = minmax_indices(y, 2 * n_out)
+    return candidates[lttb_indices(np.asarray(x)[candidates], np.asarray(y)[candidates], n_out)]
+
+
+def decimate(x, y, n_out=2000, method="minmax_lttb"):
+    """(x, y) reduced to at most ~n_out points; short series are returned unchanged"""
+    x = np.asarray(x)
+    y = np.asarray(y)
+    index = decimate_indices(x, y, n_out, method)
+    return x[index], y[index]
@@ -1,28 +1,235 @@
-import pandas as pd
 import numpy as np
+import hashlib
+import json
 import os
+import tempfile
 
-def load_dvdq_features(path, prefix):
+# np.trapz was renamed (and later removed) in NumPy 2.x
+_trapezoid = getattr(np, "trapezoid", None) or np.trapz
+
+# Scalar (model) features per curve; peak positions/prominences are returned alongside
+FEATURE_NAMES = ["area", "peak_count", "mean", "std", "max"]
+FEATURE_VERSION = 2
+
+# Peaks must stand out by this fraction of the curve's range (rejects sensor-noise wiggles)
+DEFAULT_REL_PROMINENCE = 0.05
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "ELEKTRA_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "elektra")
+)
+
+
+def _empty_features(prefix):
+    return {f"{prefix}_dvdq_{name}": 0.0 for name in FEATURE_NAMES}
+
+
+def _read_curve_csv(path):
+    import pandas as pd
+
+    d = pd.read_csv(path)
+    voltage = d.iloc[:,0].values.astype(np.float64)
+    dvdq = d.iloc[:,1].values.astype(np.float64)
+    return voltage, dvdq
+
+
+def extract_dvdq_features_batch(voltage, dvdq, rel_prominence=DEFAULT_REL_PROMINENCE):
+    """
+    Features for a stack of dV/dQ curves in one pass.
+    voltage: (points,) shared axis or (cells, points)
+    dvdq: (cells, points)
+    Returns arrays of length cells for area/peak_count/mean/std/max, plus per-cell
+    lists of peak positions (volts) and prominences.
+    """
+    from scipy.signal import find_peaks
+
+    dvdq = np.atleast_2d(np.asarray(dvdq, dtype=np.float64))
+    voltage = np.broadcast_to(np.asarray(voltage, dtype=np.float64), dvdq.shape)
+
+    # 1. Whole-stack statistics
+    lo = dvdq.min(axis=1)
+    hi = dvdq.max(axis=1)
+    result = {
+        "area": _trapezoid(dvdq, voltage, axis=1),
+        "mean": dvdq.mean(axis=1),
+        "std": dvdq.std(axis=1),
+        "max": hi,
+    }
+
+    # 2. Peaks (find_peaks is compiled, one call per curve)
+    # A peak can't be more prominent than its height above the curve minimum, so the
+    # height gate discards noise maxima before the (costlier) prominence search.
+    min_prominence = rel_prominence * (hi - lo)
+    min_height = lo + min_prominence
+    peak_count = np.zeros(len(dvdq), dtype=np.int64)
+    positions, prominences = [], []
+    for i in range(len(dvdq)):
+        idx, props = find_peaks(dvdq[i], height=min_height[i], prominence=min_prominence[i])
+        peak_count[i] = len(idx)
+        positions.append(voltage[i, idx])
+        prominences.append(props["prominences"])
+
+    result["peak_count"] = peak_count
+    result["peak_positions"] = positions
+    result["peak_prominences"] = prominences
+    return result
+
+
+def extract_dvdq_features(voltage, dvdq, rel_prominence=DEFAULT_REL_PROMINENCE):
+    """Static chemistry features of one dV/dQ curve (unprefixed)"""
+    batch = extract_dvdq_features_batch(voltage, dvdq, rel_prominence)
+    features = {name: batch[name][0].item() for name in FEATURE_NAMES}
+    features["peak_positions"] = batch["peak_positions"][0].tolist()
+    features["peak_prominences"] = batch["peak_prominences"][0].tolist()
+    return features
+
+
+def _atomic_write(path, write, mode):
+    """write(file) into a temp file unique to this call (any process or thread), then rename it over path"""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _atomic_save(path, array):
+    _atomic_write(path, lambda f: np.save(f, array), "wb")
+
+
+def _atomic_write_json(path, obj):
+    _atomic_write(path, lambda f: json.dump(obj, f), "w")
+
+
+class DvdqCache:
     """
-    Extracts static chemistry features from dV/dQ curves.
+    On-disk cache of parsed dV/dQ curves and their extracted features.
+
+    Layout under cache_dir/dvdq:
+      paths/<sha1(abs path)>.json   -> {mtime_ns, size, hash}  (skips re-hashing unchanged files)
+      curves/<content hash>/        -> voltage.npy, dvdq.npy, features.json
+    Curves are keyed by content, so identical per-cell files share one entry, and are
+    loaded as read-only memmaps (no CSV parsing after the first load).
+    Safe to share between processes: every write goes through an atomic rename.
+    """
+    def __init__(self, cache_dir=None):
+        self.root = os.path.join(cache_dir or DEFAULT_CACHE_DIR, "dvdq")
+        os.makedirs(os.path.join(self.root, "paths"), exist_ok=True)
+        os.makedirs(os.path.join(self.root, "curves"), exist_ok=True)
+        # In-process memo: abs path -> (mtime_ns, size, content hash)
+        self._fingerprints = {}
+        self._features = {}
+
+    def fingerprint(self, path):
+        """Content hash of a curve file; re-hashed only when path/mtime/size change"""
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        key = (st.st_mtime_ns, st.st_size)
+
+        memo = self._fingerprints.get(path)
+        if memo is not None and memo[:2] == key:
+            return memo[2]
+
+        index_path = os.path.join(self.root, "paths", hashlib.sha1(path.encode()).hexdigest() + ".json")
+        try:
+            with open(index_path) as f:
+                entry = json.load(f)
+            if (entry["mtime_ns"], entry["size"]) != key:
+                entry = None
+        except (OSError, ValueError, KeyError):
+            entry = None
+
+        if entry is None:
+            with open(path, "rb") as f:
+                content_hash = hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+            entry = {"mtime_ns": key[0], "size": key[1], "hash": content_hash}
+            _atomic_write_json(index_path, entry)
+
+        self._fingerprints[path] = (key[0], key[1], entry["hash"])
+        return entry["hash"]
+
+    def _entry_dir(self, content_hash):
+        return os.path.join(self.root, "curves", content_hash)
+
+    def curve(self, path):
+        """(voltage, dvdq) as read-only memmaps, parsing the CSV only on a cache miss"""
+        entry = self._entry_dir(self.fingerprint(path))
+        voltage_path = os.path.join(entry, "voltage.npy")
+        dvdq_path = os.path.join(entry, "dvdq.npy")
+
+        if not (os.path.exists(voltage_path) and os.path.exists(dvdq_path)):
+            voltage, dvdq = _read_curve_csv(path)
+            os.makedirs(entry, exist_ok=True)
+            _atomic_save(voltage_path, voltage)
+            _atomic_save(dvdq_path, dvdq)
+
+        return np.load(voltage_path, mmap_mode="r"), np.load(dvdq_path, mmap_mode="r")
+
+    def features(self, path):
+        """Unprefixed feature dict (incl. peak positions/prominences) for a curve file"""
+        content_hash = self.fingerprint(path)
+        cached = self._features.get(content_hash)
+        if cached is not None:
+            return dict(cached)
+
+        features_path = os.path.join(self._entry_dir(content_hash), "features.json")
+        try:
+            with open(features_path) as f:
+                features = json.load(f)
+            if features.pop("version", None) != FEATURE_VERSION:
+                features = None
+        except (OSError, ValueError):
+            features = None
+
+        if features is None:
+            voltage, dvdq = self.curve(path)
+            features = extract_dvdq_features(voltage, dvdq)
+            _atomic_write_json(features_path, {**features, "version": FEATURE_VERSION})
+
+        self._features[content_hash] = features
+        return dict(features)
+
+
+_default_cache = None
+
+
+def get_default_cache():
+    """Process-wide DvdqCache under DEFAULT_CACHE_DIR (override with $ELEKTRA_CACHE_DIR)"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = DvdqCache()
+    return _default_cache
+
+
+def load_dvdq_features(path, prefix, cache=True):
+    """
+    Extracts static chemistry features from dV/dQ curves
+    (area, peak_count, mean, std, max - the columns SOHPredictor expects).
+    cache: True for the default on-disk cache, a DvdqCache instance, or False to always parse.
     """
     if not os.path.exists(path):
         # Return zeros if file not found to prevent crash
-        return {
-            f"{prefix}_dvdq_area": 0.0,
-            f"{prefix}_dvdq_mean": 0.0,
-            f"{prefix}_dvdq_std": 0.0,
-            f"{prefix}_dvdq_max": 0.0
-        }
+        return _empty_features(prefix)
 
-    d = pd.read_csv(path)
-    voltage = d.iloc[:,0].values
-    dvdq = d.iloc[:,1].values
-    
-    # Your requested logic
+    if cache is True:
+        cache = get_default_cache()
+
+    if cache:
+        features = cache.features(path)
+    else:
+        features = extract_dvdq_features(*_read_curve_csv(path))
+
+    return {f"{prefix}_dvdq_{name}": features[name] for name in FEATURE_NAMES}
+
+
+def load_chemistry_features(data_dir=None, cache=True):
+    """Anode + cathode features of the reference curves (data/dv_dq_anode.csv, data/dv_dq_cathode.csv)"""
+    if data_dir is None:
+        from utils.paths import DATA_DIR as data_dir
     return {
-        f"{prefix}_dvdq_area": np.trapz(dvdq, voltage),
-        f"{prefix}_dvdq_mean": dvdq.mean(),
-        f"{prefix}_dvdq_std": dvdq.std(),
-        f"{prefix}_dvdq_max": dvdq.max()
-    }
\ No newline at end of file
+        **load_dvdq_features(os.path.join(data_dir, "dv_dq_anode.csv"), "anode", cache),
+        **load_dvdq_features(os.path.join(data_dir, "dv_dq_cathode.csv"), "cathode", cache),
+    }
@@ -0,0 +1,342 @@
+"""
+Low-overhead timers, counters and histograms for the inference loop.
+
+    from utils.instrumentation import metrics
+
+    with metrics.timer("soh"):                   # elektra_stage_seconds{stage="soh"}
+        soh = predictor.predict(...)
+    metrics.observe("elektra_batch_size", n, stage="tick")
+    metrics.inc("elektra_samples_total", n)
+
+Everything goes into one process-wide registry (`metrics`). It is disabled unless
+ELEKTRA_METRICS=1 or metrics.enable() is called; while disabled, timer() returns a shared
+no-op context manager and observe()/inc()/set() return after one attribute check, so
+instrumented code costs a few tens of nanoseconds per call site. Hot loops can also test
+`metrics.enabled` once and skip their timing code entirely.
+
+Histograms use fixed buckets (log-spaced seconds, or powers of two for sizes), so
+recording is O(log buckets) with no allocation, and percentiles are estimated from the
+buckets the way Prometheus' histogram_quantile does. Updates are not locked: concurrent
+writers to the same series may rarely lose an increment, which is fine for monitoring.
+
+Exposed as Prometheus text (render_prometheus, start_http_server) and as a summary
+table for the dashboard (stage_summary). SamplingProfiler samples one thread's stack
+at a fixed interval for hot-path analysis without instrumenting anything.
+"""
+import bisect
+import collections
+import os
+import sys
+import threading
+import time
+
+# Seconds: 1 us .. ~134 s in factors of 2
+TIME_BUCKETS = tuple(1e-6 * 2 ** k for k in range(28))
+# Counts (batch sizes, queue depths): 1 .. 65536
+SIZE_BUCKETS = tuple(float(2 ** k) for k in range(17))
+
+STAGE_METRIC = "elektra_stage_seconds"
+
+HELP = {
+    STAGE_METRIC: ("Latency of one call of an instrumented stage", TIME_BUCKETS),
+    "elektra_batch_size": ("Items processed per batch", SIZE_BUCKETS),
+    "elektra_queue_depth": ("Items waiting in a queue when a batch is taken", SIZE_BUCKETS),
+}
+
+
+class Histogram:
+    """Cumulative-bucket histogram with sum and count"""
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimate by linear interpolation inside the bucket holding the q-th observation"""
+        if not self.count:
+            return float("nan")
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                if i == len(self.bounds):
+                    return self.bounds[-1]
+                lower = self.bounds[i - 1] if i else 0.0
+                return lower + (self.bounds[i] - lower) * (rank - seen) / n
+            seen += n
+        return self.bounds[-1]
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+def _key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+class Metrics:
+    """Registry of counters, gauges and histograms keyed by (name, labels)"""
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.started = time.time()
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._lock = threading.Lock()  # guards series creation only
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._gauges.clear()
+        self.started = time.time()
+
+    def histogram(self, name, **labels):
+        """The histogram series (created on first use; bucket layout from HELP, else TIME_BUCKETS)"""
+        key = (name, _key(labels))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = Histogram(HELP.get(name, ("", TIME_BUCKETS))[1])
+        return histogram
+
+    # --- recording (no-ops while disabled) ---
+
+    def timer(self, stage):
+        """Context manager timing one call of `stage` into elektra_stage_seconds"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self.histogram(STAGE_METRIC, stage=stage))
+
+    def timed(self, stage):
+        """Decorator version of timer(); the enabled check happens per call"""
+        def decorate(fn):
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with self.timer(stage):
+                    return fn(*args, **kwargs)
+            wrapper.__name__ = fn.__name__
+            wrapper.__doc__ = fn.__doc__
+            wrapper.__wrapped__ = fn
+            return wrapper
+        return decorate
+
+    def observe(self, name, value, **labels):
+        if self.enabled:
+            self.histogram(name, **labels).observe(value)
+
+    def observe_stage(self, stage, seconds):
+        """Records a duration measured by the caller (e.g. summed over a loop)"""
+        if self.enabled:
+            self.histogram(STAGE_METRIC, stage=stage).observe(seconds)
+
+    def inc(self, name, value=1, **labels):
+        if self.enabled:
+            key = (name, _key(labels))
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        if self.enabled:
+            self._gauges[(name, _key(labels))] = value
+
+    # --- reading ---
+
+    def stage_summary(self):
+        """Per-stage rows for the dashboard: calls, mean/p50/p90/p99 (ms), total time and share"""
+        rows = []
+        for (name, labels), histogram in list(self._histograms.items()):
+            if name != STAGE_METRIC or not histogram.count:
+                continue
+            rows.append({
+                "stage": dict(labels).get("stage", ""),
+                "calls": histogram.count,
+                "mean_ms": histogram.sum / histogram.count * 1e3,
+                "p50_ms": histogram.quantile(0.50) * 1e3,
+                "p90_ms": histogram.quantile(0.90) * 1e3,
+                "p99_ms": histogram.quantile(0.99) * 1e3,
+                "total_s": histogram.sum,
+            })
+        total = sum(row["total_s"] for row in rows) or 1.0
+        for row in rows:
+            row["share"] = row["total_s"] / total
+        return sorted(rows, key=lambda row: -row["total_s"])
+
+    def render_prometheus(self):
+        """All series in the Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        families = collections.defaultdict(list)
+        for (name, labels), histogram in list(self._histograms.items()):
+            families[name].append((labels, histogram))
+
+        for name in sorted(families):
+            lines.append(f"# HELP {name} {HELP.get(name, (name,))[0]}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in families[name]:
+                cumulative = 0
+                for bound, n in zip(histogram.bounds + (float("inf"),), histogram.counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else f"{bound:.9g}"
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum:.9g}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+        for kind, series in (("counter", self._counters), ("gauge", self._gauges)):
+            by_name = collections.defaultdict(list)
+            for (name, labels), value in list(series.items()):
+                by_name[name].append((labels, value))
+            for name in sorted(by_name):
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in by_name[name]:
+                    lines.append(f"{name}{_format_labels(labels)} {value:.9g}")
+
+        lines.append("# TYPE elektra_uptime_seconds gauge")
+        lines.append(f"elektra_uptime_seconds {time.time() - self.started:.3f}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+# Process-wide registry
+metrics = Metrics(enabled=os.environ.get("ELEKTRA_METRICS", "") == "1")
+
+
+def start_http_server(port, addr="127.0.0.1", registry=None):
+    """Serves GET /metrics (Prometheus text) from a daemon thread; returns the server"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    registry = registry or metrics
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((addr, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stack of one thread every `interval` seconds from a background
+    thread (sys._current_frames), so the profiled code runs uninstrumented. The sampler
+    needs the GIL to take a sample, so code that releases it (large NumPy calls, I/O) is
+    over-represented next to pure-Python loops; compare with the stage timers when the
+    two disagree.
+
+        profiler = SamplingProfiler(worker_thread).start()
+        ...
+        profiler.stop()
+        print(profiler.top())            # hottest functions (self and cumulative samples)
+        profiler.collapsed()             # folded stacks for flamegraph.pl / speedscope
+    """
+    def __init__(self, thread=None, interval=0.005, max_depth=64):
+        self.thread_id = (thread or threading.main_thread()).ident
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+    def run_for(self, seconds):
+        """Samples for `seconds` (blocking) and returns self"""
+        self.start()
+        time.sleep(seconds)
+        return self.stop()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        """One 'root;caller;...;leaf count' line per distinct stack"""
+        return "\n".join(f"{';'.join(stack)} {n}" for stack, n in self.stacks.most_common())
+
+    def top(self, n=15):
+        """[(function, self_samples, cumulative_samples)] sorted by self samples"""
+        own = collections.Counter()
+        cumulative = collections.Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for function in set(stack):
+                cumulative[function] += count
+        return [(function, count, cumulative[function]) for function, count in own.most_common(n)]
@@ -0,0 +1,149 @@
+"""
+Open-circuit voltage <-> SoC lookup tables per cell chemistry and temperature, shared by
+the simulators (SoC -> OCV) and the SoC estimators (OCV -> SoC).
+
+    table = get_ocv_table("nmc")               # built once per process
+    ocv = table.ocv(soc, temperature)          # pack volts (SoC in %, any array shapes)
+    soc = table.soc(voltage, temperature)      # the inverse, clamped to 0 .. 100 %
+
+Each chemistry is a cell OCV curve u(s) plus an entropic term du/dT(s) * (T - 25 °C),
+tabulated on a SoC x temperature grid (strictly increasing in SoC at every temperature).
+The inverse is resampled once, with searchsorted (np.interp), onto a uniform cell
+voltage grid, so both directions are plain index arithmetic on a uniform grid plus
+linear interpolation in the value and in temperature (clamped to the grid): a few
+passes over the batch whatever its size, with no search or root finding per pack.
+Building both takes well under a millisecond, less than reading them back from a file,
+so tables are kept per process rather than cached on disk.
+"""
+import functools
+
+import numpy as np
+
+SOC_POINTS = 1001                             # 0.1 % steps
+VOLTAGE_POINTS = 8192                         # ~0.1 mV steps (inverse within 0.005 % of the SoC table's)
+TEMPERATURES = np.arange(-20.0, 61.0, 5.0)    # °C
+REFERENCE_TEMPERATURE = 25.0
+CELLS_IN_SERIES = 96
+
+
+def _nmc(s):
+    # The simulator's reference curve (simulation.ev_signal_generator.pack_ocv) per cell
+    return 3.0 + (70 * s + 45 * s**3) / 96
+
+
+def _nca(s):
+    return 3.0 + 1.05 * s - 0.35 * s**2 + 0.5 * s**3
+
+
+def _lfp(s):
+    # Flat plateau between a steep knee at each end
+    return 2.9 + 0.3 * (1 - np.exp(-s / 0.03)) + 0.08 * s + 0.3 * np.exp((s - 1) / 0.02)
+
+
+# name -> (cell OCV in V, entropic coefficient du/dT in V/K), both functions of SoC in 0 .. 1.
+# The reference curve has no temperature term, like the simulator's pack_ocv.
+CHEMISTRIES = {
+    "nmc": (_nmc, lambda s: 0.0 * s),
+    "nca": (_nca, lambda s: (-0.1 + 0.15 * s) * 1e-3),
+    "lfp": (_lfp, lambda s: (-0.05 + 0.1 * s) * 1e-3),
+}
+
+
+def build_table(chemistry):
+    """(SOC_POINTS,) SoC grid in %, (temperatures, SOC_POINTS) cell OCV in V"""
+    if chemistry not in CHEMISTRIES:
+        raise ValueError(f"unknown chemistry {chemistry!r}; expected one of {sorted(CHEMISTRIES)}")
+    curve, dudt = CHEMISTRIES[chemistry]
+    soc = np.linspace(0.0, 100.0, SOC_POINTS)
+    s = soc / 100.0
+    ocv = curve(s)[None, :] + dudt(s)[None, :] * (TEMPERATURES[:, None] - REFERENCE_TEMPERATURE)
+    if not (np.diff(ocv, axis=1) > 0).all():
+        raise ValueError(f"OCV curve of {chemistry!r} is not strictly increasing at every temperature")
+    return soc, ocv
+
+
+def _is_scalar(value):
+    return isinstance(value, (int, float))  # np.float64 included
+
+
+class OCVTable:
+    """Pack OCV <-> SoC for one chemistry (see the module docstring)"""
+    def __init__(self, chemistry="nmc", cells=CELLS_IN_SERIES):
+        self.chemistry = chemistry
+        self.cells = cells
+        self.temperatures = TEMPERATURES
+        self.soc_grid, self.cell_ocv = build_table(chemistry)
+        self.soc_step = float(self.soc_grid[1] - self.soc_grid[0])
+
+        # Inverse: SoC at evenly spaced cell voltages, per temperature row (clamped to 0 / 100 %)
+        self.voltage_grid = np.linspace(self.cell_ocv.min(), self.cell_ocv.max(), VOLTAGE_POINTS)
+        self.voltage_step = float(self.voltage_grid[1] - self.voltage_grid[0])
+        self.cell_soc = np.stack([np.interp(self.voltage_grid, row, self.soc_grid) for row in self.cell_ocv])
+
+        # Plain floats for the scalar path
+        self._grid = (float(TEMPERATURES[0]), float(TEMPERATURES[-1]), float(TEMPERATURES[1] - TEMPERATURES[0]),
+                      float(self.voltage_grid[0]))
+
+    def _lookup(self, table, position, temperature):
+        """Bilinear interpolation of `table` (temperatures, points) at grid positions and temperatures"""
+        points = table.shape[1]
+        t_first, t_last, t_step, _ = self._grid
+        row_position = (np.clip(np.asarray(temperature, dtype=np.float64), t_first, t_last) - t_first) / t_step
+        row = np.minimum(row_position.astype(np.intp), len(self.temperatures) - 2)
+        weight = row_position - row
+        # fmin / fmax keep NaN out of the index; clip keeps it in the fraction (NaN in, NaN out)
+        column = np.minimum(np.fmin(np.fmax(position, 0), points - 1).astype(np.intp), points - 2)
+        fraction = np.clip(position, 0, points - 1) - column
+
+        flat = table.ravel()
+        index = row * points + column
+        lower = flat[index]
+        lower = lower + fraction * (flat[index + 1] - lower)
+        index = index + points
+        upper = flat[index]
+        upper = upper + fraction * (flat[index + 1] - upper)
+        return lower + weight * (upper - lower)
+
+    def _lookup_scalar(self, table, position, temperature):
+        """_lookup for one value in plain Python (~10x cheaper than the array path for a single sample)"""
+        if position != position or temperature != temperature:
+            return float("nan")
+        points = table.shape[1]
+        t_first, t_last, t_step, _ = self._grid
+        row_position = (min(max(temperature, t_first), t_last) - t_first) / t_step
+        row = min(int(row_position), len(self.temperatures) - 2)
+        weight = row_position - row
+        position = min(max(position, 0.0), points - 1.0)
+        column = min(int(position), points - 2)
+        fraction = position - column
+
+        item = table.item
+        lower = item(row, column)
+        lower = lower + fraction * (item(row, column + 1) - lower)
+        upper = item(row + 1, column)
+        upper = upper + fraction * (item(row + 1, column + 1) - upper)
+        return lower + weight * (upper - lower)
+
+    def ocv(self, soc_pct, temperature=REFERENCE_TEMPERATURE):
+        """Pack OCV in V at SoC (%) and temperature (°C); scalars give a float"""
+        if _is_scalar(soc_pct) and _is_scalar(temperature):
+            return self.cells * self._lookup_scalar(self.cell_ocv, soc_pct / self.soc_step, float(temperature))
+        position = np.asarray(soc_pct, dtype=np.float64) / self.soc_step
+        ocv = self.cells * self._lookup(self.cell_ocv, position, temperature)
+        return float(ocv) if ocv.ndim == 0 else ocv
+
+    def soc(self, voltage, temperature=REFERENCE_TEMPERATURE):
+        """SoC (%) whose OCV at `temperature` is the pack voltage (the inverse of ocv()); scalars give a float"""
+        v_first = self._grid[3]
+        if _is_scalar(voltage) and _is_scalar(temperature):
+            position = (voltage / self.cells - v_first) / self.voltage_step
+            return self._lookup_scalar(self.cell_soc, position, float(temperature))
+        position = (np.asarray(voltage, dtype=np.float64) / self.cells - v_first) / self.voltage_step
+        soc = self._lookup(self.cell_soc, position, temperature)
+        return float(soc) if soc.ndim == 0 else soc
+
+
+@functools.lru_cache(maxsize=None)
+def get_ocv_table(chemistry="nmc", cells=CELLS_IN_SERIES):
+    """Process-wide OCVTable per chemistry and series cell count (shared by every simulator and estimator)"""
+    return OCVTable(chemistry, cells)
@@ -0,0 +1,14 @@
+import os
+
+# Repo root (the directory holding app/, inference/, models/, data/ ...)
+PACKAGE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DATA_DIR = os.path.join(PACKAGE_ROOT, "data")
+MODELS_DIR = os.path.join(PACKAGE_ROOT, "models")
+
+
+def resolve_path(path):
+    """Relative paths are taken relative to the package root, not the working directory"""
+    path = os.path.expanduser(path)
+    if os.path.isabs(path):
+        return path
+    return os.path.join(PACKAGE_ROOT, path)
@@ -0,0 +1,59 @@
+"""
+Vectorized first-order recurrences (prefix scans) for time series that would otherwise
+be stepped one sample at a time in Python.
+
+    linear_recurrence(a, b, x0)       x[t] = a[t] * x[t-1] + b[t]
+    clipped_cumsum(x0, d, lo, hi)     x[t] = clip(x[t-1] + d[t], lo, hi)
+"""
+import numpy as np
+
+
+def linear_recurrence(a, b, x0, block=256):
+    """
+    x[t] = a[t] * x[t-1] + b[t] with x[-1] = x0, for 0 < a <= 1 (a may be a scalar).
+    Solved in blocks: inside a block x is a closed-form cumulative product/sum (the
+    products stay far from underflow), then the block start values are chained.
+    """
+    n = len(b)
+    pad = -n % block
+    a = np.concatenate([np.broadcast_to(a, (n,)), np.ones(pad)]).reshape(-1, block)
+    b = np.concatenate([b, np.zeros(pad)]).reshape(-1, block)
+
+    p = np.cumprod(a, axis=1)
+    local = p * np.cumsum(b / p, axis=1)   # solution of each block from a zero start
+
+    starts = np.empty(len(a))
+    x = float(x0)
+    for i, (p_end, local_end) in enumerate(zip(p[:, -1].tolist(), local[:, -1].tolist())):
+        starts[i] = x
+        x = p_end * x + local_end
+    return (p * starts[:, None] + local).reshape(-1)[:n]
+
+
+def clipped_cumsum(x0, d, lo, hi):
+    """
+    x[t] = clip(x[t-1] + d[t], lo, hi) with x[-1] = x0 (a bounded integrator, e.g. SoC).
+    While the running sum stays inside the bounds this is a plain cumulative sum, summed
+    in the same order as the sequential loop. Otherwise each step is the map
+    x -> clip(x + d, lo, hi); composing two such maps gives another one,
+        (a1, l1, h1) then (a2, l2, h2) = (a1 + a2, clip(l1 + a2, l2, h2), clip(h1 + a2, l2, h2)),
+    so the prefix compositions come from a log2(n)-pass scan and are applied to x0.
+    """
+    d = np.asarray(d, dtype=np.float64)
+    x = np.cumsum(np.concatenate([[x0], d]))[1:]
+    if not len(x) or (x.min() >= lo and x.max() <= hi):
+        return x
+
+    add = d.copy()
+    low = np.full(len(d), float(lo))
+    high = np.full(len(d), float(hi))
+    shift = 1
+    while shift < len(d):
+        # prefix[t] = prefix[t - shift] then prefix[t]
+        a2, l2, h2 = add[shift:], low[shift:], high[shift:]
+        low_new = np.clip(low[:-shift] + a2, l2, h2)
+        high_new = np.clip(high[:-shift] + a2, l2, h2)
+        add[shift:] = add[:-shift] + a2
+        low[shift:], high[shift:] = low_new, high_new
+        shift *= 2
+    return np.clip(x0 + add, low, high)
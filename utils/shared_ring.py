@@ -0,0 +1,106 @@
+import numpy as np
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+_ALIGN = 64
+END_OF_STREAM = -1
+
+
+class SharedRing:
+    """
+    Single-producer / single-consumer ring of fixed-shape blocks in shared memory.
+
+    fields: dict name -> (shape, dtype); every slot holds one array per field.
+    Block data never goes through a pipe: the producer fills a slot in place and the
+    two semaphores only hand slot ownership back and forth (free -> filled -> free).
+    Each slot also carries a row count, so a short final block or END_OF_STREAM can
+    be signalled through the ring itself.
+
+    Create it in the parent, pass it to the producer and consumer processes as a
+    Process argument (it re-attaches by name under spawn), close() it everywhere and
+    unlink() it once in the parent.
+    """
+    def __init__(self, slots, fields, ctx=None):
+        ctx = ctx or mp.get_context()
+        self.slots = int(slots)
+        self.fields = {name: (tuple(shape), np.dtype(dtype).str) for name, (shape, dtype) in fields.items()}
+
+        self._layout, size = self._plan(self.slots, self.fields)
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.name = self.shm.name
+        self.free = ctx.Semaphore(self.slots)
+        self.filled = ctx.Semaphore(0)
+        self._attach()
+
+    @staticmethod
+    def _plan(slots, fields):
+        """Byte offset of every array: the int64 row counts first, then one region per field"""
+        layout = {"__rows__": (0, (slots,), "<i8")}
+        offset = slots * 8
+        for name, (shape, dtype) in fields.items():
+            offset = -(-offset // _ALIGN) * _ALIGN
+            layout[name] = (offset, (slots,) + shape, dtype)
+            offset += slots * int(np.prod(shape, dtype=np.int64)) * np.dtype(dtype).itemsize
+        return layout, max(offset, 1)
+
+    def _attach(self):
+        self.arrays = {
+            name: np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset)
+            for name, (offset, shape, dtype) in self._layout.items()
+        }
+        self._rows = self.arrays.pop("__rows__")
+        self._write_pos = 0
+        self._read_pos = 0
+
+    def __getstate__(self):
+        return {"slots": self.slots, "fields": self.fields, "name": self.name,
+                "free": self.free, "filled": self.filled}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._layout, _ = self._plan(self.slots, self.fields)
+        self.shm = shared_memory.SharedMemory(name=self.name)
+        self._attach()
+
+    # --- producer side ---
+    def acquire_write(self, timeout=None):
+        """Blocks until a slot is free; returns {field: array view} of that slot"""
+        if not self.free.acquire(timeout=timeout):
+            raise TimeoutError("no free slot in the ring")
+        slot = self._write_pos % self.slots
+        return {name: array[slot] for name, array in self.arrays.items()}
+
+    def commit_write(self, rows):
+        """Publishes the slot returned by acquire_write with `rows` valid rows"""
+        self._rows[self._write_pos % self.slots] = rows
+        self._write_pos += 1
+        self.filled.release()
+
+    def close_stream(self, timeout=None):
+        """Tells the consumer no more blocks will come"""
+        self.acquire_write(timeout)
+        self.commit_write(END_OF_STREAM)
+
+    # --- consumer side ---
+    def acquire_read(self, timeout=None):
+        """
+        Blocks until a block is published; returns (rows, {field: array view}).
+        rows == END_OF_STREAM once the producer has closed the stream.
+        """
+        if not self.filled.acquire(timeout=timeout):
+            raise TimeoutError("no block published to the ring")
+        slot = self._read_pos % self.slots
+        return int(self._rows[slot]), {name: array[slot] for name, array in self.arrays.items()}
+
+    def release_read(self):
+        """Hands the slot returned by acquire_read back to the producer"""
+        self._read_pos += 1
+        self.free.release()
+
+    def close(self):
+        self.arrays = {}
+        self._rows = None
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
@@ -0,0 +1,250 @@
+"""
+Struct-of-arrays per-pack state shared by the fleet components, with checkpoint /
+restore through a memory-mapped file.
+
+    store = FleetStateStore()
+    soc = BatchSOCPredictor(store=store)       # components register their fields
+    soh = SOHEvaluator(store=store)
+    ...
+    store.checkpoint("state/fleet.state")
+    store = FleetStateStore.restore("state/fleet.state")   # rebuild the components on it
+
+Every field is one array with a row per pack slot, shape (capacity, *field shape).
+Pack ids (any hashable; ints or strings to be checkpointed) map to slots through a
+dict, so a lookup is O(1). A new pack takes the next slot with every field's default;
+a removed pack is replaced by the last one, so slots stay dense. Growing reallocates
+the fields: fetch a field again after slots() may have added packs.
+
+Checkpoint file: magic, header length, a JSON header (fields with dtype, shape,
+default and offset; pack-id dtype; meta), then the first len(store) rows of the pack
+ids and of every field (data page-aligned, sections 64-byte aligned). It is written
+through np.memmap into a temporary file and renamed over the target, so a crash never
+leaves a torn checkpoint.
+restore() maps the file and copies the rows back; copy=False keeps copy-on-write maps
+instead, so restoring is instant and pages are read on first touch.
+"""
+import json
+import mmap
+import os
+
+import numpy as np
+
+MAGIC = b"EKSTATE1"
+_ALIGN = mmap.PAGESIZE
+
+
+def _aligned(offset, align=_ALIGN):
+    return -(-offset // align) * align
+
+
+class FleetStateStore:
+    """Pack-id index + one array per registered field (see the module docstring)"""
+    def __init__(self, capacity=1024):
+        self.capacity = int(capacity)
+        self.index = {}
+        self.pack_ids = []
+        self.fields = {}
+        self.defaults = {}
+        # JSON-serializable scalars saved with the checkpoint (clocks, RNG states, ...)
+        self.meta = {}
+        # Called with the store right before a checkpoint is written (to sync meta)
+        self.checkpoint_hooks = []
+
+        # Last resolved id sequence -> slots (packs usually arrive in the same order every tick)
+        self._last_ids = None
+        self._last_slots = None
+
+    def __len__(self):
+        return len(self.pack_ids)
+
+    def __contains__(self, pack_id):
+        return pack_id in self.index
+
+    def __getitem__(self, name):
+        return self.fields[name]
+
+    def add_field(self, name, shape=(), dtype=np.float64, default=np.nan):
+        """
+        Registers a per-pack field and returns its array. Registering an existing field
+        again (a restored store, or components sharing one) keeps its contents; dtype and
+        shape must match, and the new default applies to packs added from now on.
+        """
+        shape, dtype = tuple(shape), np.dtype(dtype)
+        default = np.asarray(default, dtype=dtype).item()  # plain Python scalar (saved as JSON)
+        array = self.fields.get(name)
+        if array is not None:
+            if array.dtype != dtype or array.shape[1:] != shape:
+                raise ValueError(f"field {name!r} exists as {array.dtype}{list(array.shape[1:])}, "
+                                 f"not {dtype}{list(shape)}")
+        else:
+            array = self.fields[name] = np.full((self.capacity,) + shape, default, dtype=dtype)
+        self.defaults[name] = default
+        return array
+
+    def _grow(self, size):
+        if size <= self.capacity:
+            return
+        extra = max(size, 2 * self.capacity) - self.capacity
+        for name, array in self.fields.items():
+            fresh = np.full((extra,) + array.shape[1:], self.defaults[name], dtype=array.dtype)
+            self.fields[name] = np.concatenate([array, fresh])
+        self.capacity += extra
+
+    def slot(self, pack_id):
+        """Slot of one pack, or None if it is unknown"""
+        return self.index.get(pack_id)
+
+    def lookup(self, pack_ids):
+        """Slots of known packs, -1 for unknown ones (nothing is added)"""
+        return np.fromiter((self.index.get(pack_id, -1) for pack_id in pack_ids), dtype=np.intp)
+
+    def slots(self, pack_ids):
+        """Maps pack ids to slots, adding packs seen for the first time (with default state)"""
+        pack_ids = list(pack_ids)
+        if pack_ids == self._last_ids:
+            return self._last_slots
+
+        slots = np.empty(len(pack_ids), dtype=np.intp)
+        added = []
+        for i, pack_id in enumerate(pack_ids):
+            slot = self.index.get(pack_id)
+            if slot is None:
+                slot = len(self.pack_ids)
+                self.index[pack_id] = slot
+                self.pack_ids.append(pack_id)
+                added.append(slot)
+            slots[i] = slot
+        if added:
+            # Slots freed by remove() still hold the old pack's state
+            self._grow(len(self.pack_ids))
+            for name, array in self.fields.items():
+                array[added] = self.defaults[name]
+
+        self._last_ids = pack_ids
+        self._last_slots = slots
+        return slots
+
+    def remove(self, pack_ids):
+        """Drops packs from every field (swap-with-last, so slots stay dense)"""
+        for pack_id in pack_ids:
+            slot = self.index.pop(pack_id, None)
+            if slot is None:
+                continue
+            last = len(self.pack_ids) - 1
+            if slot != last:
+                moved_id = self.pack_ids[last]
+                self.pack_ids[slot] = moved_id
+                self.index[moved_id] = slot
+                for array in self.fields.values():
+                    array[slot] = array[last]
+            self.pack_ids.pop()
+        self._last_ids = None
+        self._last_slots = None
+
+    def row(self, pack_id):
+        """Every field's value for one pack (for inspection)"""
+        slot = self.index[pack_id]
+        return {name: array[slot] for name, array in self.fields.items()}
+
+    def nbytes(self):
+        """Bytes of field data held for the current packs"""
+        return sum(array[:len(self)].nbytes for array in self.fields.values())
+
+    # --- checkpoint / restore ---
+
+    def _ids_array(self):
+        if not self.pack_ids:
+            return np.empty(0, dtype=np.int64)
+        ids = np.asarray(self.pack_ids)
+        if ids.dtype.kind in "iu":
+            return ids.astype(np.int64)
+        if ids.dtype.kind == "U":
+            return ids
+        raise ValueError("only int or str pack ids can be checkpointed")
+
+    def checkpoint(self, path):
+        """Writes every pack's state to `path` (atomically); returns the file size in bytes"""
+        for hook in self.checkpoint_hooks:
+            hook(self)
+        n = len(self)
+        sections = [("__ids__", self._ids_array())] + [(name, array[:n]) for name, array in self.fields.items()]
+
+        # 1. Layout: sections at aligned offsets from the (page-aligned) start of the data
+        entries, offset = [], 0
+        for name, array in sections:
+            offset = _aligned(offset, 64)
+            entries.append({"name": name, "dtype": array.dtype.str, "shape": list(array.shape[1:]),
+                            "default": None if name == "__ids__" else self.defaults[name], "offset": offset})
+            offset += array.nbytes
+        header = json.dumps({"version": 1, "packs": n, "sections": entries, "meta": self.meta}).encode()
+        data_start = _aligned(len(MAGIC) + 8 + len(header))
+        size = data_start + offset
+
+        # 2. Header, then the arrays through memory maps of the temporary file
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(MAGIC + len(header).to_bytes(8, "little") + header)
+            f.truncate(size)
+        for entry, (_, array) in zip(entries, sections):
+            if array.nbytes:
+                target = np.memmap(tmp, dtype=array.dtype, mode="r+", offset=data_start + entry["offset"],
+                                   shape=array.shape)
+                target[...] = array
+                target.flush()
+                del target
+        os.replace(tmp, path)
+        return size
+
+    @classmethod
+    def restore(cls, path, copy=True, capacity=None):
+        """
+        Store with the packs and fields of a checkpoint.
+        copy=True: fields are read into memory (at least `capacity` rows)
+        copy=False: fields stay copy-on-write maps of the file until the store grows
+        """
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path}: not a fleet state checkpoint")
+            header_length = int.from_bytes(f.read(8), "little")
+            header = json.loads(f.read(header_length))
+        data_start = _aligned(len(MAGIC) + 8 + header_length)
+        n = header["packs"]
+
+        store = cls(capacity=max(n, capacity or 0) if copy else n)
+        store.meta = header["meta"]
+        for entry in header["sections"]:
+            dtype, shape = np.dtype(entry["dtype"]), (n,) + tuple(entry["shape"])
+            if n and dtype.itemsize and np.prod(shape[1:], dtype=np.int64):
+                mapped = np.memmap(path, dtype=dtype, mode="r" if copy else "c",
+                                   offset=data_start + entry["offset"], shape=shape)
+            else:
+                mapped = np.empty(shape, dtype=dtype)
+            if entry["name"] == "__ids__":
+                store.pack_ids = mapped.tolist()
+                store.index = dict(zip(store.pack_ids, range(n)))
+                continue
+            if copy:
+                array = np.full((store.capacity,) + shape[1:], entry["default"], dtype=dtype)
+                array[:n] = mapped
+            else:
+                array = mapped
+            store.fields[entry["name"]] = array
+            store.defaults[entry["name"]] = entry["default"]
+        return store
+
+
+class StoreField:
+    """
+    Attribute backed by a store field, for components whose pack i is slot i:
+    reads return the field's first obj.n_packs rows, assignments copy into them.
+    """
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        return obj.store.fields[self.name][:obj.n_packs]
+
+    def __set__(self, obj, value):
+        obj.store.fields[self.name][:obj.n_packs] = value
@@ -0,0 +1,292 @@
+import numpy as np
+from collections import deque
+
+
+class RingBuffer:
+    """
+    Fixed-size, array-backed history with one column per signal.
+    Appending is O(1); column() returns the samples oldest -> newest.
+    """
+    def __init__(self, size, columns, dtype=np.float64):
+        self.size = int(size)
+        self.columns = list(columns)
+        self.data = np.zeros((len(self.columns), self.size), dtype=dtype)
+        self._col = {name: i for i, name in enumerate(self.columns)}
+        self.head = 0    # next write position
+        self.count = 0   # samples written in total
+
+    def __len__(self):
+        return min(self.count, self.size)
+
+    def append(self, row):
+        """row: dict of column -> value (missing columns are stored as 0)"""
+        for name, i in self._col.items():
+            self.data[i, self.head] = row.get(name, 0)
+        self.head = (self.head + 1) % self.size
+        self.count += 1
+
+    def extend(self, rows):
+        """rows: dict of column -> (k,) array, appended in order (missing columns are stored as 0)"""
+        k = len(next(iter(rows.values())))
+        if k > self.size:
+            rows = {name: values[-self.size:] for name, values in rows.items()}
+            self.head = (self.head + k - self.size) % self.size
+            self.count += k - self.size
+            k = self.size
+        positions = (self.head + np.arange(k)) % self.size
+        for name, i in self._col.items():
+            self.data[i, positions] = rows.get(name, 0)
+        self.head = (self.head + k) % self.size
+        self.count += k
+
+    def set_last(self, name, value):
+        self.data[self._col[name], (self.head - 1) % self.size] = value
+
+    def last(self, name, lag=0):
+        """Value written `lag` samples before the newest one"""
+        return self.data[self._col[name], (self.head - 1 - lag) % self.size]
+
+    def column(self, name, out=None):
+        """Copy of one column, oldest -> newest (into `out`, at least len(self) long, if given)"""
+        values = self.data[self._col[name]]
+        n = len(self)
+        if out is None:
+            out = np.empty(n, dtype=values.dtype)
+        out = out[:n]
+        if self.count < self.size:
+            out[...] = values[:n]
+        else:
+            np.concatenate([values[self.head:], values[:self.head]], out=out)
+        return out
+
+
+class _SlidingMoments:
+    """Mean / sample std over the last `length` values of a stream (sliding Welford)"""
+    def __init__(self, length):
+        self.length = length
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self._updates = 0
+
+    def update(self, x, evicted=None):
+        if evicted is None:
+            self.n += 1
+            delta = x - self.mean
+            self.mean += delta / self.n
+            self.m2 += delta * (x - self.mean)
+        else:
+            old_mean = self.mean
+            self.mean += (x - evicted) / self.n
+            self.m2 += (x - evicted) * (x - self.mean + evicted - old_mean)
+        self._updates += 1
+
+    def reset(self, values):
+        """Exact recompute from the window contents (bounds floating-point drift)"""
+        self.n = len(values)
+        self.mean = float(np.mean(values)) if self.n else 0.0
+        self.m2 = float(np.sum((values - self.mean) ** 2)) if self.n else 0.0
+        self._updates = 0
+
+    def std(self):
+        """Sample std (ddof=1), NaN until the window is full - like pandas rolling(length).std()"""
+        if self.n < self.length:
+            return np.nan
+        return float(np.sqrt(max(self.m2, 0.0) / (self.n - 1)))
+
+
+class StreamingFeatureEngine:
+    """
+    O(1)-per-sample version of the dashboard's dynamic SOH features.
+    Over the last `window` voltage samples it tracks mean/min/max, the std of the last
+    `std_window` samples and the mean of the rolling `rolling_window` std, and it keeps
+    the capacity delta between consecutive samples.
+    """
+    def __init__(self, window=100, std_window=5, rolling_window=10, nominal_capacity=100.0):
+        if not (std_window <= window and rolling_window <= window):
+            raise ValueError("std_window and rolling_window must fit inside window")
+
+        self.window = window
+        self.nominal_capacity = nominal_capacity
+        self.voltage = np.zeros(window)
+        self.count = 0
+
+        self._mean = _SlidingMoments(window)
+        self._std = _SlidingMoments(std_window)
+        self._roll = _SlidingMoments(rolling_window)
+
+        # Rolling std values whose windows lie inside the history window
+        self._roll_stds = np.zeros(window - rolling_window + 1)
+        self._roll_count = 0
+        self._roll_sum = 0.0
+
+        # Monotonic deques of (sample index, voltage) for window min/max
+        self._min = deque()
+        self._max = deque()
+
+        self.capacity_ah = nominal_capacity
+        self.delta_capacity = 0.0
+
+    def _evicted(self, length):
+        """Sample that leaves a `length`-long window when the next one arrives"""
+        if self.count < length:
+            return None
+        return self.voltage[(self.count - length) % self.window]
+
+    def update(self, voltage, capacity_ah):
+        voltage = float(voltage)
+        i = self.count
+
+        # 1. Sliding moments (read evictions before the ring slot is overwritten)
+        for moments in (self._mean, self._std, self._roll):
+            moments.update(voltage, self._evicted(moments.length))
+        self.voltage[i % self.window] = voltage
+        self.count += 1
+
+        # 2. Window min/max
+        while self._min and self._min[-1][1] >= voltage:
+            self._min.pop()
+        self._min.append((i, voltage))
+        while self._max and self._max[-1][1] <= voltage:
+            self._max.pop()
+        self._max.append((i, voltage))
+        oldest = self.count - self.window
+        if self._min[0][0] < oldest:
+            self._min.popleft()
+        if self._max[0][0] < oldest:
+            self._max.popleft()
+
+        # 3. Periodic exact recompute keeps the running sums from drifting
+        for moments in (self._mean, self._std, self._roll):
+            if moments._updates >= 4 * self.window:
+                moments.reset(self._last(moments.n))
+
+        # 4. Mean of the rolling std over the history window
+        roll_std = self._roll.std()
+        if not np.isnan(roll_std):
+            slot = self._roll_count % len(self._roll_stds)
+            if self._roll_count >= len(self._roll_stds):
+                self._roll_sum -= self._roll_stds[slot]
+            self._roll_stds[slot] = roll_std
+            self._roll_sum += roll_std
+            self._roll_count += 1
+            if self._roll_count % (4 * self.window) == 0:
+                self._roll_sum = float(self._roll_stds[:min(self._roll_count, len(self._roll_stds))].sum())
+
+        # 5. Capacity delta (rate of change); history starts at nominal capacity
+        capacity_ah = float(capacity_ah)
+        self.delta_capacity = (capacity_ah - self.capacity_ah) / capacity_ah
+        self.capacity_ah = capacity_ah
+
+    def _last(self, n):
+        idx = np.arange(self.count - n, self.count) % self.window
+        return self.voltage[idx]
+
+    def features(self, cycle):
+        """Dynamic feature dict in the shape SOHPredictor.predict expects"""
+        current_std = self._std.std()
+        n_roll = min(self._roll_count, len(self._roll_stds))
+        roll_std = self._roll_sum / n_roll if n_roll else 0.0
+        delta_cap = self.delta_capacity
+
+        return {
+            "cycle": int(cycle),
+            "mean_voltage": self._mean.mean if self.count else np.nan,
+            "voltage_std": 0.0 if np.isnan(current_std) else current_std,
+            "min_voltage": self._min[0][1] if self._min else np.nan,
+            "max_voltage": self._max[0][1] if self._max else np.nan,
+            "capacity_ah": self.capacity_ah,
+            "capacity_ratio": self.capacity_ah / self.nominal_capacity,
+            "delta_capacity": 0.0 if np.isnan(delta_cap) else delta_cap,
+            "rolling_voltage_std": roll_std
+        }
+
+
+class FleetFeatureWindow:
+    """
+    StreamingFeatureEngine for a whole fleet, fed in blocks.
+    Keeps the last `window` voltages of every pack in one (window, n_packs) array and
+    computes the dynamic SOH features for all packs with a few vectorized reductions,
+    so the cost is per block rather than per sample. Capacity is taken as constant
+    within a block; nominal_capacity may be one value per pack.
+    """
+    def __init__(self, n_packs, window=100, std_window=5, rolling_window=10, nominal_capacity=100.0):
+        if not (std_window <= window and rolling_window <= window):
+            raise ValueError("std_window and rolling_window must fit inside window")
+
+        self.n_packs = int(n_packs)
+        self.window = window
+        self.std_window = std_window
+        self.rolling_window = rolling_window
+        self.nominal_capacity = nominal_capacity
+        self.voltage = np.zeros((window, self.n_packs))  # oldest -> newest
+        self.count = 0
+
+        self.capacity_ah = np.broadcast_to(np.asarray(nominal_capacity, dtype=np.float64), (self.n_packs,)).copy()
+        self.delta_capacity = np.zeros(self.n_packs)
+
+    def update(self, voltage, capacity_ah=None):
+        """voltage: (steps, n_packs) block of new samples, oldest first"""
+        voltage = np.asarray(voltage, dtype=np.float64)
+        steps = len(voltage)
+        if steps >= self.window:
+            self.voltage[:] = voltage[-self.window:]
+        else:
+            self.voltage[:-steps] = self.voltage[steps:]
+            self.voltage[-steps:] = voltage
+        self.count += steps
+
+        # Capacity delta between the last two samples (zero inside a block)
+        if capacity_ah is not None:
+            capacity_ah = np.broadcast_to(np.asarray(capacity_ah, dtype=np.float64), self.capacity_ah.shape)
+            if steps == 1:
+                self.delta_capacity = (capacity_ah - self.capacity_ah) / capacity_ah
+            else:
+                self.delta_capacity = np.zeros(self.n_packs)
+            self.capacity_ah = capacity_ah.copy()
+
+    def features(self, cycle):
+        """Dict of per-pack feature arrays (the columns SOHPredictor.predict_many accepts)"""
+        n = min(self.count, self.window)
+        return {
+            "cycle": np.broadcast_to(np.asarray(cycle), (self.n_packs,)),
+            **window_features(self.voltage[self.window - n:], self.std_window, self.rolling_window),
+            "capacity_ah": self.capacity_ah,
+            "capacity_ratio": self.capacity_ah / self.nominal_capacity,
+            "delta_capacity": self.delta_capacity,
+        }
+
+
+def window_features(hist, std_window=5, rolling_window=10):
+    """
+    Voltage features of (n, k) windows, oldest -> newest along axis 0, one window per column
+    (n is the number of samples seen so far, up to the feature window length).
+    """
+    from numpy.lib.stride_tricks import sliding_window_view
+
+    n, k = hist.shape
+
+    # 1. Window statistics
+    if n:
+        mean_voltage, min_voltage, max_voltage = hist.mean(axis=0), hist.min(axis=0), hist.max(axis=0)
+    else:
+        mean_voltage = min_voltage = max_voltage = np.full(k, np.nan)
+    if n >= std_window:
+        voltage_std = hist[-std_window:].std(axis=0, ddof=1)
+    else:
+        voltage_std = np.zeros(k)
+
+    # 2. Mean of the rolling std over the window (rolling windows fully inside it)
+    if n >= rolling_window:
+        rolling = sliding_window_view(hist, rolling_window, axis=0).std(axis=-1, ddof=1)
+        rolling_voltage_std = rolling.mean(axis=0)
+    else:
+        rolling_voltage_std = np.zeros(k)
+
+    return {
+        "mean_voltage": mean_voltage,
+        "voltage_std": voltage_std,
+        "min_voltage": min_voltage,
+        "max_voltage": max_voltage,
+        "rolling_voltage_std": rolling_voltage_std,
+    }
@@ -0,0 +1,404 @@
+import json
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Per-pack columns stored by default (float32 on disk; time is float64 seconds)
+COLUMNS = ("voltage", "current", "temperature", "soc", "soh", "capacity_ah")
+
+# Rollup bucket sizes in seconds: 1 s, 1 min, 1 h
+ROLLUP_RESOLUTIONS = (1.0, 60.0, 3600.0)
+
+# Rows per chunk file (raw chunk of 6 columns: 2 MB; 65536 rows = ~1.8 h at 10 Hz)
+CHUNK_ROWS = 1 << 16
+
+DEFAULT_STORE_DIR = os.path.join(
+    os.environ.get("ELEKTRA_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "elektra")), "telemetry"
+)
+
+_MAX_OPEN_CHUNKS = 64
+
+
+def _atomic_write_json(path, obj):
+    # A temp file per call: writers in other threads or processes never share it
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(obj, f)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class _ChunkedSeries:
+    """
+    Append-only rows of (time, values[n_cols]) in fixed-size chunk files.
+
+    Layout under path:
+      series.json        n_cols, dtype, chunk_rows (written once)
+      count              committed row count (int64, memory-mapped)
+      starts.f8          first timestamp of every chunk (appended as chunks are created)
+      <chunk>.time.npy   float64 (chunk_rows,)
+      <chunk>.values.npy dtype (n_cols, chunk_rows), one contiguous run per column
+
+    Data is written before the count, so readers (in any process) only ever see
+    complete rows. Times must be non-decreasing.
+    """
+    def __init__(self, path, n_cols=None, dtype=np.float32, chunk_rows=CHUNK_ROWS):
+        self.path = path
+        config_path = os.path.join(path, "series.json")
+        if os.path.exists(config_path):
+            with open(config_path) as f:
+                config = json.load(f)
+        else:
+            if n_cols is None:
+                raise FileNotFoundError(f"no series at {path}")
+            os.makedirs(path, exist_ok=True)
+            config = {"n_cols": int(n_cols), "dtype": np.dtype(dtype).str, "chunk_rows": int(chunk_rows)}
+            np.zeros(1, dtype=np.int64).tofile(os.path.join(path, "count"))
+            open(os.path.join(path, "starts.f8"), "ab").close()
+            _atomic_write_json(config_path, config)
+
+        self.n_cols = config["n_cols"]
+        self.dtype = np.dtype(config["dtype"])
+        self.chunk_rows = config["chunk_rows"]
+        self._count = np.memmap(os.path.join(path, "count"), dtype=np.int64, mode="r+", shape=(1,))
+        self._starts = np.fromfile(os.path.join(path, "starts.f8"), dtype=np.float64)
+        self._chunks = OrderedDict()
+
+    def __len__(self):
+        return int(self._count[0])
+
+    def _chunk_path(self, index, kind):
+        return os.path.join(self.path, f"{index:08d}.{kind}.npy")
+
+    def _chunk(self, index, create=False):
+        """(time, values) memmaps of one chunk, cached (least recently used ones are closed)"""
+        chunk = self._chunks.get(index)
+        if chunk is not None:
+            self._chunks.move_to_end(index)
+            return chunk
+
+        open_memmap = np.lib.format.open_memmap
+        if create:
+            time = open_memmap(self._chunk_path(index, "time"), mode="w+", dtype=np.float64, shape=(self.chunk_rows,))
+            values = open_memmap(self._chunk_path(index, "values"), mode="w+", dtype=self.dtype,
+                                 shape=(self.n_cols, self.chunk_rows))
+        else:
+            time = open_memmap(self._chunk_path(index, "time"), mode="r+")
+            values = open_memmap(self._chunk_path(index, "values"), mode="r+")
+        chunk = self._chunks[index] = (time, values)
+        if len(self._chunks) > _MAX_OPEN_CHUNKS:
+            self._chunks.popitem(last=False)
+        return chunk
+
+    def starts(self):
+        """First timestamp of every chunk (re-read if another writer added chunks)"""
+        n_chunks = -(-len(self) // self.chunk_rows)
+        if len(self._starts) < n_chunks:
+            self._starts = np.fromfile(os.path.join(self.path, "starts.f8"), dtype=np.float64)
+        return self._starts[:n_chunks]
+
+    def append(self, time, values):
+        """time: (k,) non-decreasing; values: (n_cols, k)"""
+        time = np.asarray(time, dtype=np.float64)
+        count = len(self)
+        done = 0
+        while done < len(time):
+            index, offset = divmod(count + done, self.chunk_rows)
+            if offset == 0:
+                self._chunk(index, create=True)
+                with open(os.path.join(self.path, "starts.f8"), "ab") as f:
+                    np.asarray([time[done]], dtype=np.float64).tofile(f)
+                self._starts = np.append(self._starts, time[done])
+            t_chunk, v_chunk = self._chunk(index)
+            n = min(len(time) - done, self.chunk_rows - offset)
+            t_chunk[offset:offset + n] = time[done:done + n]
+            v_chunk[:, offset:offset + n] = values[:, done:done + n]
+            done += n
+        self._count[0] = count + done
+
+    def last(self):
+        """(time, values (n_cols,)) of the newest row, or None"""
+        count = len(self)
+        if not count:
+            return None
+        index, offset = divmod(count - 1, self.chunk_rows)
+        t_chunk, v_chunk = self._chunk(index)
+        return t_chunk[offset], v_chunk[:, offset].copy()
+
+    def replace_last(self, values):
+        index, offset = divmod(len(self) - 1, self.chunk_rows)
+        self._chunk(index)[1][:, offset] = values
+
+    def search(self, t, side="left"):
+        """Row index where t would be inserted to keep time sorted (reads one chunk)"""
+        count = len(self)
+        starts = self.starts()
+        if not count:
+            return 0
+        # Chunk holding the insertion point: the last one starting before t (at/before for "right")
+        index = max(int(np.searchsorted(starts, t, side=side)) - 1, 0)
+        t_chunk, _ = self._chunk(index)
+        rows = min(self.chunk_rows, count - index * self.chunk_rows)
+        return index * self.chunk_rows + int(np.searchsorted(t_chunk[:rows], t, side=side))
+
+    def read(self, lo, hi):
+        """Rows [lo, hi): (time (n,), values (n_cols, n)); touches only the chunks in range"""
+        hi = min(hi, len(self))
+        lo = max(lo, 0)
+        n = max(hi - lo, 0)
+        time = np.empty(n, dtype=np.float64)
+        values = np.empty((self.n_cols, n), dtype=self.dtype)
+        done = 0
+        while done < n:
+            index, offset = divmod(lo + done, self.chunk_rows)
+            t_chunk, v_chunk = self._chunk(index)
+            k = min(n - done, self.chunk_rows - offset)
+            time[done:done + k] = t_chunk[offset:offset + k]
+            values[:, done:done + k] = v_chunk[:, offset:offset + k]
+            done += k
+        return time, values
+
+    def flush(self):
+        for t_chunk, v_chunk in self._chunks.values():
+            t_chunk.flush()
+            v_chunk.flush()
+        self._count.flush()
+
+
+def _bucket_stats(time, values, resolution):
+    """
+    Groups rows into time-aligned buckets of `resolution` seconds.
+    Returns bucket start times and (4 * n_cols, n_buckets) stats: count, min, max, sum per column
+    (NaN samples are skipped).
+    """
+    bucket = np.floor(time / resolution)
+    starts = np.flatnonzero(np.concatenate([[True], bucket[1:] != bucket[:-1]]))
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+    stats = np.concatenate([
+        np.add.reduceat(valid, starts, axis=1),
+        np.fmin.reduceat(values, starts, axis=1),
+        np.fmax.reduceat(values, starts, axis=1),
+        np.add.reduceat(filled, starts, axis=1, dtype=np.float64),
+    ])
+    return bucket[starts] * resolution, stats
+
+
+def _regroup(time, stats, resolution, n_cols):
+    """Re-buckets rollup rows to a coarser resolution"""
+    bucket = np.floor(time / resolution)
+    starts = np.flatnonzero(np.concatenate([[True], bucket[1:] != bucket[:-1]]))
+    merged = np.concatenate([
+        np.add.reduceat(stats[:n_cols], starts, axis=1),
+        np.fmin.reduceat(stats[n_cols:2 * n_cols], starts, axis=1),
+        np.fmax.reduceat(stats[2 * n_cols:3 * n_cols], starts, axis=1),
+        np.add.reduceat(stats[3 * n_cols:], starts, axis=1),
+    ])
+    return bucket[starts] * resolution, merged
+
+
+class TelemetryStore:
+    """
+    Append-only, columnar on-disk telemetry per pack, with min/max/mean rollups.
+
+    Layout under root/<pack>/:
+      raw/         every sample (float32 columns, float64 time)
+      r<seconds>/  one row per time-aligned bucket per rollup resolution:
+                   count, min, max and sum of every column
+    Appends write the raw samples first, then bring every rollup up to date from
+    data already on disk: a level's newest (still-open) bucket and any after it are
+    recomputed from the raw samples, or from the finest rollup that nests in it, and
+    the open bucket is overwritten in place. Rollups are never merged into, so an
+    append interrupted by a crash is completed by the next one without double counting.
+    query() answers a time range from the coarsest level that satisfies the requested
+    resolution and reads only the chunks that overlap it.
+
+    One writing process per pack at a time (appends are serialized between threads);
+    any number of readers, in any process.
+    """
+    def __init__(self, root=None, columns=COLUMNS, resolutions=ROLLUP_RESOLUTIONS, chunk_rows=CHUNK_ROWS):
+        self.root = root or DEFAULT_STORE_DIR
+        self.columns = list(columns)
+        self.resolutions = sorted(float(r) for r in resolutions)
+        self.chunk_rows = chunk_rows
+        self._col = {name: i for i, name in enumerate(self.columns)}
+        # Each rollup is derived from the coarsest finer level whose buckets nest in it (None: raw)
+        self._rollup_source = {}
+        for i, resolution in enumerate(self.resolutions):
+            finer = [r for r in self.resolutions[:i] if abs(resolution / r - round(resolution / r)) < 1e-9]
+            self._rollup_source[resolution] = finer[-1] if finer else None
+        self._packs = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def _pack_dir(pack_id):
+        return re.sub(r"[^A-Za-z0-9_.-]", "_", str(pack_id))
+
+    def _series(self, pack_id, create=False):
+        """(raw, {resolution: rollup}) for a pack, or None if it has no data"""
+        series = self._packs.get(pack_id)
+        if series is not None:
+            return series
+
+        path = os.path.join(self.root, self._pack_dir(pack_id))
+        if not create and not os.path.exists(os.path.join(path, "raw", "series.json")):
+            return None
+        n_cols = len(self.columns)
+        raw = _ChunkedSeries(os.path.join(path, "raw"), n_cols, np.float32, self.chunk_rows)
+        rollups = {
+            resolution: _ChunkedSeries(os.path.join(path, f"r{resolution:g}"), 4 * n_cols, np.float64, self.chunk_rows)
+            for resolution in self.resolutions
+        }
+        if not os.path.exists(os.path.join(path, "columns.json")):
+            _atomic_write_json(os.path.join(path, "columns.json"), self.columns)
+        series = self._packs[pack_id] = (raw, rollups)
+        return series
+
+    def packs(self):
+        return sorted(
+            name for name in os.listdir(self.root)
+            if os.path.exists(os.path.join(self.root, name, "raw", "series.json"))
+        )
+
+    def __len__(self):
+        return len(self.packs())
+
+    def append(self, pack_id, time, **values):
+        """
+        Appends samples for one pack.
+        time: scalar or (k,) seconds, non-decreasing and not older than the newest stored sample
+        values: column name -> scalar or (k,) array (missing columns are stored as NaN)
+        """
+        time = np.atleast_1d(np.asarray(time, dtype=np.float64))
+        unknown = set(values) - set(self._col)
+        if unknown:
+            raise ValueError(f"unknown columns: {', '.join(sorted(unknown))}")
+        if len(time) == 0:
+            return
+        if np.any(np.diff(time) < 0):
+            raise ValueError("timestamps must be non-decreasing")
+
+        with self._lock:
+            self._append(pack_id, time, values)
+
+    def _append(self, pack_id, time, values):
+        raw, rollups = self._series(pack_id, create=True)
+        last = raw.last()
+        if last is not None and time[0] < last[0]:
+            raise ValueError(f"timestamp {time[0]} is older than the newest stored sample ({last[0]})")
+
+        block = np.full((len(self.columns), len(time)), np.nan, dtype=np.float32)
+        for name, column in values.items():
+            block[self._col[name]] = column
+
+        # 1. Raw samples
+        raw.append(time, block)
+
+        # 2. Rollups, finest first, each from the persisted level below it
+        for resolution in self.resolutions:
+            source = self._rollup_source[resolution]
+            self._update_rollup(rollups[resolution], resolution, raw if source is None else rollups[source],
+                                from_raw=source is None)
+
+    def _update_rollup(self, rollup, resolution, source, from_raw):
+        """Recomputes the rollup's open bucket and appends any newer ones from `source`"""
+        n_cols = len(self.columns)
+        tail = rollup.last()
+        lo = 0 if tail is None else source.search(tail[0], "left")
+        time, values = source.read(lo, len(source))
+        if not len(time):
+            return
+        if from_raw:
+            bucket_time, stats = _bucket_stats(time, values, resolution)
+        else:
+            bucket_time, stats = _regroup(time, values, resolution, n_cols)
+        if tail is not None and tail[0] == bucket_time[0]:
+            rollup.replace_last(stats[:, 0])
+            bucket_time, stats = bucket_time[1:], stats[:, 1:]
+        if len(bucket_time):
+            rollup.append(bucket_time, stats)
+
+    def query(self, pack_id, start=None, end=None, resolution=None, columns=None):
+        """
+        Samples of one pack with start <= time < end.
+
+        resolution=None returns raw samples: {"time", <column>: values}.
+        Otherwise rows are aggregated into time-aligned `resolution`-second buckets (the
+        range is widened to whole buckets), read from the coarsest stored rollup whose
+        resolution divides it, or from the raw samples if none does:
+          {"time": bucket start, "count", <column>: mean, <column>_min, <column>_max}
+        """
+        columns = list(columns or self.columns)
+        idx = [self._col[name] for name in columns]
+        series = self._series(pack_id)
+        if series is None:
+            empty = {"time": np.empty(0)}
+            empty.update({name: np.empty(0, dtype=np.float32) for name in columns})
+            return empty
+        raw, rollups = series
+        start = -np.inf if start is None else start
+        end = np.inf if end is None else end
+
+        levels = []
+        if resolution is not None:
+            # Whole buckets only: widen the range to bucket boundaries
+            if np.isfinite(start):
+                start = np.floor(start / resolution) * resolution
+            if np.isfinite(end):
+                end = np.ceil(end / resolution) * resolution
+            # Rollups whose buckets nest exactly inside the requested ones
+            levels = [r for r in self.resolutions
+                      if r <= resolution and abs(resolution / r - round(resolution / r)) < 1e-9]
+        source = rollups[levels[-1]] if levels else raw
+        lo = source.search(start, "left")
+        hi = source.search(end, "left")
+        time, values = source.read(lo, hi)
+
+        if resolution is None:
+            out = {"time": time}
+            out.update({name: values[i] for name, i in zip(columns, idx)})
+            return out
+
+        n_cols = len(self.columns)
+        if levels:
+            if levels[-1] != resolution:
+                time, values = _regroup(time, values, resolution, n_cols)
+            stats = values
+        else:
+            time, stats = _bucket_stats(time, values, resolution) if len(time) else (time, np.empty((4 * n_cols, 0)))
+
+        count = stats[:n_cols]
+        out = {"time": time, "count": count.max(axis=0) if len(time) else np.empty(0)}
+        with np.errstate(invalid="ignore", divide="ignore"):
+            for name, i in zip(columns, idx):
+                out[name] = stats[3 * n_cols + i] / count[i]
+                out[f"{name}_min"] = stats[n_cols + i]
+                out[f"{name}_max"] = stats[2 * n_cols + i]
+        return out
+
+    def last(self, pack_id, n=1, columns=None):
+        """The newest n raw samples of a pack (same shape as a raw query)"""
+        columns = list(columns or self.columns)
+        series = self._series(pack_id)
+        if series is None:
+            return self.query(pack_id, columns=columns)
+        raw = series[0]
+        time, values = raw.read(len(raw) - n, len(raw))
+        out = {"time": time}
+        out.update({name: values[self._col[name]] for name in columns})
+        return out
+
+    def flush(self):
+        for raw, rollups in self._packs.values():
+            raw.flush()
+            for rollup in rollups.values():
+                rollup.flush()